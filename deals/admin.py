@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import EcommerceSite, DealCategory, Deal, DailyScrapeLog, UserClick
+from .models import (EcommerceSite, DealCategory, Deal, DailyScrapeLog, UserClick,
+                     HourlyClickRollup, DailyClickRollup, Product, ArchivedDeal, CategoryKeyword)
+from .caching import bump_rules_version
 
 # Simple admin for EcommerceSite
 @admin.register(EcommerceSite)
@@ -16,8 +18,10 @@ class DealAdmin(admin.ModelAdmin):
                     'discount_percentage', 'is_active', 'click_count')
     list_filter = ('source_site', 'is_active', 'category')
     search_fields = ('title', 'description', 'brand')
+    raw_id_fields = ('product',)
     readonly_fields = ('deal_hash', 'click_count', 'view_count', 
-                       'first_seen', 'last_checked')
+                       'first_seen', 'last_checked', 'lowest_price_cents',
+                       'highest_price_cents', 'low_90d_cents', 'low_90d_day')
     
     # Custom method to display title
     def get_short_title(self, obj):
@@ -34,22 +38,70 @@ class DealAdmin(admin.ModelAdmin):
         queryset.update(is_active=False)
     deactivate_deals.short_description = "Deactivate selected deals"
 
+# Canonical products grouping the same item across sites
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ('title', 'created_at')
+    search_fields = ('title',)
+
+# Deals moved out of the Deal table by the expiry sweep
+@admin.register(ArchivedDeal)
+class ArchivedDealAdmin(admin.ModelAdmin):
+    list_display = ('title', 'discounted_price', 'last_checked', 'archived_at')
+    search_fields = ('title', 'deal_hash')
+    date_hierarchy = 'archived_at'
+    show_full_result_count = False
+
+# Categorizer keywords, edited per category
+class CategoryKeywordInline(admin.TabularInline):
+    model = CategoryKeyword
+    extra = 1
+
 # Simple admin for DealCategory
 @admin.register(DealCategory)
 class DealCategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
     prepopulated_fields = {'slug': ('name',)}
+    inlines = [CategoryKeywordInline]
+
+@admin.register(CategoryKeyword)
+class CategoryKeywordAdmin(admin.ModelAdmin):
+    list_display = ('keyword', 'category', 'weight')
+    list_filter = ('category',)
+    search_fields = ('keyword',)
+    
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes skip CategoryKeyword.delete()
+        super().delete_queryset(request, queryset)
+        bump_rules_version()
 
 # Simple admin for DailyScrapeLog
 @admin.register(DailyScrapeLog)
 class DailyScrapeLogAdmin(admin.ModelAdmin):
-    list_display = ('site', 'started_at', 'status', 'deals_found', 'deals_added')
+    list_display = ('site', 'started_at', 'status', 'deals_found', 'deals_added',
+                    'fetch_seconds', 'parse_seconds', 'write_seconds', 'deals_per_sec')
     list_filter = ('status', 'site')
-    readonly_fields = ('started_at', 'finished_at')
+    readonly_fields = ('started_at', 'finished_at', 'pages_fetched', 'bytes_fetched', 'status_counts',
+                       'fetch_seconds', 'parse_seconds', 'write_seconds', 'deals_per_sec')
 
 # Simple admin for UserClick
 @admin.register(UserClick)
 class UserClickAdmin(admin.ModelAdmin):
     list_display = ('deal', 'ip_address', 'clicked_at')
-    list_filter = ('clicked_at', 'deal')
-    search_fields = ('ip_address', 'deal__title')
\ No newline at end of file
+    # A filter listing every deal and an exact count both scan the whole
+    # click table; reports belong on the rollups below
+    date_hierarchy = 'clicked_at'
+    list_select_related = ('deal__source_site',)
+    show_full_result_count = False
+    search_fields = ('ip_address', 'deal__title')
+
+# Click rollups, rebuilt by the rollup_clicks command
+class ClickRollupAdmin(admin.ModelAdmin):
+    # deal_id, not deal: rollups outlive archived deals
+    list_display = ('bucket', 'deal_id', 'site', 'category', 'clicks')
+    list_filter = ('site', 'category')
+    list_select_related = ('site', 'category')
+    date_hierarchy = 'bucket'
+
+admin.site.register(HourlyClickRollup, ClickRollupAdmin)
+admin.site.register(DailyClickRollup, ClickRollupAdmin)
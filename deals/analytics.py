@@ -0,0 +1,126 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from .models import DailyClickRollup, HourlyClickRollup, UserClick
+
+# Raw clicks deleted per statement when archiving
+ARCHIVE_CHUNK_SIZE = 5000
+
+def start_of_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def start_of_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_clicks(now=None):
+    """Bring the hourly and daily rollups up to date.
+    
+    Only buckets from the last rolled-up hour onwards are rebuilt (one hour
+    of overlap picks up clicks that were still buffered), so a run costs
+    the clicks since the previous run, not the whole table. Daily rollups
+    are summed from the hourly ones, never from raw clicks, so they survive
+    archiving. Returns the number of hourly and daily rows written.
+    """
+    now = now or timezone.now()
+    last_bucket = HourlyClickRollup.objects.aggregate(last=Max('bucket'))['last']
+    if last_bucket is None:
+        first_click = UserClick.objects.aggregate(first=Min('clicked_at'))['first']
+        if first_click is None:
+            return 0, 0
+        start = start_of_hour(first_click)
+    else:
+        start = last_bucket - timedelta(hours=1)
+    end = start_of_hour(now) + timedelta(hours=1)
+    day_start = start_of_day(start)
+    
+    with transaction.atomic():
+        HourlyClickRollup.objects.filter(bucket__gte=start).delete()
+        hourly = (
+            UserClick.objects
+            .filter(clicked_at__gte=start, clicked_at__lt=end)
+            .annotate(hour=TruncHour('clicked_at'))
+            .values('hour', 'deal_id', 'deal__source_site_id', 'deal__category_id')
+            .annotate(clicks=Count('id'))
+        )
+        hourly_rows = HourlyClickRollup.objects.bulk_create([
+            HourlyClickRollup(
+                bucket=row['hour'],
+                deal_id=row['deal_id'],
+                site_id=row['deal__source_site_id'],
+                category_id=row['deal__category_id'],
+                clicks=row['clicks'],
+            )
+            for row in hourly.iterator()
+        ], batch_size=1000)
+        
+        DailyClickRollup.objects.filter(bucket__gte=day_start).delete()
+        daily = (
+            HourlyClickRollup.objects
+            .filter(bucket__gte=day_start)
+            .annotate(day=TruncDay('bucket'))
+            .values('day', 'deal_id', 'site_id', 'category_id')
+            .annotate(total=Sum('clicks'))
+        )
+        daily_rows = DailyClickRollup.objects.bulk_create([
+            DailyClickRollup(
+                bucket=row['day'],
+                deal_id=row['deal_id'],
+                site_id=row['site_id'],
+                category_id=row['category_id'],
+                clicks=row['total'],
+            )
+            for row in daily.iterator()
+        ], batch_size=1000)
+    
+    return len(hourly_rows), len(daily_rows)
+
+def archive_clicks(archive_dir, older_than_days, now=None):
+    """Move raw clicks older than the retention window into per-day gzip files.
+    
+    Each day goes to clicks-YYYY-MM-DD.ndjson.gz, one JSON object per
+    click. Rows are written and then deleted a chunk at a time, so an
+    interrupted run can at worst repeat one chunk (rows carry their id).
+    Clicks not yet covered by the hourly rollup are never archived.
+    Returns the number of clicks archived.
+    """
+    now = now or timezone.now()
+    cutoff = start_of_day(now - timedelta(days=older_than_days))
+    rolled_until = HourlyClickRollup.objects.aggregate(last=Max('bucket'))['last']
+    if rolled_until is None:
+        return 0
+    cutoff = min(cutoff, start_of_day(rolled_until))
+    
+    first_click = UserClick.objects.filter(clicked_at__lt=cutoff).aggregate(first=Min('clicked_at'))['first']
+    if first_click is None:
+        return 0
+    
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = 0
+    day = start_of_day(first_click)
+    while day < cutoff:
+        next_day = day + timedelta(days=1)
+        path = os.path.join(archive_dir, f"clicks-{day.date().isoformat()}.ndjson.gz")
+        clicks = UserClick.objects.filter(clicked_at__gte=day, clicked_at__lt=next_day).order_by('id')
+        
+        while True:
+            chunk = list(clicks.values('id', 'deal_id', 'ip_address', 'user_agent', 'clicked_at')[:ARCHIVE_CHUNK_SIZE])
+            if not chunk:
+                break
+            # Appending adds a gzip member; readers see one continuous stream
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for click in chunk:
+                    click['clicked_at'] = click['clicked_at'].isoformat()
+                    f.write(json.dumps(click) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            UserClick.objects.filter(id__in=[click['id'] for click in chunk]).delete()
+            archived += len(chunk)
+        
+        day = next_day
+    
+    return archived
@@ -0,0 +1,185 @@
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import (HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotModified,
+                         StreamingHttpResponse)
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+from .caching import LISTING_TIMEOUT, get_listing_count, get_listing_version, listing_cache_key
+from .categories import get_category_tree
+from .export import CONTENT_TYPES, EXPORT_FORMATS, export_lines, parse_since
+from .models import Deal
+from .pagination import InvalidCursor, KeysetPaginator
+from .prices import is_low, to_cents
+from .search import search_count, search_deal_ids
+from .views import VALID_SORT_FIELDS, listing_queryset
+
+# Part of every ETag, so a change to the response format invalidates what
+# clients and CDNs hold even when no ingest happened
+API_FORMAT = 1
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Columns read with .values(); no Deal instances are built for the API
+DEAL_FIELDS = (
+    'id', 'title', 'discounted_price', 'original_price', 'discount_percentage', 'currency',
+    'deal_score', 'image_url', 'lowest_price_cents', 'highest_price_cents', 'low_90d_cents',
+    'category__slug', 'source_site__name',
+)
+
+class ApiJSONEncoder(DjangoJSONEncoder):
+    """Prices as JSON numbers rather than strings"""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+def current_etag():
+    """Strong ETag of every API response until the next ingest"""
+    return f'"{API_FORMAT}-{get_listing_version()}"'
+
+def api_response(request, name, params, build):
+    """JSON response cached per listing version, answering a matching If-None-Match with 304.
+
+    A polling client with a current ETag costs one cache read and a string
+    comparison; build only runs when the body is not cached yet.
+    """
+    etag = current_etag()
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' in if_none_match or etag in if_none_match or f'W/{etag}' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        key = listing_cache_key(f'api-{name}', **params)
+        body = cache.get(key)
+        if body is None:
+            body = json.dumps(build(), cls=ApiJSONEncoder, separators=(',', ':')).encode()
+            cache.set(key, body, LISTING_TIMEOUT)
+        response = HttpResponse(body, content_type='application/json')
+
+    response['ETag'] = etag
+    patch_cache_control(
+        response, public=True, max_age=settings.API_CACHE_MAX_AGE,
+        stale_while_revalidate=settings.API_CACHE_MAX_AGE,
+    )
+    return response
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+def deal_values(queryset):
+    return queryset.values(*DEAL_FIELDS)
+
+def serialize_deals(rows):
+    """API shape of deal_values() rows: flat category and site, low-price flags"""
+    rows = list(rows)
+    for row in rows:
+        row['category'] = row.pop('category__slug')
+        row['site'] = row.pop('source_site__name')
+        cents = to_cents(row['discounted_price'])
+        row['all_time_low'] = is_low(cents, row.pop('lowest_price_cents'), row['highest_price_cents'])
+        row['low_90_days'] = is_low(cents, row.pop('low_90d_cents'), row.pop('highest_price_cents'))
+        row['url'] = reverse('go_to_deal', args=[row['id']])
+    return rows
+
+@require_safe
+def deals_api(request):
+    """Active deals, keyset-paginated, optionally limited to a category subtree"""
+    category_slug = request.GET.get('category', '')
+    sort = request.GET.get('sort', '-deal_score')
+    if sort not in VALID_SORT_FIELDS:
+        sort = '-deal_score'
+    cursor = request.GET.get('cursor', '')
+    limit = get_limit(request)
+
+    def build():
+        deals_query = listing_queryset(category_slug)
+        paginator = KeysetPaginator(deal_values(deals_query), sort, limit)
+        try:
+            page = paginator.get_page(cursor)
+        except InvalidCursor:
+            page = paginator.get_page()
+        return {
+            'count': get_listing_count(deals_query, 'home', category=category_slug),
+            'next': page.next_cursor,
+            'previous': page.prev_cursor,
+            'results': serialize_deals(page),
+        }
+
+    return api_response(
+        request, 'deals', {'category': category_slug, 'sort': sort, 'cursor': cursor, 'limit': limit}, build,
+    )
+
+@require_safe
+def categories_api(request):
+    """The whole category tree, in path order"""
+    def build():
+        return {
+            'results': [
+                {
+                    'id': category.pk,
+                    'name': category.name,
+                    'slug': category.slug,
+                    'parent': category.parent_id,
+                    'depth': category.depth,
+                }
+                for category in get_category_tree().categories
+            ],
+        }
+
+    return api_response(request, 'categories', {}, build)
+
+@require_safe
+def search_api(request):
+    """Full-text search, best match first, paged by offset into the ranked ids"""
+    query = request.GET.get('q', '').strip()
+    limit = get_limit(request)
+    try:
+        offset = max(0, int(request.GET.get('offset', 0)))
+    except (TypeError, ValueError):
+        offset = 0
+
+    def build():
+        deal_ids = search_deal_ids(query) if query else []
+        ids = deal_ids[offset:offset + limit]
+        rows = {row['id']: row for row in serialize_deals(deal_values(Deal.objects.filter(id__in=ids)))}
+        return {
+            # Only the best MAX_RESULTS can be paged through, but all matches are counted
+            'count': search_count(query) if query else 0,
+            'results': [rows[deal_id] for deal_id in ids if deal_id in rows],
+        }
+
+    return api_response(request, 'search', {'q': query, 'offset': offset, 'limit': limit}, build)
+
+@require_safe
+def export_api(request):
+    """Stream the deal feed as NDJSON, CSV or columnar, optionally only deals seen since ?since="""
+    token = settings.DEALS_EXPORT_TOKEN
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_since(request.GET['since'])
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+    response = StreamingHttpResponse(export_lines(export_format, since), content_type=CONTENT_TYPES[export_format])
+    extension = 'csv' if export_format == 'csv' else 'ndjson'
+    response['Content-Disposition'] = f'attachment; filename="deals-{export_format}.{extension}"'
+    patch_cache_control(response, private=True, no_store=True)
+    return response
@@ -0,0 +1,59 @@
+import hashlib
+import time
+from django.core.cache import cache
+from .models import Deal, EcommerceSite
+
+# Bumped after every ingest; part of every listing cache key, so old
+# entries are never read again and simply expire
+LISTING_VERSION_KEY = 'deals:listing-version'
+
+# Listings change once a day; the version bump handles freshness
+LISTING_TIMEOUT = 60 * 60 * 24
+
+def get_listing_version():
+    version = cache.get(LISTING_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        # add() so concurrent workers agree on the first version
+        cache.add(LISTING_VERSION_KEY, version, None)
+        version = cache.get(LISTING_VERSION_KEY, version)
+    return version
+
+def bump_listing_version():
+    """Invalidate every cached listing and stat"""
+    version = time.time_ns()
+    cache.set(LISTING_VERSION_KEY, version, None)
+    return version
+
+# Bumped whenever a CategoryKeyword row changes, so scrapers reload their rules
+RULES_VERSION_KEY = 'deals:category-rules-version'
+
+def bump_rules_version():
+    cache.set(RULES_VERSION_KEY, time.time_ns(), None)
+
+def listing_cache_key(name, **params):
+    """Versioned cache key for a listing, e.g. ('home', category=..., sort=..., page=...)"""
+    raw = '&'.join(f"{key}={params[key]}" for key in sorted(params))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"deals:{name}:{get_listing_version()}:{digest}"
+
+def get_listing_stats():
+    """Active deal and store counts, computed once per ingest"""
+    key = listing_cache_key('stats')
+    stats = cache.get(key)
+    if stats is None:
+        stats = {
+            'total_deals': Deal.objects.filter(is_active=True).count(),
+            'sites_count': EcommerceSite.objects.filter(is_active=True).count(),
+        }
+        cache.set(key, stats, LISTING_TIMEOUT)
+    return stats
+
+def get_listing_count(queryset, name, **params):
+    """Row count of a listing, cached until the next ingest"""
+    key = listing_cache_key(f'{name}-count', **params)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, LISTING_TIMEOUT)
+    return count
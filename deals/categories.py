@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from .caching import LISTING_TIMEOUT, listing_cache_key
+from .models import DealCategory
+
+
+class CategoryTree:
+    """Every category in path order, with each slug's subtree ids precomputed"""
+
+    def __init__(self, categories):
+        # Path order puts each category directly before its subtree
+        self.categories = sorted(categories, key=lambda category: category.path)
+        self.by_slug = {category.slug: category for category in self.categories}
+        self.subtree_ids = {}
+        for index, category in enumerate(self.categories):
+            ids = [category.pk]
+            for other in self.categories[index + 1:]:
+                if not other.path.startswith(category.path):
+                    break
+                ids.append(other.pk)
+            self.subtree_ids[category.slug] = ids
+
+    def roots(self):
+        return [category for category in self.categories if category.depth == 0]
+
+    def children(self, category):
+        return [other for other in self.categories if other.parent_id == category.pk]
+
+    def ids_for_slug(self, slug):
+        """Ids of the category and all its subcategories; empty for an unknown slug"""
+        return self.subtree_ids.get(slug, [])
+
+
+def get_category_tree():
+    """The category tree, built once per listing version"""
+    key = listing_cache_key('category-tree')
+    tree = cache.get(key)
+    if tree is None:
+        tree = CategoryTree(DealCategory.objects.order_by('path'))
+        cache.set(key, tree, LISTING_TIMEOUT)
+    return tree
@@ -0,0 +1,103 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Deal, UserClick
+
+logger = logging.getLogger(__name__)
+
+class ClickBuffer:
+    """Click events held in memory and written to the database in batches.
+
+    record() only appends to a list, so a click never waits on the
+    database. A background thread flushes every flush_interval seconds, or
+    sooner once max_events are waiting: one bulk_create of UserClick rows
+    plus one F() increment per clicked deal. A failed write puts its
+    events back for the next flush, keeping the newest max_events. If the
+    process dies, at most the events since the last flush are lost.
+    """
+
+    def __init__(self, flush_interval=5.0, max_events=1000):
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.events = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def record(self, deal_id, ip_address, user_agent=''):
+        with self.lock:
+            self.events.append((deal_id, ip_address, user_agent[:1000], timezone.now()))
+            pending = len(self.events)
+        self.start()
+        if pending >= self.max_events:
+            self.wakeup.set()
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='click-flusher', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing click events failed")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write all waiting events; returns how many were written, or raises and keeps them"""
+        with self.lock:
+            events, self.events = self.events, []
+        if not events:
+            return 0
+
+        try:
+            self.write(events)
+        except Exception:
+            # Keep the batch for the next flush, oldest first, without
+            # letting an unreachable database grow the buffer past max_events
+            with self.lock:
+                self.events = (events + self.events)[-self.max_events:]
+            raise
+        return len(events)
+
+    def write(self, events):
+        clicks_per_deal = Counter(deal_id for deal_id, _, _, _ in events)
+        existing = set(Deal.objects.filter(id__in=list(clicks_per_deal)).values_list('id', flat=True))
+
+        with transaction.atomic():
+            UserClick.objects.bulk_create([
+                UserClick(deal_id=deal_id, ip_address=ip_address, user_agent=user_agent, clicked_at=clicked_at)
+                for deal_id, ip_address, user_agent, clicked_at in events
+                if deal_id in existing
+            ], batch_size=500)
+            for deal_id, clicks in clicks_per_deal.items():
+                if deal_id in existing:
+                    Deal.objects.filter(id=deal_id).update(click_count=F('click_count') + clicks)
+
+
+click_buffer = ClickBuffer(
+    flush_interval=getattr(settings, 'CLICK_FLUSH_INTERVAL', 5.0),
+    max_events=getattr(settings, 'CLICK_BUFFER_MAX_EVENTS', 1000),
+)
+
+@atexit.register
+def flush_on_exit():
+    try:
+        click_buffer.flush()
+    except Exception:
+        logger.exception("Final click flush failed")
+    finally:
+        connection.close()
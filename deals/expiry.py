@@ -0,0 +1,84 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .caching import bump_listing_version
+from .models import ArchivedDeal, DailyScrapeLog, Deal, EcommerceSite
+from .search import remove_deals
+
+# Rows per UPDATE or archive round trip
+EXPIRE_CHUNK_SIZE = 1000
+
+# Inactive deals are archived once they have not been seen for this long
+ARCHIVE_AFTER_DAYS = 90
+
+ARCHIVED_FIELDS = [
+    'id', 'title', 'product_url', 'image_url', 'original_price', 'discounted_price',
+    'discount_percentage', 'currency', 'lowest_price_cents', 'highest_price_cents',
+    'source_site_id', 'category_id', 'product_id', 'deal_hash', 'click_count',
+    'first_seen', 'last_checked',
+]
+
+def deactivate_in_chunks(queryset, chunk_size):
+    """Set is_active=False on a queryset of active deals a chunk at a time"""
+    deactivated = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deactivated
+        with transaction.atomic():
+            deactivated += Deal.objects.filter(id__in=ids, is_active=True).update(is_active=False)
+
+def expire_deals(now=None, chunk_size=EXPIRE_CHUNK_SIZE):
+    """Deactivate deals a site no longer lists, and deals past valid_until.
+    
+    A deal is gone from its site when the site's latest successful
+    DailyScrapeLog (a crawl that reached the last listing page) started
+    after the deal was last seen. Sites without such a run are left alone.
+    Returns the number of deals deactivated per site, with valid_until
+    expiries under None.
+    """
+    now = now or timezone.now()
+    expired = {}
+    
+    for site in EcommerceSite.objects.all():
+        last_run = (
+            DailyScrapeLog.objects.filter(site=site, status='success')
+            .order_by('-started_at').first()
+        )
+        if last_run is None:
+            continue
+        stale = Deal.objects.filter(
+            source_site=site, is_active=True, last_checked__lt=last_run.started_at
+        ).order_by('last_checked')
+        expired[site.name] = deactivate_in_chunks(stale, chunk_size)
+    
+    past_valid = Deal.objects.filter(is_active=True, valid_until__lt=now).order_by('valid_until')
+    expired[None] = deactivate_in_chunks(past_valid, chunk_size)
+    
+    if any(expired.values()):
+        bump_listing_version()
+    return expired
+
+def archive_deals(older_than_days=ARCHIVE_AFTER_DAYS, now=None, chunk_size=EXPIRE_CHUNK_SIZE):
+    """Move inactive deals not seen for older_than_days into ArchivedDeal.
+    
+    Each chunk is copied and deleted in one transaction. Their clicks,
+    price history and similarity rows go with them; click rollups stay.
+    Returns the number of deals archived.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=older_than_days)
+    old = Deal.objects.filter(is_active=False, last_checked__lt=cutoff).order_by('last_checked')
+    archived = 0
+    
+    while True:
+        rows = list(old.values(*ARCHIVED_FIELDS)[:chunk_size])
+        if not rows:
+            return archived
+        ids = [row['id'] for row in rows]
+        with transaction.atomic():
+            ArchivedDeal.objects.filter(id__in=ids).delete()
+            ArchivedDeal.objects.bulk_create([ArchivedDeal(archived_at=now, **row) for row in rows])
+            Deal.objects.filter(id__in=ids).delete()
+            remove_deals(ids)
+        archived += len(rows)
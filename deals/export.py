@@ -0,0 +1,119 @@
+import csv
+import json
+from datetime import datetime, time
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Deal
+
+# Rows fetched per round trip; on PostgreSQL .iterator() reads them through a
+# server-side cursor, so memory stays flat however large the catalogue is
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows per block of the columnar format
+ROW_GROUP_SIZE = 10000
+
+# (exported name, field read with values_list)
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('discounted_price', 'discounted_price'),
+    ('original_price', 'original_price'),
+    ('discount_percentage', 'discount_percentage'),
+    ('currency', 'currency'),
+    ('deal_score', 'deal_score'),
+    ('product_url', 'product_url'),
+    ('image_url', 'image_url'),
+    ('category', 'category__slug'),
+    ('site', 'source_site__name'),
+    ('is_active', 'is_active'),
+    ('first_seen', 'first_seen'),
+    ('last_checked', 'last_checked'),
+]
+COLUMN_NAMES = [name for name, field in EXPORT_COLUMNS]
+
+# Columns with few distinct values, stored once per row group in the columnar format
+DICTIONARY_COLUMNS = {'currency', 'category', 'site', 'is_active'}
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'columnar': 'application/x-ndjson',
+}
+
+def parse_since(value):
+    """Aware datetime from an ISO timestamp or date; naive values are in the current time zone"""
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Not an ISO date or timestamp: {value!r}")
+        since = datetime.combine(day, time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+def export_queryset(since=None):
+    """Active deals, or every deal seen on its site at or after since"""
+    if since is None:
+        deals = Deal.objects.filter(is_active=True)
+    else:
+        deals = Deal.objects.filter(last_checked__gte=since)
+    return deals.order_by('id').values_list(*[field for name, field in EXPORT_COLUMNS])
+
+def iter_export_rows(since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    return export_queryset(since).iterator(chunk_size=chunk_size)
+
+def encode_json(value):
+    # Prices stay exact decimal strings, as in the CSV
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+def ndjson_lines(rows):
+    """One JSON object per deal"""
+    for row in rows:
+        yield encode_json(dict(zip(COLUMN_NAMES, row))) + '\n'
+
+class Echo:
+    """File-like object whose write() hands back the line, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMN_NAMES)
+    for row in rows:
+        yield writer.writerow(row)
+
+def columnar_lines(rows, group_size=ROW_GROUP_SIZE):
+    """A header line, then one line per row group holding a list of values per column.
+
+    Low-cardinality columns are dictionary-encoded: the distinct values of
+    the group once, then an index per row. Only one group is in memory at a time.
+    """
+    yield encode_json({'format': 'deals-columnar', 'version': 1, 'columns': COLUMN_NAMES}) + '\n'
+    rows = iter(rows)
+    while True:
+        group = list(islice(rows, group_size))
+        if not group:
+            break
+        columns = {}
+        for name, values in zip(COLUMN_NAMES, zip(*group)):
+            if name in DICTIONARY_COLUMNS:
+                dictionary = {}
+                codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+                columns[name] = {'dictionary': list(dictionary), 'codes': codes}
+            else:
+                columns[name] = list(values)
+        yield encode_json({'rows': len(group), 'columns': columns}) + '\n'
+
+EXPORT_FORMATS = {
+    'ndjson': ndjson_lines,
+    'csv': csv_lines,
+    'columnar': columnar_lines,
+}
+
+def export_lines(export_format, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Text chunks of the deal export in the given format, generated as rows are read"""
+    return EXPORT_FORMATS[export_format](iter_export_rows(since, chunk_size))
@@ -0,0 +1,44 @@
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Amazon product pages carry a 10-character ASIN after /dp/ or /gp/product/
+ASIN_RE = re.compile(r'/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?#]|$)', re.IGNORECASE)
+
+# Query parameters that identify the product on some sites (Flipkart's pid,
+# for one); every other parameter is tracking or presentation
+IDENTITY_PARAMS = {'pid', 'id', 'itemid', 'item_id', 'product_id', 'sku'}
+
+# Tracking path suffixes such as Amazon's /ref=deals_...
+REF_SEGMENT_RE = re.compile(r'/ref=[^/]*$')
+
+def canonical_url(url):
+    """Host, path and identifying query parameters of a product URL"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = REF_SEGMENT_RE.sub('', parts.path).rstrip('/')
+    params = sorted(
+        (key.lower(), value) for key, value in parse_qsl(parts.query)
+        if key.lower() in IDENTITY_PARAMS
+    )
+    canonical = f"{host}{path}"
+    if params:
+        canonical += '?' + urlencode(params)
+    return canonical
+
+def product_key(site_name, product_url, title=''):
+    """Identity of a listing on a site, independent of its price"""
+    match = ASIN_RE.search(product_url or '')
+    if match:
+        return f"{site_name}:asin:{match.group(1).upper()}"
+    if product_url:
+        return f"{site_name}:url:{canonical_url(product_url)}"
+    # Without a link the title is all there is to go on
+    return f"{site_name}:title:{' '.join((title or '').lower().split())}"
+
+def product_hash(site_name, product_url, title=''):
+    """Value of Deal.deal_hash for a listing"""
+    return hashlib.sha256(product_key(site_name, product_url, title).encode()).hexdigest()
@@ -0,0 +1,178 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from deals.models import Deal, DealCategory, EcommerceSite
+from deals.search import index_deals
+
+# Path, and the most queries one uncached request may issue. Cached requests
+# should issue none.
+VIEW_BUDGETS = [
+    ('/', 5),
+    ('/?category=electronics', 5),
+    ('/?sort=discounted_price&page=50', 5),
+    ('/today/', 1),
+    ('/search/', 2),
+    ('/search/?q=wireless+speaker', 2),
+    ('/api/deals/?limit=50', 2),
+    ('/api/search/?q=speaker', 2),
+]
+
+TITLE_WORDS = [
+    'wireless', 'speaker', 'headphones', 'laptop', 'charger', 'cable', 'phone', 'case', 'shoes', 'jacket',
+    'blender', 'lamp', 'novel', 'yoga', 'mat', 'watch', 'camera', 'backpack', 'kettle', 'mouse',
+]
+SEED_CHUNK_SIZE = 5000
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class Command(BaseCommand):
+    help = ('Measure p50/p99 latency and queries per request of the deal views on a seeded '
+            'test database, and fail when a view exceeds its query budget')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--deals',
+            type=int,
+            default=100_000,
+            help='Deals seeded into the throwaway test database'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100,
+            help='Requests per view, both with an empty and a warm cache'
+        )
+        parser.add_argument(
+            '--url',
+            help='Load-test a running server (e.g. gunicorn) at this base URL instead; '
+                 'it serves its own database and only latency is reported'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Requests in flight at once with --url'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the generated deals'
+        )
+
+    def handle(self, *args, **options):
+        if options['url']:
+            self.load_test(options['url'].rstrip('/'), options['requests'], options['concurrency'])
+            return
+
+        # A private cache, so clearing it between requests leaves the real one alone
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            ALLOWED_HOSTS=['testserver'],
+            DEBUG=False,
+        ):
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                started = time.perf_counter()
+                self.seed(options['deals'], options['seed'])
+                self.stdout.write(f"Seeded {options['deals']} deals in {time.perf_counter() - started:.1f}s "
+                                  f"on {connection.vendor}")
+                over_budget = self.benchmark(options['requests'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if over_budget:
+            raise CommandError(f"Over query budget: {', '.join(over_budget)}")
+        self.stdout.write(self.style.SUCCESS('Every view is within its query budget'))
+
+    def seed(self, count, seed):
+        rng = random.Random(seed)
+        sites = [
+            EcommerceSite.objects.create(name=name, base_url=f'https://{name}.test/', deals_page_url=f'https://{name}.test/d')
+            for name in ['amazon', 'flipkart', 'walmart']
+        ]
+        electronics = DealCategory.objects.create(name='Electronics', slug='electronics')
+        categories = [electronics] + [
+            DealCategory.objects.create(name=name.title(), slug=name, parent=parent)
+            for name, parent in [('audio', electronics), ('phones', electronics), ('fashion', None), ('home', None)]
+        ]
+
+        for start in range(0, count, SEED_CHUNK_SIZE):
+            deals = Deal.objects.bulk_create([
+                Deal(
+                    title=' '.join(rng.choices(TITLE_WORDS, k=4)) + f' {n}',
+                    discounted_price=rng.randint(100, 50000) / 100,
+                    original_price=600,
+                    discount_percentage=rng.randint(0, 90),
+                    deal_score=rng.randint(0, 100),
+                    product_url=f'https://shop.test/p/{n}',
+                    source_site=rng.choice(sites),
+                    category=rng.choice(categories),
+                    is_active=rng.random() < 0.8,
+                    deal_hash=f'seed-{n}',
+                )
+                for n in range(start, min(start + SEED_CHUNK_SIZE, count))
+            ])
+            index_deals([deal.pk for deal in deals if deal.pk])
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def benchmark(self, requests):
+        """Time every view with an empty and a warm cache; returns the views over budget"""
+        client = Client()
+        over_budget = []
+        self.stdout.write(f"{'view':<36} {'cache':>6} {'p50 ms':>8} {'p99 ms':>8} {'queries':>8}")
+        for path, budget in VIEW_BUDGETS:
+            for label in ('empty', 'warm'):
+                latencies = []
+                most_queries = 0
+                for _ in range(requests):
+                    if label == 'empty':
+                        cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = client.get(path)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f"{path} returned {response.status_code}")
+                    most_queries = max(most_queries, len(queries))
+
+                allowed = budget if label == 'empty' else 0
+                # Search pages are not cached whole; their ids are
+                if label == 'warm' and path.startswith('/search/'):
+                    allowed = budget
+                line = (f"{path:<36} {label:>6} {percentile(latencies, 50):8.1f} "
+                        f"{percentile(latencies, 99):8.1f} {most_queries:>8}")
+                if most_queries > allowed:
+                    over_budget.append(f"{path} ({label} cache: {most_queries} > {allowed})")
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+        return over_budget
+
+    def load_test(self, base_url, requests, concurrency):
+        """Latency of every view on a running server, with requests in flight concurrently"""
+        def fetch(path):
+            started = time.perf_counter()
+            with urlopen(base_url + path, timeout=30) as response:
+                response.read()
+            return (time.perf_counter() - started) * 1000
+
+        self.stdout.write(f"{'view':<36} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for path, budget in VIEW_BUDGETS:
+                started = time.perf_counter()
+                latencies = list(pool.map(fetch, [path] * requests))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{path:<36} {percentile(latencies, 50):8.1f} "
+                                  f"{percentile(latencies, 99):8.1f} {requests / elapsed:8.1f}")
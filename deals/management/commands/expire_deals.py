@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from deals.expiry import ARCHIVE_AFTER_DAYS, EXPIRE_CHUNK_SIZE, archive_deals, expire_deals
+
+class Command(BaseCommand):
+    help = 'Deactivate deals no longer listed or past valid_until, and archive long-inactive ones'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive-days',
+            type=int,
+            default=ARCHIVE_AFTER_DAYS,
+            help='Archive inactive deals not seen for this many days'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPIRE_CHUNK_SIZE,
+            help='Number of deals updated or archived per statement'
+        )
+    
+    def handle(self, *args, **options):
+        expired = expire_deals(chunk_size=options['chunk_size'])
+        for site_name, count in expired.items():
+            label = site_name or 'past valid_until'
+            self.stdout.write(self.style.SUCCESS(f"{label}: deactivated {count} deals"))
+        
+        archived = archive_deals(older_than_days=options['archive_days'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} deals"))
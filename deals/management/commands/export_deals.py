@@ -0,0 +1,50 @@
+import gzip
+from django.core.management.base import BaseCommand, CommandError
+from deals.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_lines, parse_since
+
+class Command(BaseCommand):
+    help = 'Stream the active deal feed, or deals seen since a timestamp, to a file or stdout'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=list(EXPORT_FORMATS),
+            default='ndjson',
+            help='ndjson: one object per deal, csv, or columnar: one line of column arrays per row group'
+        )
+        parser.add_argument(
+            '--since',
+            help='Only deals seen on their site at or after this ISO date or timestamp, active or not'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write, gzip-compressed if it ends in .gz; stdout by default'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help='Rows read from the database per round trip'
+        )
+    
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        
+        lines = export_lines(options['format'], since, chunk_size=options['chunk_size'])
+        output = options['output']
+        if output == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        
+        opener = gzip.open if output.endswith('.gz') else open
+        with opener(output, 'wt', encoding='utf-8', newline='') as f:
+            for line in lines:
+                f.write(line)
+        self.stdout.write(self.style.SUCCESS(f"Exported deals to {output}"))
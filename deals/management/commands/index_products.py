@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from deals.similarity import index_unassigned
+
+class Command(BaseCommand):
+    help = 'Match deals without a canonical product into the similarity index'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of deals indexed per round trip'
+        )
+    
+    def handle(self, *args, **options):
+        indexed = index_unassigned(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} deals"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from deals.scoring import RESCORE_CHUNK_SIZE, rescore_deals
+
+class Command(BaseCommand):
+    help = 'Recompute the score of every active deal'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RESCORE_CHUNK_SIZE,
+            help='Number of deals loaded and scored at a time'
+        )
+    
+    def handle(self, *args, **options):
+        result = rescore_deals(chunk_size=options['chunk_size'])
+        rate = result['scored'] / result['seconds'] if result['seconds'] > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {result['scored']} deals, {result['changed']} changed, "
+            f"in {result['seconds']:.2f}s ({rate:.0f} deals/sec)"
+        ))
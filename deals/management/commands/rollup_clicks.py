@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from deals.analytics import archive_clicks, rollup_clicks
+
+class Command(BaseCommand):
+    help = 'Update the hourly and daily click rollups and archive old raw clicks'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive-days',
+            type=int,
+            default=getattr(settings, 'CLICK_RETENTION_DAYS', 90),
+            help='Archive raw clicks older than this many days'
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Only update the rollups, keep every raw click'
+        )
+    
+    def handle(self, *args, **options):
+        hourly, daily = rollup_clicks()
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {hourly} hourly and {daily} daily rows"))
+        
+        if options['no_archive']:
+            return
+        
+        archived = archive_clicks(settings.CLICK_ARCHIVE_DIR, options['archive_days'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} clicks to {settings.CLICK_ARCHIVE_DIR}"))
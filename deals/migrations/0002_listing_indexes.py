@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-deal_score', '-id'], name='deal_active_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-discount_percentage', '-id'], name='deal_active_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['discounted_price', 'id'], name='deal_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-deal_score', '-id'], name='deal_cat_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-discount_percentage', '-id'], name='deal_cat_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'discounted_price', 'id'], name='deal_cat_price_idx'),
+        ),
+    ]
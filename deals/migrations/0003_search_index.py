@@ -0,0 +1,57 @@
+from django.db import migrations
+
+BACKFILL_CHUNK_SIZE = 5000
+
+POSTGRES_VECTOR = """
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(brand, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(tags, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("ALTER TABLE deals_deal ADD COLUMN search_vector tsvector")
+            cursor.execute("CREATE INDEX deal_search_vector_idx ON deals_deal USING GIN (search_vector)")
+            cursor.execute("SELECT coalesce(max(id), 0) FROM deals_deal")
+            max_id = cursor.fetchone()[0]
+            for start in range(0, max_id + 1, BACKFILL_CHUNK_SIZE):
+                cursor.execute(
+                    f"UPDATE deals_deal SET search_vector = {POSTGRES_VECTOR} WHERE id >= %s AND id < %s",
+                    [start, start + BACKFILL_CHUNK_SIZE],
+                )
+        elif connection.vendor == 'sqlite':
+            # prefix='2 3' keeps short prefix queries off the full term list
+            cursor.execute(
+                "CREATE VIRTUAL TABLE deals_deal_fts USING fts5("
+                "title, brand, tags, description, "
+                "tokenize='porter unicode61', prefix='2 3')"
+            )
+            cursor.execute(
+                "INSERT INTO deals_deal_fts (rowid, title, brand, tags, description) "
+                "SELECT id, title, brand, tags, description FROM deals_deal"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS deal_search_vector_idx")
+            cursor.execute("ALTER TABLE deals_deal DROP COLUMN IF EXISTS search_vector")
+        elif connection.vendor == 'sqlite':
+            cursor.execute("DROP TABLE IF EXISTS deals_deal_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0002_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
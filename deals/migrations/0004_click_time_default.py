@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 14:54
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userclick',
+            name='clicked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 14:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0004_click_time_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyClickRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('clicks', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='deals.dealcategory')),
+                ('deal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='deals.deal')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='deals.ecommercesite')),
+            ],
+            options={
+                'ordering': ['-bucket', '-clicks'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyClickRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('clicks', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='deals.dealcategory')),
+                ('deal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='deals.deal')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='deals.ecommercesite')),
+            ],
+            options={
+                'ordering': ['-bucket', '-clicks'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='hourlyclickrollup',
+            index=models.Index(fields=['bucket', 'site'], name='hourly_rollup_site_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyclickrollup',
+            constraint=models.UniqueConstraint(fields=('bucket', 'deal'), name='hourly_rollup_bucket_deal_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyclickrollup',
+            index=models.Index(fields=['bucket', 'site'], name='daily_rollup_site_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyclickrollup',
+            index=models.Index(fields=['bucket', 'category'], name='daily_rollup_category_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyclickrollup',
+            constraint=models.UniqueConstraint(fields=('bucket', 'deal'), name='daily_rollup_bucket_deal_uniq'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 4.2 on 2026-10-18 15:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+BACKFILL_CHUNK_SIZE = 2000
+PRICE_EPOCH = date(2020, 1, 1)
+
+
+def to_cents(value):
+    if value is None:
+        return None
+    return int((Decimal(str(value)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def seed_price_history(apps, schema_editor):
+    # Deals so far have kept one price since first seen; record it as history
+    Deal = apps.get_model('deals', 'Deal')
+    PriceHistory = apps.get_model('deals', 'PriceHistory')
+    last_id = 0
+    while True:
+        deals = list(Deal.objects.filter(id__gt=last_id).order_by('id')[:BACKFILL_CHUNK_SIZE])
+        if not deals:
+            break
+        last_id = deals[-1].id
+        history = []
+        for deal in deals:
+            cents = to_cents(deal.discounted_price)
+            deal.lowest_price_cents = deal.highest_price_cents = deal.low_90d_cents = cents
+            history.append(PriceHistory(
+                deal_id=deal.id,
+                day=(deal.first_seen.date() - PRICE_EPOCH).days,
+                price_cents=cents,
+                original_price_cents=to_cents(deal.original_price),
+            ))
+        Deal.objects.bulk_update(deals, ['lowest_price_cents', 'highest_price_cents', 'low_90d_cents'])
+        PriceHistory.objects.bulk_create(history)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0005_click_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deal',
+            name='highest_price_cents',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deal',
+            name='low_90d_cents',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deal',
+            name='low_90d_day',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deal',
+            name='lowest_price_cents',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.SmallIntegerField()),
+                ('price_cents', models.IntegerField()),
+                ('original_price_cents', models.IntegerField(blank=True, null=True)),
+                ('deal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='deals.deal')),
+            ],
+            options={
+                'ordering': ['deal', 'day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pricehistory',
+            constraint=models.UniqueConstraint(fields=('deal', 'day'), name='price_history_deal_day_uniq'),
+        ),
+        migrations.RunPython(seed_price_history, migrations.RunPython.noop),
+    ]
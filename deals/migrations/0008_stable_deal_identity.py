@@ -0,0 +1,177 @@
+import hashlib
+import re
+from datetime import date
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from django.db import migrations, transaction
+
+# Deals read per query, and duplicate groups merged per transaction. Each
+# transaction is short, so the table is never locked for the whole run.
+SCAN_CHUNK_SIZE = 5000
+MERGE_CHUNK_SIZE = 200
+
+PRICE_EPOCH = date(2020, 1, 1)
+LOW_WINDOW_DAYS = 90
+
+# Copy of deals.identity at the time of this migration
+ASIN_RE = re.compile(r'/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?#]|$)', re.IGNORECASE)
+IDENTITY_PARAMS = {'pid', 'id', 'itemid', 'item_id', 'product_id', 'sku'}
+REF_SEGMENT_RE = re.compile(r'/ref=[^/]*$')
+
+
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = REF_SEGMENT_RE.sub('', parts.path).rstrip('/')
+    params = sorted(
+        (key.lower(), value) for key, value in parse_qsl(parts.query)
+        if key.lower() in IDENTITY_PARAMS
+    )
+    canonical = f"{host}{path}"
+    if params:
+        canonical += '?' + urlencode(params)
+    return canonical
+
+
+def product_hash(site_name, product_url, title):
+    match = ASIN_RE.search(product_url or '')
+    if match:
+        key = f"{site_name}:asin:{match.group(1).upper()}"
+    elif product_url:
+        key = f"{site_name}:url:{canonical_url(product_url)}"
+    else:
+        key = f"{site_name}:title:{' '.join((title or '').lower().split())}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def find_duplicates(Deal):
+    """New hash per deal, and {survivor id: [duplicate ids]}.
+
+    The survivor of each group is the most recently checked deal, which
+    holds the current price.
+    """
+    new_hashes = {}
+    best = {}
+    groups = {}
+    last_id = 0
+    while True:
+        rows = list(
+            Deal.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'source_site__name', 'product_url', 'title', 'last_checked'
+            )[:SCAN_CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        for deal_id, site_name, product_url, title, last_checked in rows:
+            deal_hash = product_hash(site_name, product_url, title)
+            new_hashes[deal_id] = deal_hash
+            candidate = (last_checked, deal_id)
+            current = best.get(deal_hash)
+            if current is None:
+                best[deal_hash] = candidate
+                continue
+            survivor, loser = max(current, candidate), min(current, candidate)
+            best[deal_hash] = survivor
+            merged = groups.pop(loser[1], [])
+            groups.setdefault(survivor[1], []).extend(merged + [loser[1]])
+    return new_hashes, groups
+
+
+def merge_group(apps, survivor_id, duplicate_ids, connection):
+    Deal = apps.get_model('deals', 'Deal')
+    UserClick = apps.get_model('deals', 'UserClick')
+    PriceHistory = apps.get_model('deals', 'PriceHistory')
+    ids = [survivor_id] + duplicate_ids
+
+    survivor = Deal.objects.get(id=survivor_id)
+    duplicates = list(Deal.objects.filter(id__in=duplicate_ids))
+
+    # Clicks and price observations move to the survivor
+    UserClick.objects.filter(deal_id__in=duplicate_ids).update(deal_id=survivor_id)
+    for model_name in ('HourlyClickRollup', 'DailyClickRollup'):
+        Rollup = apps.get_model('deals', model_name)
+        totals = {}
+        for rollup in Rollup.objects.filter(deal_id__in=ids):
+            if rollup.bucket in totals:
+                totals[rollup.bucket].clicks += rollup.clicks
+            else:
+                totals[rollup.bucket] = rollup
+        Rollup.objects.filter(deal_id__in=ids).delete()
+        for rollup in totals.values():
+            rollup.pk = None
+            rollup.deal_id = survivor_id
+        Rollup.objects.bulk_create(totals.values())
+
+    history = {}
+    for row in PriceHistory.objects.filter(deal_id__in=ids).order_by('day', 'id'):
+        # The survivor's own row wins a day both recorded
+        if row.day not in history or row.deal_id == survivor_id:
+            history[row.day] = row
+    PriceHistory.objects.filter(deal_id__in=ids).delete()
+    for row in history.values():
+        row.pk = None
+        row.deal_id = survivor_id
+    PriceHistory.objects.bulk_create(history.values())
+
+    prices = [row.price_cents for row in history.values()]
+    if prices:
+        survivor.lowest_price_cents = min(prices)
+        survivor.highest_price_cents = max(prices)
+        survivor.low_90d_cents = min(prices)
+        # Marked as aged out, so the next refresh_low_prices recomputes it
+        survivor.low_90d_day = (date.today() - PRICE_EPOCH).days - LOW_WINDOW_DAYS - 1
+    survivor.first_seen = min([survivor.first_seen] + [deal.first_seen for deal in duplicates])
+    survivor.click_count += sum(deal.click_count for deal in duplicates)
+    survivor.view_count += sum(deal.view_count for deal in duplicates)
+    survivor.is_active = survivor.is_active or any(deal.is_active for deal in duplicates)
+    if survivor.product_id is None:
+        survivor.product_id = next((deal.product_id for deal in duplicates if deal.product_id), None)
+    survivor.save(update_fields=[
+        'lowest_price_cents', 'highest_price_cents', 'low_90d_cents', 'low_90d_day',
+        'first_seen', 'click_count', 'view_count', 'is_active', 'product',
+    ])
+
+    Deal.objects.filter(id__in=duplicate_ids).delete()
+    if connection.vendor == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(duplicate_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM deals_deal_fts WHERE rowid IN ({placeholders})", duplicate_ids)
+
+
+def collapse_duplicates(apps, schema_editor):
+    Deal = apps.get_model('deals', 'Deal')
+    connection = schema_editor.connection
+    new_hashes, groups = find_duplicates(Deal)
+
+    survivors = list(groups)
+    for start in range(0, len(survivors), MERGE_CHUNK_SIZE):
+        with transaction.atomic(using=connection.alias):
+            for survivor_id in survivors[start:start + MERGE_CHUNK_SIZE]:
+                merge_group(apps, survivor_id, groups[survivor_id], connection)
+                for duplicate_id in groups[survivor_id]:
+                    del new_hashes[duplicate_id]
+
+    # Old and new hashes cannot collide, so rows can be rekeyed in any order
+    deal_ids = sorted(new_hashes)
+    for start in range(0, len(deal_ids), SCAN_CHUNK_SIZE):
+        chunk = deal_ids[start:start + SCAN_CHUNK_SIZE]
+        deals = [Deal(id=deal_id, deal_hash=new_hashes[deal_id]) for deal_id in chunk]
+        with transaction.atomic(using=connection.alias):
+            Deal.objects.bulk_update(deals, ['deal_hash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    # Every batch commits on its own instead of one transaction over the table
+    atomic = False
+
+    dependencies = [
+        ('deals', '0007_similarity_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_duplicates, migrations.RunPython.noop),
+    ]
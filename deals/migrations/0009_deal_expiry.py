@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-18 15:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0008_stable_deal_identity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDeal',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=500)),
+                ('product_url', models.URLField()),
+                ('image_url', models.URLField(blank=True)),
+                ('original_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('discounted_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount_percentage', models.IntegerField()),
+                ('currency', models.CharField(default='USD', max_length=3)),
+                ('lowest_price_cents', models.IntegerField(blank=True, null=True)),
+                ('highest_price_cents', models.IntegerField(blank=True, null=True)),
+                ('source_site_id', models.BigIntegerField()),
+                ('category_id', models.BigIntegerField(blank=True, null=True)),
+                ('product_id', models.BigIntegerField(blank=True, null=True)),
+                ('deal_hash', models.CharField(db_index=True, max_length=64)),
+                ('click_count', models.IntegerField(default=0)),
+                ('first_seen', models.DateTimeField()),
+                ('last_checked', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='dailyclickrollup',
+            name='deal',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='deals.deal'),
+        ),
+        migrations.AlterField(
+            model_name='hourlyclickrollup',
+            name='deal',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='deals.deal'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['source_site', 'last_checked'], name='deal_active_checked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', True), ('valid_until__isnull', False)), fields=['valid_until'], name='deal_active_valid_until_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['last_checked'], name='deal_inactive_checked_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 15:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0009_deal_expiry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryKeyword',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(max_length=100)),
+                ('weight', models.FloatField(default=1.0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keywords', to='deals.dealcategory')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='categorykeyword',
+            constraint=models.UniqueConstraint(fields=('category', 'keyword'), name='category_keyword_uniq'),
+        ),
+    ]
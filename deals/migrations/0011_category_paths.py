@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+PATH_STEP = 6
+
+
+def fill_paths(apps, schema_editor):
+    DealCategory = apps.get_model('deals', 'DealCategory')
+    children = {}
+    for category in DealCategory.objects.order_by('id'):
+        children.setdefault(category.parent_id, []).append(category)
+
+    # Walk down from the roots so every parent has its path before its children
+    updated = []
+    stack = [(category, '', 0) for category in children.get(None, [])]
+    while stack:
+        category, parent_path, depth = stack.pop()
+        category.path = f"{parent_path}{category.id:0{PATH_STEP}d}/"
+        category.depth = depth
+        updated.append(category)
+        stack.extend((child, category.path, depth + 1) for child in children.get(category.id, []))
+    DealCategory.objects.bulk_update(updated, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0010_category_keywords'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='dealcategory',
+            options={'ordering': ['path']},
+        ),
+        migrations.AddField(
+            model_name='dealcategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dealcategory',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0011_category_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyscrapelog',
+            name='bytes_fetched',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyscrapelog',
+            name='deals_per_sec',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyscrapelog',
+            name='fetch_seconds',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyscrapelog',
+            name='pages_fetched',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyscrapelog',
+            name='parse_seconds',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyscrapelog',
+            name='status_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='dailyscrapelog',
+            name='write_seconds',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0012_scrape_log_telemetry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lshbucket',
+            name='lsh_bucket_key_idx',
+        ),
+        migrations.AddIndex(
+            model_name='lshbucket',
+            index=models.Index(fields=['key', 'id'], name='lsh_bucket_key_id_idx'),
+        ),
+    ]
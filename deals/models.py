@@ -1,6 +1,7 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Concat, Substr
 from django.utils import timezone
-import hashlib
 
 class EcommerceSite(models.Model):
     name = models.CharField(max_length=100)
@@ -15,10 +16,90 @@ class DealCategory(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE)
+    # Materialized path of zero-padded ids from the root, e.g. "000003/000017/",
+    # so a whole subtree is one path__startswith query
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    PATH_STEP = 6
+    
+    class Meta:
+        ordering = ['path']
+    
+    def save(self, *args, **kwargs):
+        parent = DealCategory.objects.get(pk=self.parent_id) if self.parent_id else None
+        if parent and self.path and parent.path.startswith(self.path):
+            raise ValueError(f"{self.name} cannot be moved under its own subtree")
+        super().save(*args, **kwargs)
+        
+        # Path and depth follow the parent; moving a category rewrites its subtree
+        path = f"{parent.path if parent else ''}{self.pk:0{self.PATH_STEP}d}/"
+        if path != self.path:
+            old_path = self.path
+            depth = parent.depth + 1 if parent else 0
+            if old_path:
+                DealCategory.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(models.Value(path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + depth - self.depth,
+                )
+            DealCategory.objects.filter(pk=self.pk).update(path=path, depth=depth)
+            self.path, self.depth = path, depth
+        
+        from .caching import bump_listing_version
+        bump_listing_version()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .caching import bump_listing_version
+        bump_listing_version()
+        return result
+    
+    @property
+    def indent(self):
+        """One step per level, for indenting the category in the sidebar"""
+        return range(self.depth)
+    
+    def get_descendants(self, include_self=True):
+        """This category's subtree, in one indexed prefix query"""
+        categories = DealCategory.objects.filter(path__startswith=self.path)
+        return categories if include_self else categories.exclude(pk=self.pk)
     
     def __str__(self):
         return self.name
 
+class CategoryKeyword(models.Model):
+    """A categorizer rule, on top of scraper/category_rules.json"""
+    category = models.ForeignKey(DealCategory, on_delete=models.CASCADE, related_name='keywords')
+    keyword = models.CharField(max_length=100)
+    weight = models.FloatField(default=1.0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'keyword'], name='category_keyword_uniq'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .caching import bump_rules_version
+        bump_rules_version()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .caching import bump_rules_version
+        bump_rules_version()
+        return result
+    
+    def __str__(self):
+        return f"{self.keyword} -> {self.category.name} ({self.weight})"
+
+class Product(models.Model):
+    """One product, however many sites list it"""
+    title = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.title[:50]
+
 class Deal(models.Model):
     # Basic Info
     title = models.CharField(max_length=500)
@@ -41,6 +122,8 @@ class Deal(models.Model):
     
     # Source Info
     source_site = models.ForeignKey(EcommerceSite, on_delete=models.CASCADE)
+    # Canonical product, matched on title similarity across sites
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='deals')
     
     # Tracking
     is_active = models.BooleanField(default=True)
@@ -56,14 +139,22 @@ class Deal(models.Model):
     # Quality Metrics
     deal_score = models.IntegerField(default=0)
     
-    # Hash for deduplication
+    # Hash of the stable product key (deals.identity), for deduplication
     deal_hash = models.CharField(max_length=64, unique=True)
     
+    # Price statistics in cents, kept up to date as PriceHistory is written
+    lowest_price_cents = models.IntegerField(null=True, blank=True)
+    highest_price_cents = models.IntegerField(null=True, blank=True)
+    low_90d_cents = models.IntegerField(null=True, blank=True)
+    # Last day (see PriceHistory.day) the 90-day low was the price; null
+    # while it still is
+    low_90d_day = models.SmallIntegerField(null=True, blank=True)
+    
     def save(self, *args, **kwargs):
-        # Generate unique hash before saving
+        # Identity comes from the site and product link, never the price
         if not self.deal_hash:
-            hash_string = f"{self.title}_{self.source_site.name}_{self.discounted_price}"
-            self.deal_hash = hashlib.sha256(hash_string.encode()).hexdigest()
+            from .identity import product_hash
+            self.deal_hash = product_hash(self.source_site.name, self.product_url, self.title)
         
         # Auto-calculate discount percentage if not provided
         if self.original_price and self.discounted_price and not self.discount_percentage:
@@ -71,9 +162,112 @@ class Deal(models.Model):
             self.discount_percentage = int(discount)
         
         super().save(*args, **kwargs)
+        
+        # Keep full-text search in step with edits made one row at a time
+        from .search import index_deals
+        index_deals([self.pk])
+    
+    class Meta:
+        # Partial indexes for the listing queries: active deals, optionally
+        # in one category, in each sort order of the home page. The id
+        # column is the keyset pagination tie-break.
+        indexes = [
+            models.Index(fields=['-deal_score', '-id'], name='deal_active_score_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['-discount_percentage', '-id'], name='deal_active_discount_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['discounted_price', 'id'], name='deal_active_price_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['category', '-deal_score', '-id'], name='deal_cat_score_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['category', '-discount_percentage', '-id'], name='deal_cat_discount_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['category', 'discounted_price', 'id'], name='deal_cat_price_idx',
+                         condition=models.Q(is_active=True)),
+            # Expiry sweeps: active deals not seen lately, or past valid_until
+            models.Index(fields=['source_site', 'last_checked'], name='deal_active_checked_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['valid_until'], name='deal_active_valid_until_idx',
+                         condition=models.Q(is_active=True, valid_until__isnull=False)),
+            # Archiving: inactive deals by age
+            models.Index(fields=['last_checked'], name='deal_inactive_checked_idx',
+                         condition=models.Q(is_active=False)),
+        ]
     
     def __str__(self):
         return f"{self.title[:50]}... ({self.source_site.name})"
+    
+    @property
+    def is_all_time_low(self):
+        """Cheapest it has ever been seen, after at least one price drop"""
+        from .prices import is_low, to_cents
+        return is_low(to_cents(self.discounted_price), self.lowest_price_cents, self.highest_price_cents)
+    
+    @property
+    def is_90_day_low(self):
+        from .prices import is_low, to_cents
+        return is_low(to_cents(self.discounted_price), self.low_90d_cents, self.highest_price_cents)
+
+class PriceHistory(models.Model):
+    """A deal's price from a given day, stored only when it changes"""
+    deal = models.ForeignKey(Deal, on_delete=models.CASCADE, related_name='price_history')
+    # Days since prices.PRICE_EPOCH
+    day = models.SmallIntegerField()
+    price_cents = models.IntegerField()
+    original_price_cents = models.IntegerField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['deal', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['deal', 'day'], name='price_history_deal_day_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.deal_id} day {self.day}: {self.price_cents}"
+
+class ArchivedDeal(models.Model):
+    """A deal moved out of the Deal table long after it expired.
+    
+    It keeps the deal's id, so click rollups still resolve to it.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=500)
+    product_url = models.URLField()
+    image_url = models.URLField(blank=True)
+    original_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discounted_price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_percentage = models.IntegerField()
+    currency = models.CharField(max_length=3, default='USD')
+    lowest_price_cents = models.IntegerField(null=True, blank=True)
+    highest_price_cents = models.IntegerField(null=True, blank=True)
+    # Plain ids: archived rows never block deleting a site, category or product
+    source_site_id = models.BigIntegerField()
+    category_id = models.BigIntegerField(null=True, blank=True)
+    product_id = models.BigIntegerField(null=True, blank=True)
+    deal_hash = models.CharField(max_length=64, db_index=True)
+    click_count = models.IntegerField(default=0)
+    first_seen = models.DateTimeField()
+    last_checked = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return self.title[:50]
+
+class DealSignature(models.Model):
+    """MinHash signature of a deal's title, kept out of the Deal row"""
+    deal = models.OneToOneField(Deal, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    signature = models.BinaryField()
+
+class LshBucket(models.Model):
+    """One LSH band of a deal's signature; deals sharing a key are match candidates"""
+    key = models.BigIntegerField()
+    deal = models.ForeignKey(Deal, on_delete=models.CASCADE, related_name='+')
+    
+    class Meta:
+        indexes = [
+            # Rows of one bucket come back newest first without a sort
+            models.Index(fields=['key', 'id'], name='lsh_bucket_key_id_idx'),
+        ]
 
 class DailyScrapeLog(models.Model):
     site = models.ForeignKey(EcommerceSite, on_delete=models.CASCADE)
@@ -83,6 +277,14 @@ class DailyScrapeLog(models.Model):
     deals_added = models.IntegerField(default=0)
     status = models.CharField(max_length=20, default='pending')
     error_message = models.TextField(blank=True)
+    # Where the run spent its time, filled in from the scraper's SiteMetrics
+    pages_fetched = models.IntegerField(default=0)
+    bytes_fetched = models.BigIntegerField(default=0)
+    status_counts = models.JSONField(default=dict, blank=True)
+    fetch_seconds = models.FloatField(default=0)
+    parse_seconds = models.FloatField(default=0)
+    write_seconds = models.FloatField(default=0)
+    deals_per_sec = models.FloatField(default=0)
     
     def __str__(self):
         return f"{self.site.name} - {self.started_at.date()}"
@@ -91,9 +293,47 @@ class UserClick(models.Model):
     deal = models.ForeignKey(Deal, on_delete=models.CASCADE)
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField(blank=True)
-    clicked_at = models.DateTimeField(auto_now_add=True)
+    # Set by the click buffer to the time of the click, not of the flush
+    clicked_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         indexes = [
             models.Index(fields=['clicked_at', 'deal']),
-        ]
\ No newline at end of file
+        ]
+
+class ClickRollup(models.Model):
+    """Clicks per deal in one time bucket"""
+    # Site and category are copied in so per-site and per-category totals
+    # are answered from the rollup alone
+    bucket = models.DateTimeField()
+    # No database constraint: rollups outlive archived deals (ArchivedDeal keeps the id)
+    deal = models.ForeignKey(Deal, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    site = models.ForeignKey(EcommerceSite, on_delete=models.CASCADE)
+    category = models.ForeignKey(DealCategory, on_delete=models.SET_NULL, null=True, blank=True)
+    clicks = models.IntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+        ordering = ['-bucket', '-clicks']
+    
+    def __str__(self):
+        return f"{self.deal_id} @ {self.bucket}: {self.clicks}"
+
+class HourlyClickRollup(ClickRollup):
+    class Meta(ClickRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'deal'], name='hourly_rollup_bucket_deal_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket', 'site'], name='hourly_rollup_site_idx'),
+        ]
+
+class DailyClickRollup(ClickRollup):
+    class Meta(ClickRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'deal'], name='daily_rollup_bucket_deal_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket', 'site'], name='daily_rollup_site_idx'),
+            models.Index(fields=['bucket', 'category'], name='daily_rollup_category_idx'),
+        ]
@@ -0,0 +1,193 @@
+import base64
+from bisect import bisect_left, bisect_right
+import json
+from decimal import Decimal, InvalidOperation
+from django.db.models import Q
+
+# Sort option -> (field, descending). The primary key breaks ties, so every
+# listing has a total order and a page boundary is a single (value, id) pair.
+KEYSET_ORDERINGS = {
+    '-deal_score': ('deal_score', True),
+    '-discount_percentage': ('discount_percentage', True),
+    'discounted_price': ('discounted_price', False),
+}
+
+# Cursor ids and integer sort values are 64-bit columns
+MAX_CURSOR_ID = 2 ** 63 - 1
+MAX_CURSOR_VALUE = Decimal(MAX_CURSOR_ID)
+
+class InvalidCursor(ValueError):
+    pass
+
+def keyset_order(sort):
+    """order_by() arguments for a sort option, including the id tie-break"""
+    field, descending = KEYSET_ORDERINGS[sort]
+    prefix = '-' if descending else ''
+    return [f'{prefix}{field}', f'{prefix}id']
+
+def encode_cursor(value, pk, direction):
+    payload = json.dumps({'v': str(value), 'id': pk, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, max_value=MAX_CURSOR_VALUE):
+    """(value, id, direction) of a cursor token.
+
+    Raises InvalidCursor unless the value is a finite number below max_value
+    and the id fits in a 64-bit column, so a tampered token is never queried.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d']
+        value = Decimal(payload['v'])
+        pk = int(payload['id'])
+        if direction not in ('next', 'prev') or not value.is_finite() or abs(value) >= max_value:
+            raise InvalidCursor(token)
+        if not 0 <= pk <= MAX_CURSOR_ID:
+            raise InvalidCursor(token)
+        return value, pk, direction
+    except (ValueError, KeyError, TypeError, OverflowError, InvalidOperation) as e:
+        raise InvalidCursor(token) from e
+
+def max_cursor_value(field):
+    """Bound on cursor values for a model field, so a tampered one cannot overflow the column"""
+    if field.get_internal_type() == 'DecimalField':
+        # One under the largest integer part, so rounding to decimal_places stays in range
+        return Decimal(10) ** (field.max_digits - field.decimal_places) - 1
+    return MAX_CURSOR_VALUE
+
+
+class KeysetPage:
+    """One page of a keyset listing, with opaque next/previous tokens"""
+
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor, prev_cursor, total_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total_count = total_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Cursor pagination on (sort field, id).
+
+    Every page is a range scan starting at the cursor, so page 500 costs the
+    same as page 1. There is no COUNT(*); pass total_count if the caller has
+    a cached or approximate total to show.
+    """
+
+    def __init__(self, queryset, sort, per_page, total_count=None):
+        if sort not in KEYSET_ORDERINGS:
+            raise ValueError(f"Unsupported keyset sort: {sort}")
+        self.queryset = queryset
+        self.field, self.descending = KEYSET_ORDERINGS[sort]
+        self.sort = sort
+        self.per_page = per_page
+        self.total_count = total_count
+        self.max_value = max_cursor_value(queryset.model._meta.get_field(self.field))
+
+    def _after(self, value, pk, descending):
+        """Rows strictly after (value, pk) in the given direction"""
+        op = 'lt' if descending else 'gt'
+        # The leading inclusive bound gives the planner an index range to
+        # start from; the OR only trims ties on the boundary value
+        return Q(**{f'{self.field}__{op}e': value}) & (
+            Q(**{f'{self.field}__{op}': value})
+            | Q(**{f'id__{op}': pk})
+        )
+
+    def _position(self, row):
+        """(sort value, id) of a model instance or a .values() dict"""
+        if isinstance(row, dict):
+            return row[self.field], row['id']
+        return getattr(row, self.field), row.pk
+
+    def get_page(self, token=None):
+        """Page following (or preceding) the cursor; the first page without one"""
+        direction = 'next'
+        queryset = self.queryset
+
+        if token:
+            value, pk, direction = decode_cursor(token, self.max_value)
+            # Walking backwards is walking forwards in the reverse order
+            descending = self.descending if direction == 'next' else not self.descending
+            queryset = queryset.filter(self._after(value, pk, descending))
+        else:
+            descending = self.descending
+
+        prefix = '-' if descending else ''
+        rows = list(queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'prev':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(token)
+
+        next_cursor = prev_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(*self._position(rows[-1]), 'next')
+        if rows and has_previous:
+            prev_cursor = encode_cursor(*self._position(rows[0]), 'prev')
+
+        return KeysetPage(rows, next_cursor, prev_cursor, self.total_count)
+
+
+class RankedPaginator:
+    """Cursor pagination over an in-memory list of (rank, id), best first.
+
+    Used for search results, whose order comes from the search index rather
+    than a column. Cursors have the same format as KeysetPaginator's, so the
+    templates treat both alike.
+    """
+
+    def __init__(self, ranked, per_page, total_count=None):
+        self.ranked = ranked
+        self.per_page = per_page
+        self.total_count = total_count
+
+    @staticmethod
+    def _key(row):
+        rank, pk = row
+        return -rank, -pk
+
+    def get_page(self, token=None):
+        """Page of (rank, id) pairs following (or preceding) the cursor"""
+        start, end = 0, self.per_page
+        if token:
+            # decode_cursor only lets finite values through, so float() is safe
+            value, pk, direction = decode_cursor(token)
+            boundary = (-float(value), -pk)
+            if direction == 'next':
+                start = bisect_right(self.ranked, boundary, key=self._key)
+                end = start + self.per_page
+            else:
+                end = bisect_left(self.ranked, boundary, key=self._key)
+                start = max(0, end - self.per_page)
+
+        rows = self.ranked[start:end]
+        next_cursor = prev_cursor = None
+        if rows and end < len(self.ranked):
+            next_cursor = encode_cursor(*rows[-1], 'next')
+        if rows and start > 0:
+            prev_cursor = encode_cursor(*rows[0], 'prev')
+
+        return KeysetPage(rows, next_cursor, prev_cursor, self.total_count)
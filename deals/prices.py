@@ -0,0 +1,134 @@
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from django.db import transaction
+from django.utils import timezone
+from .models import Deal, PriceHistory
+
+# PriceHistory.day counts days from here, which fits a small integer
+PRICE_EPOCH = date(2020, 1, 1)
+
+# Window for the "lowest in 90 days" badge
+LOW_WINDOW_DAYS = 90
+
+# Deals whose 90-day low is recomputed per round trip
+REFRESH_CHUNK_SIZE = 1000
+
+def to_cents(value):
+    if value is None:
+        return None
+    return int((Decimal(str(value)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def is_low(price_cents, low_cents, highest_cents):
+    """At or below low_cents, after at least one price drop"""
+    return low_cents is not None and price_cents <= low_cents and highest_cents > price_cents
+
+def day_offset(day=None):
+    """PriceHistory.day for a date, today by default"""
+    day = day or timezone.localdate()
+    return (day - PRICE_EPOCH).days
+
+def offset_date(offset):
+    return PRICE_EPOCH + timedelta(days=offset)
+
+def price_changed(deal, deal_data):
+    return (
+        to_cents(deal.discounted_price) != to_cents(deal_data['discounted_price'])
+        or to_cents(deal.original_price) != to_cents(deal_data.get('original_price'))
+    )
+
+def apply_price(deal, old_cents, today):
+    """Update a deal's price statistics in memory for its new discounted_price"""
+    cents = to_cents(deal.discounted_price)
+    if deal.lowest_price_cents is None or cents < deal.lowest_price_cents:
+        deal.lowest_price_cents = cents
+    if deal.highest_price_cents is None or cents > deal.highest_price_cents:
+        deal.highest_price_cents = cents
+    
+    # The old price stops being current today; remember that if it was the low
+    if old_cents is not None and old_cents == deal.low_90d_cents and deal.low_90d_day is None:
+        deal.low_90d_day = today
+    if deal.low_90d_cents is None or cents <= deal.low_90d_cents:
+        deal.low_90d_cents = cents
+        deal.low_90d_day = None
+
+def record_prices(deals, today=None):
+    """Write today's PriceHistory row for deals whose price was just set.
+    
+    A second change on the same day overwrites that day's row, so history
+    holds the last price of each day the price moved.
+    """
+    if not deals:
+        return
+    today = day_offset() if today is None else today
+    existing = set(
+        PriceHistory.objects.filter(deal__in=deals, day=today).values_list('deal_id', flat=True)
+    )
+    rows = [
+        PriceHistory(
+            deal_id=deal.pk,
+            day=today,
+            price_cents=to_cents(deal.discounted_price),
+            original_price_cents=to_cents(deal.original_price),
+        )
+        for deal in deals
+    ]
+    PriceHistory.objects.bulk_create([row for row in rows if row.deal_id not in existing])
+    for row in rows:
+        if row.deal_id in existing:
+            PriceHistory.objects.filter(deal_id=row.deal_id, day=today).update(
+                price_cents=row.price_cents, original_price_cents=row.original_price_cents
+            )
+
+def low_in_window(history, start):
+    """(low price, last day it was the price or None if current) within the window.
+    
+    history is a deal's (day, price_cents) rows in day order; each price
+    holds until the day before the next row.
+    """
+    low = low_day = None
+    for n, (day, cents) in enumerate(history):
+        end = history[n + 1][0] - 1 if n + 1 < len(history) else None
+        if end is not None and end < start:
+            continue
+        if low is None or cents < low:
+            low, low_day = cents, end
+        elif cents == low:
+            low_day = end
+    return low, low_day
+
+def refresh_low_prices(today=None):
+    """Recompute the 90-day low of deals whose low has aged out of the window.
+    
+    Lows are maintained as prices are written, so only deals whose low
+    ended more than LOW_WINDOW_DAYS ago need their history read again.
+    Returns the number of deals refreshed.
+    """
+    today = day_offset() if today is None else today
+    start = today - LOW_WINDOW_DAYS
+    refreshed = 0
+    stale = Deal.objects.filter(low_90d_day__lt=start).order_by('id').values_list('id', flat=True)
+    
+    while True:
+        deal_ids = list(stale[:REFRESH_CHUNK_SIZE])
+        if not deal_ids:
+            break
+        histories = {deal_id: [] for deal_id in deal_ids}
+        rows = PriceHistory.objects.filter(deal_id__in=deal_ids).order_by('deal_id', 'day')
+        for deal_id, day, cents in rows.values_list('deal_id', 'day', 'price_cents'):
+            histories[deal_id].append((day, cents))
+        
+        deals = []
+        for deal_id, history in histories.items():
+            low, low_day = low_in_window(history, start)
+            deals.append(Deal(id=deal_id, low_90d_cents=low, low_90d_day=low_day))
+        with transaction.atomic():
+            Deal.objects.bulk_update(deals, ['low_90d_cents', 'low_90d_day'])
+        refreshed += len(deals)
+    
+    return refreshed
+
+def lowest_price_90d(deal):
+    """Lowest price in the last 90 days, from the precomputed statistics"""
+    if deal.low_90d_cents is None:
+        return deal.discounted_price
+    return Decimal(deal.low_90d_cents) / 100
@@ -0,0 +1,144 @@
+import time
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .caching import bump_listing_version
+from .models import Deal, EcommerceSite
+
+# Points each signal can add to a score; the total is capped at 100.
+# Override any of them with DEAL_SCORE_WEIGHTS in settings.
+DEFAULT_WEIGHTS = {
+    'discount': 60.0,   # scaled linearly, a 100% discount earns all of it
+    'price': 10.0,      # all of it under the first price break, half under the second
+    'freshness': 10.0,  # all of it on the first day, halving every FRESHNESS_HALF_LIFE_DAYS
+    'clicks': 10.0,     # approaches all of it as clicks per day grow past CLICKS_PER_DAY_SCALE
+    'price_low': 5.0,   # all of it when the price has dropped to its 90-day low
+}
+# Points added for the store a deal comes from; DEAL_SCORE_SITE_BONUS in
+# settings replaces the whole mapping
+DEFAULT_SITE_BONUS = {'amazon': 20.0}
+
+PRICE_BREAKS = (50, 200)
+FRESHNESS_HALF_LIFE_DAYS = 3.0
+CLICKS_PER_DAY_SCALE = 5.0
+
+# Active deals loaded per round trip when re-scoring
+RESCORE_CHUNK_SIZE = 5000
+
+# Ids per UPDATE statement when writing scores back
+WRITE_CHUNK_SIZE = 500
+
+def get_weights():
+    weights = dict(DEFAULT_WEIGHTS)
+    weights.update(getattr(settings, 'DEAL_SCORE_WEIGHTS', {}))
+    return weights
+
+def get_site_bonus():
+    return getattr(settings, 'DEAL_SCORE_SITE_BONUS', DEFAULT_SITE_BONUS)
+
+def compute_scores(discount, price, age_days, clicks_per_day, site_bonus, weights=None, at_low=None):
+    """Deal scores (0-100) for equal-length arrays of the inputs"""
+    weights = weights or get_weights()
+    discount = np.clip(np.asarray(discount, dtype=np.float64), 0, 100)
+    price = np.asarray(price, dtype=np.float64)
+    age_days = np.maximum(np.asarray(age_days, dtype=np.float64), 0)
+    clicks_per_day = np.maximum(np.asarray(clicks_per_day, dtype=np.float64), 0)
+    
+    score = discount / 100 * weights['discount']
+    score += np.where(price < PRICE_BREAKS[0], 1.0, np.where(price < PRICE_BREAKS[1], 0.5, 0.0)) * weights['price']
+    score += np.exp2(-age_days / FRESHNESS_HALF_LIFE_DAYS) * weights['freshness']
+    score += -np.expm1(-clicks_per_day / CLICKS_PER_DAY_SCALE) * weights['clicks']
+    score += np.asarray(site_bonus, dtype=np.float64)
+    if at_low is not None:
+        score += np.asarray(at_low, dtype=np.float64) * weights.get('price_low', 0.0)
+    return np.rint(np.clip(score, 0, 100)).astype(np.int64)
+
+def score_new_deals(deals, site_name):
+    """Set deal_score on unsaved deals from one site, all in one pass"""
+    if not deals:
+        return
+    bonus = get_site_bonus().get(site_name, 0.0)
+    scores = compute_scores(
+        [deal.discount_percentage or 0 for deal in deals],
+        [deal.discounted_price or 0 for deal in deals],
+        np.zeros(len(deals)),
+        np.zeros(len(deals)),
+        np.full(len(deals), bonus),
+    )
+    for deal, score in zip(deals, scores.tolist()):
+        deal.deal_score = score
+
+def site_bonus_lookup():
+    """Array mapping site id to its bonus, for fancy-indexing a column of site ids"""
+    bonus_by_name = get_site_bonus()
+    sites = list(EcommerceSite.objects.values_list('id', 'name'))
+    lookup = np.zeros(max((site_id for site_id, _ in sites), default=0) + 1)
+    for site_id, name in sites:
+        lookup[site_id] = bonus_by_name.get(name, 0.0)
+    return lookup
+
+def write_scores(ids, scores):
+    """Store scores with one UPDATE per distinct score.
+    
+    Scores are integers 0-100, so grouping by value needs at most 101
+    plain id IN (...) updates per chunk, where bulk_update would build a
+    CASE expression with a branch for every row.
+    """
+    with transaction.atomic():
+        for score in np.unique(scores).tolist():
+            score_ids = ids[scores == score].tolist()
+            for start in range(0, len(score_ids), WRITE_CHUNK_SIZE):
+                Deal.objects.filter(id__in=score_ids[start:start + WRITE_CHUNK_SIZE]).update(deal_score=score)
+
+def rescore_deals(chunk_size=RESCORE_CHUNK_SIZE, now=None, weights=None):
+    """Recompute deal_score for every active deal.
+    
+    Deals are read a chunk at a time as columns, scored with array
+    arithmetic and only the scores that moved are written back.
+    Returns the number of deals scored and changed, and the seconds taken.
+    """
+    started = time.perf_counter()
+    now = (now or timezone.now()).timestamp()
+    weights = weights or get_weights()
+    bonus_by_site = site_bonus_lookup()
+    scored = changed = 0
+    last_id = 0
+    
+    while True:
+        rows = list(
+            Deal.objects.filter(is_active=True, id__gt=last_id).order_by('id').values_list(
+                'id', 'discount_percentage', 'discounted_price', 'first_seen',
+                'click_count', 'source_site_id', 'deal_score', 'low_90d_cents', 'highest_price_cents',
+            )[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ids, discount, price, first_seen, clicks, site_ids, old_scores, low, highest = zip(*rows)
+        
+        # Deals without price statistics compare as NaN, never at a low
+        price_cents = np.rint(np.array(price, dtype=np.float64) * 100)
+        low = np.array(low, dtype=np.float64)
+        highest = np.array(highest, dtype=np.float64)
+        at_low = (price_cents <= low) & (highest > price_cents)
+        
+        age_days = (now - np.array([seen.timestamp() for seen in first_seen])) / 86400
+        # No impressions are recorded, so the click rate is clicks per day
+        # listed, counting anything younger than a day as a full day
+        clicks_per_day = np.array(clicks, dtype=np.float64) / np.maximum(age_days, 1.0)
+        scores = compute_scores(
+            discount, price, age_days, clicks_per_day,
+            bonus_by_site[np.array(site_ids, dtype=np.int64)], weights, at_low,
+        )
+        
+        moved = np.flatnonzero(scores != np.array(old_scores))
+        if len(moved):
+            write_scores(np.array(ids, dtype=np.int64)[moved], scores[moved])
+        scored += len(rows)
+        changed += len(moved)
+    
+    if changed:
+        bump_listing_version()
+    
+    return {'scored': scored, 'changed': changed, 'seconds': time.perf_counter() - started}
@@ -0,0 +1,184 @@
+import re
+from django.core.cache import cache
+from django.db import connection
+from .caching import LISTING_TIMEOUT, listing_cache_key
+
+# Blend of text relevance and deal quality used to order results
+RANK_WEIGHT = 1.0
+SCORE_WEIGHT = 0.5
+
+# A search returns at most this many deals, best first
+MAX_RESULTS = 1000
+
+# Rows per statement when re-indexing deals
+INDEX_CHUNK_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+POSTGRES_VECTOR = """
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(brand, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(tags, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+"""
+
+def search_tokens(query):
+    return [token.lower() for token in TOKEN_RE.findall(query)][:10]
+
+def index_deals(deal_ids):
+    """Bring the search index up to date for the given deals"""
+    deal_ids = list(deal_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(deal_ids), INDEX_CHUNK_SIZE):
+            chunk = deal_ids[start:start + INDEX_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"UPDATE deals_deal SET search_vector = {POSTGRES_VECTOR} WHERE id IN ({placeholders})",
+                    chunk,
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(f"DELETE FROM deals_deal_fts WHERE rowid IN ({placeholders})", chunk)
+                cursor.execute(
+                    "INSERT INTO deals_deal_fts (rowid, title, brand, tags, description) "
+                    f"SELECT id, title, brand, tags, description FROM deals_deal WHERE id IN ({placeholders})",
+                    chunk,
+                )
+
+def remove_deals(deal_ids):
+    """Drop deleted deals from the SQLite index (Postgres keeps it on the row)"""
+    if connection.vendor != 'sqlite':
+        return
+    deal_ids = list(deal_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(deal_ids), INDEX_CHUNK_SIZE):
+            chunk = deal_ids[start:start + INDEX_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM deals_deal_fts WHERE rowid IN ({placeholders})", chunk)
+
+def _postgres_query(tokens):
+    """tsquery SQL and params: every word must match, the last one may be a prefix of a longer word.
+
+    plainto_tsquery drops stop words and punctuation instead of failing on
+    them; the prefix part is only ever a single \\w+ token.
+    """
+    return (
+        "(plainto_tsquery('english', %s) && to_tsquery('english', %s))",
+        [' '.join(tokens[:-1]), f"{tokens[-1]}:*"],
+    )
+
+def _postgres_search(tokens):
+    query_sql, query_params = _postgres_query(tokens)
+    sql = f"""
+        SELECT id, ts_rank(search_vector, query) * %s + deal_score / 100.0 * %s AS rank
+        FROM deals_deal, {query_sql} query
+        WHERE is_active AND search_vector @@ query
+        ORDER BY rank DESC, id DESC
+        LIMIT %s
+    """
+    return sql, [RANK_WEIGHT, SCORE_WEIGHT] + query_params + [MAX_RESULTS]
+
+def _postgres_count(tokens):
+    query_sql, query_params = _postgres_query(tokens)
+    sql = f"SELECT count(*) FROM deals_deal, {query_sql} query WHERE is_active AND search_vector @@ query"
+    return sql, query_params
+
+def _sqlite_match(tokens):
+    return ' '.join(
+        f'"{token}"*' if n == len(tokens) - 1 else f'"{token}"' for n, token in enumerate(tokens)
+    )
+
+def _sqlite_search(tokens):
+    # bm25() is lower for better matches, hence the negation
+    sql = """
+        SELECT d.id, -bm25(deals_deal_fts, 10.0, 5.0, 5.0, 1.0) * %s + d.deal_score / 100.0 * %s AS rank
+        FROM deals_deal_fts f JOIN deals_deal d ON d.id = f.rowid
+        WHERE deals_deal_fts MATCH %s AND d.is_active = 1
+        ORDER BY rank DESC, d.id DESC
+        LIMIT %s
+    """
+    return sql, [RANK_WEIGHT, SCORE_WEIGHT, _sqlite_match(tokens), MAX_RESULTS]
+
+def _sqlite_count(tokens):
+    sql = """
+        SELECT count(*) FROM deals_deal_fts f JOIN deals_deal d ON d.id = f.rowid
+        WHERE deals_deal_fts MATCH %s AND d.is_active = 1
+    """
+    return sql, [_sqlite_match(tokens)]
+
+def _fallback_queryset(tokens):
+    from django.db.models import Q
+    from .models import Deal
+    deals = Deal.objects.filter(is_active=True)
+    for token in tokens:
+        deals = deals.filter(
+            Q(title__icontains=token) | Q(description__icontains=token)
+            | Q(brand__icontains=token) | Q(tags__icontains=token)
+        )
+    return deals
+
+def _fallback_search(tokens):
+    deals = _fallback_queryset(tokens).order_by('-deal_score', '-id')
+    return [(float(score), deal_id) for deal_id, score in deals.values_list('id', 'deal_score')[:MAX_RESULTS]]
+
+def _run(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+def _postgres_is_stop_words(tokens):
+    query_sql, query_params = _postgres_query(tokens)
+    return _run(f"SELECT numnode({query_sql})", query_params)[0][0] == 0
+
+def search_ranked(query):
+    """(rank, id) of the best MAX_RESULTS active deals matching query, best first.
+
+    Cached until the next ingest; search_deal_ids and the search view page
+    through this list.
+    """
+    tokens = search_tokens(query)
+    if not tokens:
+        return []
+
+    key = listing_cache_key('search', q=' '.join(tokens))
+    ranked = cache.get(key)
+    if ranked is not None:
+        return ranked
+
+    if connection.vendor == 'postgresql':
+        ranked = [(float(rank), deal_id) for deal_id, rank in _run(*_postgres_search(tokens))]
+        # The index leaves stop words out, so "the" alone can only match by substring
+        if not ranked and _postgres_is_stop_words(tokens):
+            ranked = _fallback_search(tokens)
+    elif connection.vendor == 'sqlite':
+        ranked = [(float(rank), deal_id) for deal_id, rank in _run(*_sqlite_search(tokens))]
+    else:
+        ranked = _fallback_search(tokens)
+
+    cache.set(key, ranked, LISTING_TIMEOUT)
+    return ranked
+
+def search_deal_ids(query):
+    """Ids of active deals matching query, best first, cached until the next ingest"""
+    return [deal_id for rank, deal_id in search_ranked(query)]
+
+def search_count(query):
+    """How many active deals match query, including those past MAX_RESULTS"""
+    ranked = search_ranked(query)
+    if len(ranked) < MAX_RESULTS:
+        return len(ranked)
+
+    tokens = search_tokens(query)
+    key = listing_cache_key('search-count', q=' '.join(tokens))
+    count = cache.get(key)
+    if count is None:
+        if connection.vendor == 'postgresql':
+            count = _run(*_postgres_count(tokens))[0][0]
+            if not count and _postgres_is_stop_words(tokens):
+                count = _fallback_queryset(tokens).count()
+        elif connection.vendor == 'sqlite':
+            count = _run(*_sqlite_count(tokens))[0][0]
+        else:
+            count = _fallback_queryset(tokens).count()
+        cache.set(key, count, LISTING_TIMEOUT)
+    return count
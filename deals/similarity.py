@@ -0,0 +1,169 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .models import Deal, DealSignature, LshBucket, Product
+
+# MinHash signature length, split into LSH bands of ROWS_PER_BAND values.
+# Two titles share a band (and become candidates) with probability about
+# 1 - (1 - J^4)^16 for Jaccard similarity J: ~0.5 at J=0.5, ~0.98 at J=0.8.
+NUM_PERM = 64
+ROWS_PER_BAND = 4
+NUM_BANDS = NUM_PERM // ROWS_PER_BAND
+
+# Estimated similarity needed to join an existing product
+MATCH_THRESHOLD = 0.8
+
+# Characters per title shingle
+SHINGLE_SIZE = 4
+
+# Candidates read per bucket, newest deals first. The database trims each
+# bucket, so a very common one (a stock phrase in many titles) sends at most
+# this many rows back however large it grows.
+MAX_BUCKET_CANDIDATES = 50
+
+# Bucket keys per query, under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 900
+
+MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)
+PERM_A = _rng.randint(1, MERSENNE_PRIME, NUM_PERM).astype(np.uint64)
+PERM_B = _rng.randint(0, MERSENNE_PRIME, NUM_PERM).astype(np.uint64)
+
+WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+def normalize_title(title):
+    return ' '.join(WORD_RE.findall((title or '').lower()))
+
+def shingles(title):
+    text = normalize_title(title)
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def minhash(title):
+    """MinHash signature of a title's character shingles, as uint32 values"""
+    hashed = np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in shingles(title)), dtype=np.uint64
+    ) % MERSENNE_PRIME
+    # (a * x + b) mod p for every permutation and shingle; both factors are
+    # below 2^31, so the product fits in 64 bits
+    values = (np.outer(PERM_A, hashed) + PERM_B[:, None]) % MERSENNE_PRIME
+    return values.min(axis=1).astype(np.uint32)
+
+def band_keys(signature):
+    """One bucket key per band; the band number is hashed in so keys never collide across bands"""
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].astype('<u4').tobytes()
+        digest = hashlib.blake2b(bytes([band]) + rows, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(signature == other))
+
+def load_signature(data):
+    return np.frombuffer(data, dtype='<u4').astype(np.uint32)
+
+def find_candidates(keys_by_deal):
+    """Indexed deals sharing a bucket with each deal, as {deal id: {candidate ids}}"""
+    deals_by_key = {}
+    for deal_id, keys in keys_by_deal.items():
+        for key in keys:
+            deals_by_key.setdefault(key, []).append(deal_id)
+    
+    candidates = {deal_id: set() for deal_id in keys_by_deal}
+    all_keys = list(deals_by_key)
+    for start in range(0, len(all_keys), LOOKUP_CHUNK_SIZE):
+        rows = LshBucket.objects.filter(key__in=all_keys[start:start + LOOKUP_CHUNK_SIZE]).annotate(
+            position=Window(RowNumber(), partition_by=F('key'), order_by=F('id').desc()),
+        ).filter(position__lte=MAX_BUCKET_CANDIDATES)
+        for key, candidate_id in rows.values_list('key', 'deal_id'):
+            for deal_id in deals_by_key[key]:
+                candidates[deal_id].add(candidate_id)
+    return candidates
+
+def assign_products(deals):
+    """Index saved deals and attach each one to a canonical product.
+    
+    A deal joins the product of its most similar indexed deal, found
+    through the LSH buckets, when the estimated similarity reaches
+    MATCH_THRESHOLD; otherwise it starts a new product. Each deal costs a
+    fixed number of bucket lookups, never a scan of other deals, and deals
+    in the same call can match each other.
+    """
+    deals = [deal for deal in deals if deal.pk is not None]
+    if not deals:
+        return
+    signatures = {deal.pk: minhash(deal.title) for deal in deals}
+    keys_by_deal = {deal.pk: band_keys(signatures[deal.pk]) for deal in deals}
+    candidates = find_candidates(keys_by_deal)
+    
+    candidate_ids = set().union(*candidates.values()) - set(signatures)
+    rows = DealSignature.objects.filter(deal_id__in=candidate_ids).values_list(
+        'deal_id', 'signature', 'deal__product_id'
+    )
+    known = {deal_id: (load_signature(data), product_id) for deal_id, data, product_id in rows}
+    
+    # Buckets of deals in this call, so duplicates within one ingest batch
+    # merge too; their new products are saved together at the end
+    batch_buckets = {}
+    new_products = []
+    matched = {}
+    for deal in deals:
+        signature = signatures[deal.pk]
+        nearby = set(candidates[deal.pk])
+        for key in keys_by_deal[deal.pk]:
+            nearby.update(batch_buckets.get(key, ()))
+        
+        best_product, best_score = None, MATCH_THRESHOLD
+        for candidate_id in nearby:
+            if candidate_id == deal.pk or candidate_id not in known:
+                continue
+            other, product = known[candidate_id]
+            score = similarity(signature, other)
+            if product is not None and score >= best_score:
+                best_product, best_score = product, score
+        
+        if best_product is None:
+            best_product = Product(title=deal.title[:500])
+            new_products.append(best_product)
+        matched[deal.pk] = best_product
+        known[deal.pk] = (signature, best_product)
+        for key in keys_by_deal[deal.pk]:
+            batch_buckets.setdefault(key, []).append(deal.pk)
+    
+    with transaction.atomic():
+        Product.objects.bulk_create(new_products)
+        for deal in deals:
+            product = matched[deal.pk]
+            deal.product_id = product.pk if isinstance(product, Product) else product
+        
+        deal_ids = list(signatures)
+        DealSignature.objects.filter(deal_id__in=deal_ids).delete()
+        LshBucket.objects.filter(deal_id__in=deal_ids).delete()
+        DealSignature.objects.bulk_create([
+            DealSignature(deal_id=deal_id, signature=signature.astype('<u4').tobytes())
+            for deal_id, signature in signatures.items()
+        ])
+        LshBucket.objects.bulk_create([
+            LshBucket(key=key, deal_id=deal_id)
+            for deal_id, keys in keys_by_deal.items()
+            for key in keys
+        ], batch_size=2000)
+        Deal.objects.bulk_update(deals, ['product'])
+
+def index_unassigned(chunk_size=1000):
+    """Assign products to deals saved before the index existed; returns how many"""
+    indexed = 0
+    while True:
+        deals = list(Deal.objects.filter(product__isnull=True).order_by('id')[:chunk_size])
+        if not deals:
+            return indexed
+        assign_products(deals)
+        indexed += len(deals)
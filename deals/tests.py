@@ -1,3 +1,671 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import random
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.core.cache import cache
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .analytics import archive_clicks, rollup_clicks
+from .clicks import ClickBuffer
+from .caching import bump_listing_version, get_listing_count, get_listing_version
+from .categories import get_category_tree
+from .models import (ArchivedDeal, DailyClickRollup, Deal, DealCategory, EcommerceSite, HourlyClickRollup, LshBucket,
+                     PriceHistory, UserClick)
+from .similarity import assign_products, find_candidates, minhash, similarity
+from .scoring import compute_scores, rescore_deals
+from .expiry import archive_deals, expire_deals
+from .identity import product_hash, product_key
+from .prices import apply_price, day_offset, low_in_window, offset_date, record_prices, refresh_low_prices
+from .pagination import KeysetPaginator, encode_cursor, keyset_order
+from .search import search_count, search_deal_ids
+from .views import VALID_SORT_FIELDS, listing_queryset
 
-# Create your tests here.
+
+class ListingQueryPlanTests(TestCase):
+    """The listing queries must walk an index in sort order, never sort a table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        site = EcommerceSite.objects.create(
+            name='amazon', base_url='https://www.amazon.com', deals_page_url='https://www.amazon.com/gp/goldbox'
+        )
+        categories = [
+            DealCategory.objects.create(name=name, slug=name)
+            for name in ['electronics', 'fashion', 'home', 'books', 'sports']
+        ]
+        Deal.objects.bulk_create([
+            Deal(
+                title=f'Deal {n}',
+                discounted_price=rng.randint(100, 50000) / 100,
+                discount_percentage=rng.randint(0, 90),
+                deal_score=rng.randint(0, 100),
+                product_url=f'https://www.amazon.com/dp/{n}',
+                source_site=site,
+                category=rng.choice(categories),
+                is_active=rng.random() < 0.7,
+                deal_hash=f'hash-{n}',
+            )
+            for n in range(3000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def listing_queries(self):
+        for category_slug in ['', 'home']:
+            for sort in VALID_SORT_FIELDS:
+                # As the listing views run it, with the template's related rows joined in
+                queryset = listing_queryset(category_slug).select_related('category', 'source_site')
+                yield f'first page {category_slug or "all"} {sort}', queryset.order_by(*keyset_order(sort))[:10]
+
+                # The query behind a deep page: everything after the first page's last row
+                paginator = KeysetPaginator(queryset, sort, 9)
+                last = paginator.get_page().object_list[-1]
+                after = paginator._after(getattr(last, paginator.field), last.pk, paginator.descending)
+                deep = queryset.filter(after).order_by(*keyset_order(sort))[:10]
+                yield f'keyset page {category_slug or "all"} {sort}', deep
+
+    def assertIndexOrdered(self, label, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX deal_', plan, f'{label}:\n{plan}')
+            self.assertNotIn('TEMP B-TREE', plan, f'{label}:\n{plan}')
+        elif connection.vendor == 'postgresql':
+            self.assertIn('Index Scan', plan, f'{label}:\n{plan}')
+            self.assertNotIn('Seq Scan on deals_deal', plan, f'{label}:\n{plan}')
+            self.assertNotIn('Sort', plan, f'{label}:\n{plan}')
+        else:
+            self.skipTest(f'No plan expectations for {connection.vendor}')
+
+    def test_listing_queries_use_sort_indexes(self):
+        for label, queryset in self.listing_queries():
+            with self.subTest(label):
+                self.assertIndexOrdered(label, queryset)
+
+    def test_today_deals_uses_score_index(self):
+        queryset = Deal.objects.filter(is_active=True).order_by('-deal_score')[:9]
+        self.assertIndexOrdered('today', queryset)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ViewQueryBudgetTests(TestCase):
+    """Queries per request stay fixed however many deals a page shows; an N+1 fails here"""
+
+    @classmethod
+    def setUpTestData(cls):
+        sites = [
+            EcommerceSite.objects.create(name=name, base_url=f'https://{name}.test', deals_page_url=f'https://{name}.test/d')
+            for name in ['amazon', 'flipkart']
+        ]
+        parent = DealCategory.objects.create(name='Electronics', slug='electronics')
+        categories = [parent] + [
+            DealCategory.objects.create(name=name.title(), slug=name, parent=parent) for name in ['audio', 'phones']
+        ]
+        for n in range(30):
+            Deal.objects.create(title=f'Wireless speaker {n}', discounted_price=10 + n, original_price=99,
+                                discount_percentage=50, deal_score=n, source_site=sites[n % 2],
+                                category=categories[n % 3], product_url=f'https://shop.test/{n}')
+
+    def test_listing_views(self):
+        budgets = [
+            # count, page, category tree, active deals and stores
+            ('/', 5),
+            ('/?category=electronics&sort=discounted_price', 5),
+            ('/?page=2', 5),
+            ('/today/', 1),
+            # count and page
+            ('/search/', 2),
+            # ranked ids and their rows
+            ('/search/?q=speaker', 2),
+            ('/api/deals/?limit=50', 2),
+            ('/api/search/?q=speaker', 2),
+        ]
+        for url, queries in budgets:
+            with self.subTest(url):
+                # Counts, the category tree and search results are cached too
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                # Served from the cache until the next ingest
+                if not url.startswith('/search/'):
+                    with self.assertNumQueries(0):
+                        self.client.get(url)
+
+
+    def test_numbered_page_links_keep_the_filters(self):
+        cache.clear()
+        response = self.client.get('/', {'category': 'electronics', 'sort': 'discounted_price', 'page': 2})
+        self.assertEqual(response.context['next_query'], 'category=electronics&sort=discounted_price&page=3')
+        self.assertEqual(response.context['prev_query'], 'category=electronics&sort=discounted_price&page=1')
+        self.assertContains(response, 'href="?category=electronics&amp;sort=discounted_price&amp;page=3"')
+
+
+class ListingCacheTests(TestCase):
+    """Cached pages and counts stay until an ingest bumps the listing version"""
+
+    def setUp(self):
+        self.site = EcommerceSite.objects.create(name='amazon', base_url='https://a.test', deals_page_url='https://a.test/d')
+        self.category = DealCategory.objects.create(name='electronics', slug='electronics')
+        self.add_deal('Wireless speaker')
+
+    def add_deal(self, title):
+        Deal.objects.create(title=title, discounted_price=10, discount_percentage=50, source_site=self.site,
+                            category=self.category, product_url=f'https://a.test/{title}')
+
+    def test_pages_and_counts_follow_the_version(self):
+        self.assertContains(self.client.get('/'), 'Wireless speaker')
+        self.assertContains(self.client.get('/today/'), 'Wireless speaker')
+        self.assertEqual(get_listing_count(Deal.objects.all(), 'all'), 1)
+        version = get_listing_version()
+
+        self.add_deal('Desk lamp')
+        self.assertNotContains(self.client.get('/'), 'Desk lamp')
+        self.assertNotContains(self.client.get('/today/'), 'Desk lamp')
+        self.assertEqual(get_listing_count(Deal.objects.all(), 'all'), 1)
+
+        bump_listing_version()
+        self.assertNotEqual(get_listing_version(), version)
+        self.assertContains(self.client.get('/'), 'Desk lamp')
+        self.assertContains(self.client.get('/today/'), 'Desk lamp')
+        self.assertEqual(get_listing_count(Deal.objects.all(), 'all'), 2)
+
+    def test_ingest_bumps_the_version(self):
+        from scraper.scraping_manager import ScrapingManager
+
+        version = get_listing_version()
+        ScrapingManager().process_deals([{
+            'title': 'USB cable', 'discounted_price': 5.0, 'original_price': 10.0, 'discount_percentage': 50,
+            'product_url': 'https://a.test/cable', 'deal_hash': 'cable', 'source': 'amazon',
+        }], 'amazon')
+        self.assertNotEqual(get_listing_version(), version)
+        self.assertContains(self.client.get('/'), 'USB cable')
+
+
+class SearchTests(TestCase):
+    """Deals are indexed on ingest and found by word or word prefix, best first"""
+
+    def setUp(self):
+        from scraper.scraping_manager import ScrapingManager
+
+        EcommerceSite.objects.create(name='amazon', base_url='https://a.test', deals_page_url='https://a.test/d')
+        ScrapingManager().process_deals([
+            {'title': f'Wireless speaker {n}', 'discounted_price': 10.0 + n, 'original_price': 99.0,
+             'discount_percentage': 50, 'product_url': f'https://a.test/speaker-{n}', 'deal_hash': f'speaker-{n}',
+             'source': 'amazon'}
+            for n in range(12)
+        ] + [
+            {'title': 'Desk lamp', 'discounted_price': 15.0, 'original_price': 30.0, 'discount_percentage': 50,
+             'product_url': 'https://a.test/lamp', 'deal_hash': 'lamp', 'source': 'amazon'},
+        ], 'amazon')
+        cache.clear()
+
+    def test_ingested_deals_match_by_word_and_prefix(self):
+        speakers = set(Deal.objects.filter(title__startswith='Wireless').values_list('id', flat=True))
+        self.assertEqual(set(search_deal_ids('speaker')), speakers)
+        self.assertEqual(set(search_deal_ids('wireless spea')), speakers)
+        self.assertEqual(set(search_deal_ids('wirel')), speakers)
+        self.assertEqual(search_deal_ids('lamp'), [Deal.objects.get(title='Desk lamp').id])
+        self.assertEqual(search_deal_ids('speaker lamp'), [])
+
+    def test_pages_follow_the_cursor(self):
+        first = self.client.get('/search/', {'q': 'speaker'})
+        self.assertEqual(first.context['total_deals'], 12)
+        page_one = [deal.id for deal in first.context['deals']]
+        self.assertEqual(len(page_one), 9)
+        self.assertNotIn('prev_query', first.context)
+
+        second = self.client.get(f"/search/?{first.context['next_query']}")
+        page_two = [deal.id for deal in second.context['deals']]
+        self.assertEqual(page_one + page_two, search_deal_ids('speaker'))
+        self.assertNotIn('next_query', second.context)
+
+        back = self.client.get(f"/search/?{second.context['prev_query']}")
+        self.assertEqual([deal.id for deal in back.context['deals']], page_one)
+
+    def test_tampered_cursor_falls_back_to_the_first_page(self):
+        first_page = [deal.id for deal in self.client.get('/search/', {'q': 'speaker'}).context['deals']]
+        for value in ['NaN', 'sNaN', 'Infinity', '1e999']:
+            with self.subTest(value):
+                response = self.client.get('/search/', {'q': 'speaker', 'cursor': encode_cursor(value, 1, 'next')})
+                self.assertEqual([deal.id for deal in response.context['deals']], first_page)
+
+    def test_count_goes_past_max_results(self):
+        with mock.patch('deals.search.MAX_RESULTS', 5):
+            self.assertEqual(len(search_deal_ids('speaker')), 5)
+            self.assertEqual(search_count('speaker'), 12)
+            self.assertEqual(self.client.get('/api/search/', {'q': 'speaker'}).json()['count'], 12)
+
+
+class ClickTrackingTests(TestCase):
+    """Clicks redirect at once and reach the database in batches"""
+
+    def setUp(self):
+        site = EcommerceSite.objects.create(name='amazon', base_url='https://a.test', deals_page_url='https://a.test/d')
+        self.deals = [
+            Deal.objects.create(title=f'Deal {n}', discounted_price=10, discount_percentage=20, source_site=site,
+                                product_url=f'https://a.test/dp/{n}')
+            for n in range(2)
+        ]
+        self.buffer = ClickBuffer(flush_interval=60, max_events=3)
+        # Flushes are run by hand unless a test starts the thread
+        self.buffer.start = mock.Mock()
+
+    def test_flush_counts_clicks_per_deal(self):
+        first, second = self.deals
+        for deal_id in [first.id, second.id, first.id, 999999]:
+            self.buffer.record(deal_id, '10.0.0.1', 'agent')
+        self.assertEqual(UserClick.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual(UserClick.objects.filter(deal=first).count(), 2)
+        self.assertEqual(UserClick.objects.count(), 3)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.click_count, second.click_count), (2, 1))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_flush_keeps_the_events(self):
+        for n in range(3):
+            self.buffer.record(self.deals[0].id, f'10.0.0.{n}')
+        with mock.patch.object(UserClick.objects, 'bulk_create', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.assertEqual([event[1] for event in self.buffer.events], ['10.0.0.0', '10.0.0.1', '10.0.0.2'])
+        self.assertEqual(Deal.objects.get(id=self.deals[0].id).click_count, 0)
+
+        # Clicks recorded meanwhile are kept too, up to max_events
+        self.buffer.record(self.deals[0].id, '10.0.0.3')
+        with mock.patch.object(UserClick.objects, 'bulk_create', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.assertEqual([event[1] for event in self.buffer.events], ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(UserClick.objects.count(), 3)
+
+    def test_full_buffer_wakes_the_flusher(self):
+        self.buffer.record(self.deals[0].id, '10.0.0.1')
+        self.buffer.record(self.deals[0].id, '10.0.0.1')
+        self.assertFalse(self.buffer.wakeup.is_set())
+        self.buffer.record(self.deals[0].id, '10.0.0.1')
+        self.assertTrue(self.buffer.wakeup.is_set())
+
+    def test_flusher_runs_every_interval(self):
+        buffer = ClickBuffer(flush_interval=0.01)
+        flushed = threading.Event()
+        buffer.flush = flushed.set
+        buffer.start()
+        self.assertTrue(flushed.wait(5))
+
+    def redirect(self, **headers):
+        with mock.patch('deals.views.click_buffer', self.buffer):
+            response = self.client.get(f'/go/{self.deals[0].id}/', **headers)
+        self.assertRedirects(response, self.deals[0].product_url, fetch_redirect_response=False)
+        return self.buffer.events[-1][1]
+
+    def test_redirect_records_the_client_ip(self):
+        self.assertEqual(self.redirect(REMOTE_ADDR='203.0.113.5'), '203.0.113.5')
+        # Anyone can send the header; it is ignored unless a trusted proxy did
+        self.assertEqual(self.redirect(REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='1.2.3.4'), '203.0.113.5')
+
+        with override_settings(TRUSTED_PROXIES=['10.0.0.0/8']):
+            self.assertEqual(
+                self.redirect(REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='1.2.3.4, 198.51.100.7, 10.0.0.9'),
+                '198.51.100.7',
+            )
+            self.assertEqual(self.redirect(REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='1.2.3.4'), '203.0.113.5')
+            self.assertEqual(self.redirect(REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='bogus'), '0.0.0.0')
+
+
+class ClickRollupTests(TestCase):
+    def setUp(self):
+        site = EcommerceSite.objects.create(
+            name='amazon', base_url='https://www.amazon.com', deals_page_url='https://www.amazon.com/gp/goldbox'
+        )
+        category = DealCategory.objects.create(name='books', slug='books')
+        self.deal = Deal.objects.create(
+            title='Deal', discounted_price=10, discount_percentage=20, product_url='https://www.amazon.com/dp/1',
+            source_site=site, category=category, deal_hash='hash-1',
+        )
+        self.now = datetime(2026, 6, 1, 12, 30, tzinfo=dt_timezone.utc)
+
+    def click(self, when):
+        UserClick.objects.create(deal=self.deal, ip_address='127.0.0.1', clicked_at=when)
+
+    def test_rollups_are_incremental(self):
+        for hours_ago in [0, 0, 1, 30]:
+            self.click(self.now - timedelta(hours=hours_ago))
+        self.assertEqual(rollup_clicks(self.now), (3, 2))
+
+        # A late click in the last rolled hour and a new one are both picked up
+        self.click(self.now)
+        self.click(self.now + timedelta(hours=2))
+        rollup_clicks(self.now + timedelta(hours=2))
+
+        hourly = dict(HourlyClickRollup.objects.values_list('bucket', 'clicks'))
+        self.assertEqual(hourly[self.now.replace(minute=0)], 3)
+        self.assertEqual(sum(hourly.values()), 6)
+        daily = dict(DailyClickRollup.objects.values_list('bucket', 'clicks'))
+        self.assertEqual(daily[datetime(2026, 6, 1, tzinfo=dt_timezone.utc)], 5)
+        self.assertEqual(HourlyClickRollup.objects.filter(category__slug='books').count(), 4)
+
+    def test_archive_moves_only_rolled_up_clicks(self):
+        old = self.now - timedelta(days=100)
+        self.click(old)
+        self.click(old + timedelta(minutes=5))
+        with tempfile.TemporaryDirectory() as archive_dir:
+            # Nothing is rolled up yet, so nothing may leave the database
+            self.assertEqual(archive_clicks(archive_dir, 90, self.now), 0)
+
+            self.click(self.now)
+            rollup_clicks(self.now)
+            self.assertEqual(archive_clicks(archive_dir, 90, self.now), 2)
+            self.assertEqual(UserClick.objects.count(), 1)
+            self.assertEqual(DailyClickRollup.objects.get(bucket__date=old.date()).clicks, 2)
+
+            with gzip.open(f'{archive_dir}/clicks-{old.date().isoformat()}.ndjson.gz', 'rt') as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual([row['deal_id'] for row in rows], [self.deal.id, self.deal.id])
+
+
+class RescoreTests(TestCase):
+    def test_compute_scores(self):
+        scores = compute_scores(
+            discount=[50, 50, 50, 100],
+            price=[20, 20, 500, 20],
+            age_days=[0, 3, 0, 0],
+            clicks_per_day=[0, 0, 0, 1000],
+            site_bonus=[0, 0, 0, 20],
+            weights={'discount': 60, 'price': 10, 'freshness': 10, 'clicks': 10},
+        )
+        self.assertEqual(scores.tolist(), [50, 45, 40, 100])
+
+    def test_rescore_writes_only_changed_scores(self):
+        site = EcommerceSite.objects.create(
+            name='amazon', base_url='https://www.amazon.com', deals_page_url='https://www.amazon.com/gp/goldbox'
+        )
+        Deal.objects.bulk_create([
+            Deal(title=f'Deal {n}', discounted_price=500, discount_percentage=10 * n, deal_score=0,
+                 product_url=f'https://www.amazon.com/dp/{n}', source_site=site, deal_hash=f'hash-{n}',
+                 is_active=n != 3)
+            for n in range(4)
+        ])
+
+        result = rescore_deals(chunk_size=2)
+        self.assertEqual((result['scored'], result['changed']), (3, 3))
+        scores = dict(Deal.objects.values_list('discount_percentage', 'deal_score'))
+        self.assertEqual(scores, {0: 30, 10: 36, 20: 42, 30: 0})
+        self.assertEqual(rescore_deals()['changed'], 0)
+
+
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        self.site = EcommerceSite.objects.create(
+            name='amazon', base_url='https://www.amazon.com', deals_page_url='https://www.amazon.com/gp/goldbox'
+        )
+        self.deal = Deal(
+            title='Deal', discounted_price='20.00', discount_percentage=20, product_url='https://www.amazon.com/dp/1',
+            source_site=self.site, deal_hash='hash-1',
+        )
+        apply_price(self.deal, None, 100)
+        self.deal.save()
+        record_prices([self.deal], 100)
+
+    def reprice(self, price, day):
+        old_cents = round(float(self.deal.discounted_price) * 100)
+        self.deal.discounted_price = price
+        apply_price(self.deal, old_cents, day)
+        self.deal.save()
+        record_prices([self.deal], day)
+
+    def test_lows_and_badges(self):
+        self.reprice('15.00', 110)
+        self.assertTrue(self.deal.is_all_time_low)
+        self.reprice('25.00', 120)
+        self.assertFalse(self.deal.is_90_day_low)
+        self.assertEqual((self.deal.lowest_price_cents, self.deal.highest_price_cents), (1500, 2500))
+        self.assertEqual((self.deal.low_90d_cents, self.deal.low_90d_day), (1500, 120))
+
+        # Same-day changes overwrite that day's row
+        self.reprice('24.00', 120)
+        self.assertEqual(list(PriceHistory.objects.values_list('day', 'price_cents')),
+                         [(100, 2000), (110, 1500), (120, 2400)])
+
+        # Once $15 is out of the window, the low is the cheapest price seen since
+        self.assertEqual(refresh_low_prices(today=300), 1)
+        self.deal.refresh_from_db()
+        self.assertEqual((self.deal.low_90d_cents, self.deal.low_90d_day), (2400, None))
+        self.assertTrue(self.deal.is_90_day_low)
+        self.assertFalse(self.deal.is_all_time_low)
+        self.assertEqual(refresh_low_prices(today=300), 0)
+
+    def test_low_in_window(self):
+        history = [(0, 500), (10, 300), (20, 400), (30, 300), (40, 600)]
+        self.assertEqual(low_in_window(history, 0), (300, 39))
+        self.assertEqual(low_in_window(history, 40), (600, None))
+        self.assertEqual(low_in_window(history, 35), (300, 39))
+
+    def test_day_offsets_round_trip(self):
+        self.assertEqual(day_offset(date(2020, 1, 1)), 0)
+        # 2020 is a leap year
+        self.assertEqual(day_offset(date(2021, 1, 1)), 366)
+        self.assertEqual(offset_date(day_offset(date(2026, 3, 1))), date(2026, 3, 1))
+        with mock.patch('deals.prices.timezone.localdate', return_value=date(2020, 1, 31)):
+            self.assertEqual(day_offset(), 30)
+
+
+class SimilarityTests(TestCase):
+    def setUp(self):
+        self.sites = [
+            EcommerceSite.objects.create(name=name, base_url=f'https://{name}.com', deals_page_url=f'https://{name}.com/deals')
+            for name in ['amazon', 'flipkart']
+        ]
+        self.count = 0
+
+    def deal(self, title, site):
+        self.count += 1
+        return Deal.objects.create(
+            title=title, discounted_price=10, discount_percentage=10, product_url=f'https://example.com/{self.count}',
+            source_site=site, deal_hash=f'hash-{self.count}',
+        )
+
+    def test_signature_estimates_similarity(self):
+        same = similarity(minhash('Sony WH-1000XM5 Wireless Headphones'), minhash('sony wh 1000xm5 wireless headphones!'))
+        different = similarity(minhash('Sony WH-1000XM5 Wireless Headphones'), minhash('Instant Pot Duo 7-in-1 Cooker'))
+        self.assertEqual(same, 1.0)
+        self.assertLess(different, 0.2)
+
+    def test_near_duplicates_share_a_product_across_sites(self):
+        amazon, flipkart = self.sites
+        first = [self.deal('Apple AirPods Pro (2nd Generation) Wireless Earbuds', amazon),
+                 self.deal('Apple iPhone 15 128GB Black', amazon)]
+        assign_products(first)
+        # Matches within one batch as well as against the index
+        second = [self.deal('Apple AirPods Pro 2nd Generation Wireless Earbuds', flipkart),
+                  self.deal('Logitech MX Master 3S Wireless Mouse - Graphite', flipkart),
+                  self.deal('Logitech MX Master 3S Wireless Mouse Graphite Edition', amazon),
+                  self.deal('Apple iPhone 15 256GB Black', flipkart)]
+        assign_products(second)
+
+        products = dict(Deal.objects.values_list('title', 'product_id'))
+        self.assertEqual(products['Apple AirPods Pro 2nd Generation Wireless Earbuds'],
+                         products['Apple AirPods Pro (2nd Generation) Wireless Earbuds'])
+        self.assertEqual(products['Logitech MX Master 3S Wireless Mouse - Graphite'],
+                         products['Logitech MX Master 3S Wireless Mouse Graphite Edition'])
+        self.assertEqual(len(set(products.values())), 4)
+
+    def test_common_bucket_is_trimmed_in_the_query(self):
+        deals = [self.deal(f'Deal {n}', self.sites[0]) for n in range(6)]
+        LshBucket.objects.bulk_create([LshBucket(key=1, deal=deal) for deal in deals] + [LshBucket(key=2, deal=deals[0])])
+
+        with mock.patch('deals.similarity.MAX_BUCKET_CANDIDATES', 2), self.assertNumQueries(1) as queries:
+            candidates = find_candidates({0: [1, 2]})
+        # The newest deals in the bucket, and only those rows were fetched
+        self.assertEqual(candidates, {0: {deals[5].id, deals[4].id, deals[0].id}})
+        self.assertIn('ROW_NUMBER', queries.captured_queries[0]['sql'].upper())
+
+
+class ProductIdentityTests(TestCase):
+    def test_key_ignores_tracking_and_price(self):
+        self.assertEqual(product_key('amazon', 'https://www.amazon.com/Echo-Dot/dp/b09b8v1lz3/ref=deals_1?tag=x'),
+                         'amazon:asin:B09B8V1LZ3')
+        self.assertEqual(product_key('amazon', 'https://amazon.com/gp/product/B09B8V1LZ3'), 'amazon:asin:B09B8V1LZ3')
+        self.assertEqual(product_key('flipkart', 'https://www.flipkart.com/boat-airdopes/p/itm123/?pid=ACC1&lid=LST9&otracker=x'),
+                         'flipkart:url:flipkart.com/boat-airdopes/p/itm123?pid=ACC1')
+        self.assertNotEqual(product_hash('amazon', 'https://amazon.com/dp/B09B8V1LZ3'),
+                            product_hash('flipkart', 'https://amazon.com/dp/B09B8V1LZ3'))
+
+    def test_saved_deal_keeps_identity_across_price_changes(self):
+        site = EcommerceSite.objects.create(
+            name='amazon', base_url='https://www.amazon.com', deals_page_url='https://www.amazon.com/gp/goldbox'
+        )
+        first = Deal.objects.create(title='Echo Dot', discounted_price=30, discount_percentage=40, source_site=site,
+                                    product_url='https://www.amazon.com/dp/B09B8V1LZ3?tag=a')
+        second = Deal(title='Echo Dot', discounted_price=25, discount_percentage=50, source_site=site,
+                      product_url='https://www.amazon.com/Echo-Dot/dp/B09B8V1LZ3/ref=x')
+        second.deal_hash = product_hash(site.name, second.product_url, second.title)
+        self.assertEqual(first.deal_hash, second.deal_hash)
+
+
+class CategoryTreeTests(TestCase):
+    def test_paths_follow_moves_and_filter_subtrees(self):
+        electronics = DealCategory.objects.create(name='Electronics', slug='electronics')
+        audio = DealCategory.objects.create(name='Audio', slug='audio', parent=electronics)
+        headphones = DealCategory.objects.create(name='Headphones', slug='headphones', parent=audio)
+        books = DealCategory.objects.create(name='Books', slug='books')
+        self.assertEqual(headphones.path, f'{electronics.pk:06d}/{audio.pk:06d}/{headphones.pk:06d}/')
+        self.assertEqual(headphones.depth, 2)
+
+        site = EcommerceSite.objects.create(
+            name='amazon', base_url='https://www.amazon.com', deals_page_url='https://www.amazon.com/gp/goldbox'
+        )
+        for n, category in enumerate([electronics, headphones, books]):
+            Deal.objects.create(title=f'Deal {n}', discounted_price=10, discount_percentage=10, source_site=site,
+                                product_url=f'https://www.amazon.com/dp/B00000000{n}', category=category)
+        self.assertEqual(listing_queryset('electronics').count(), 2)
+        self.assertEqual(listing_queryset('audio').count(), 1)
+        self.assertEqual(listing_queryset('missing').count(), 0)
+
+        # Moving a subtree rewrites the paths below it, and the cached tree follows
+        audio.parent = books
+        audio.save()
+        headphones.refresh_from_db()
+        self.assertEqual(headphones.path, f'{books.pk:06d}/{audio.pk:06d}/{headphones.pk:06d}/')
+        self.assertEqual(headphones.depth, 2)
+        self.assertEqual(list(books.get_descendants()), [books, audio, headphones])
+        self.assertEqual([category.slug for category in get_category_tree().categories],
+                         ['electronics', 'books', 'audio', 'headphones'])
+        self.assertEqual(listing_queryset('books').count(), 2)
+        with self.assertRaises(ValueError):
+            books.parent = headphones
+            books.save()
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        site = EcommerceSite.objects.create(
+            name='amazon', base_url='https://www.amazon.com', deals_page_url='https://www.amazon.com/gp/goldbox'
+        )
+        electronics = DealCategory.objects.create(name='Electronics', slug='electronics')
+        audio = DealCategory.objects.create(name='Audio', slug='audio', parent=electronics)
+        for n, category in enumerate([electronics, audio, None]):
+            Deal.objects.create(title=f'Speaker {n}', discounted_price='19.99', original_price='39.99',
+                                discount_percentage=50, deal_score=n, source_site=site, category=category,
+                                product_url=f'https://www.amazon.com/dp/B00000000{n}')
+        # Nothing cached by another test may be served
+        bump_listing_version()
+
+    def test_deals_are_paged_by_cursor(self):
+        response = self.client.get('/api/deals/', {'limit': 2, 'category': 'electronics'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('max-age=60', response['Cache-Control'])
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([deal['title'] for deal in data['results']], ['Speaker 1', 'Speaker 0'])
+        self.assertEqual(data['results'][0]['discounted_price'], 19.99)
+        self.assertEqual((data['results'][0]['category'], data['results'][0]['site']), ('audio', 'amazon'))
+        self.assertIsNone(data['next'])
+
+        data = self.client.get('/api/deals/', {'limit': 2}).json()
+        self.assertEqual(len(data['results']), 2)
+        data = self.client.get('/api/deals/', {'limit': 2, 'cursor': data['next']}).json()
+        self.assertEqual([deal['title'] for deal in data['results']], ['Speaker 0'])
+
+    def test_tampered_cursors_fall_back_to_the_first_page(self):
+        tokens = [encode_cursor(value, 1, 'next') for value in ['NaN', 'sNaN', 'Infinity', '1e999', '123456789']]
+        tokens.append(encode_cursor('10', 10 ** 30, 'next'))
+        first_page = [deal['title'] for deal in self.client.get('/api/deals/', {'sort': 'discounted_price'}).json()['results']]
+        for token in tokens:
+            for sort in VALID_SORT_FIELDS:
+                with self.subTest(token=token, sort=sort):
+                    self.assertEqual(self.client.get('/', {'sort': sort, 'cursor': token}).status_code, 200)
+                    response = self.client.get('/api/deals/', {'sort': sort, 'cursor': token})
+                    self.assertEqual(response.status_code, 200)
+                    if sort == 'discounted_price':
+                        self.assertEqual([deal['title'] for deal in response.json()['results']], first_page)
+
+    def test_export_streams_every_format(self):
+        response = self.client.get('/api/export/', {'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['Speaker 0', 'Speaker 1', 'Speaker 2'])
+        self.assertEqual(json.loads(lines[0])['discounted_price'], '19.99')
+
+        csv_lines = b''.join(self.client.get('/api/export/', {'format': 'csv'}).streaming_content).decode().splitlines()
+        self.assertEqual(len(csv_lines), 4)
+        self.assertTrue(csv_lines[0].startswith('id,title,'))
+
+        header, group = b''.join(
+            self.client.get('/api/export/', {'format': 'columnar'}).streaming_content
+        ).decode().splitlines()
+        group = json.loads(group)
+        self.assertEqual(group['rows'], 3)
+        self.assertEqual(group['columns']['site'], {'dictionary': ['amazon'], 'codes': [0, 0, 0]})
+
+        Deal.objects.filter(title='Speaker 0').update(last_checked=timezone.now() - timedelta(days=2))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        out = io.StringIO()
+        call_command('export_deals', since=since, stdout=out)
+        self.assertEqual([json.loads(line)['title'] for line in out.getvalue().splitlines()], ['Speaker 1', 'Speaker 2'])
+        self.assertEqual(self.client.get('/api/export/', {'since': 'yesterday'}).status_code, 400)
+
+    def test_matching_etag_is_not_modified_until_the_next_ingest(self):
+        etag = self.client.get('/api/categories/')['ETag']
+        response = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        bump_listing_version()
+        response = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([category['depth'] for category in response.json()['results']], [0, 1])
+
+
+class ExpiryTests(TestCase):
+    def test_valid_until_and_archive(self):
+        site = EcommerceSite.objects.create(
+            name='amazon', base_url='https://www.amazon.com', deals_page_url='https://www.amazon.com/gp/goldbox'
+        )
+        now = timezone.now()
+        deals = [
+            Deal.objects.create(title=f'Deal {n}', discounted_price=10, discount_percentage=10, source_site=site,
+                                product_url=f'https://www.amazon.com/dp/B00000000{n}', valid_until=valid_until)
+            for n, valid_until in enumerate([now - timedelta(hours=1), now + timedelta(days=1), None])
+        ]
+        UserClick.objects.create(deal=deals[0], ip_address='127.0.0.1')
+        HourlyClickRollup.objects.create(bucket=now, deal=deals[0], site=site, clicks=1)
+
+        self.assertEqual(expire_deals(now=now, chunk_size=1), {None: 1})
+        self.assertEqual(archive_deals(older_than_days=90, now=now), 0)
+        self.assertEqual(archive_deals(older_than_days=90, now=now + timedelta(days=91), chunk_size=1), 1)
+
+        self.assertFalse(Deal.objects.filter(id=deals[0].id).exists())
+        self.assertEqual(ArchivedDeal.objects.get().id, deals[0].id)
+        self.assertEqual(HourlyClickRollup.objects.get().deal_id, deals[0].id)
+        self.assertEqual(Deal.objects.filter(is_active=True).count(), 2)
@@ -1,9 +1,14 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('today/', views.today_deals, name='today_deals'),
     path('about/', views.about, name='about'),
     path('search/', views.search_deals, name='search_deals'),
+    path('go/<int:deal_id>/', views.go_to_deal, name='go_to_deal'),
+    path('api/deals/', api.deals_api, name='api_deals'),
+    path('api/categories/', api.categories_api, name='api_categories'),
+    path('api/search/', api.search_api, name='api_search'),
+    path('api/export/', api.export_api, name='api_export'),
 ]
\ No newline at end of file
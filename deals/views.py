@@ -1,84 +1,196 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Count
-from .models import Deal, DealCategory, EcommerceSite
+from django.http import HttpResponse, HttpResponseRedirect
+from urllib.parse import urlencode
+import ipaddress
+from .clicks import click_buffer
+from .caching import LISTING_TIMEOUT, get_listing_count, get_listing_stats, listing_cache_key
+from .categories import get_category_tree
+from .models import Deal
+from .pagination import InvalidCursor, KeysetPaginator, RankedPaginator, keyset_order
+from .search import search_count, search_ranked
+
+VALID_SORT_FIELDS = ['-deal_score', '-discount_percentage', 'discounted_price']
+
+def keyset_page(deals_query, sort, cursor, total_count):
+    """Keyset page for a listing; a malformed cursor falls back to the first page"""
+    paginator = KeysetPaginator(deals_query, sort, 9, total_count=total_count)
+    try:
+        return paginator.get_page(cursor)
+    except InvalidCursor:
+        return paginator.get_page()
+
+def page_queries(page_obj, **params):
+    """Query strings for the next/previous links, keeping the listing's filters"""
+    params = {key: value for key, value in params.items() if value}
+    queries = {}
+    if getattr(page_obj, 'is_keyset', False):
+        if page_obj.next_cursor:
+            queries['next_query'] = urlencode(dict(params, cursor=page_obj.next_cursor))
+        if page_obj.prev_cursor:
+            queries['prev_query'] = urlencode(dict(params, cursor=page_obj.prev_cursor))
+    else:
+        # Numbered pages, for ?page= links from before cursors
+        if page_obj.has_next():
+            queries['next_query'] = urlencode(dict(params, page=page_obj.next_page_number()))
+        if page_obj.has_previous():
+            queries['prev_query'] = urlencode(dict(params, page=page_obj.previous_page_number()))
+    return queries
+
+def cached_render(request, cache_key, template_name, get_context):
+    """Render a listing once per ingest; get_context only runs on a cache miss"""
+    html = cache.get(cache_key)
+    if html is None:
+        response = render(request, template_name, get_context())
+        cache.set(cache_key, response.content, LISTING_TIMEOUT)
+        return response
+    return HttpResponse(html)
 
 def home(request):
     # Get filter parameters
     category_slug = request.GET.get('category', '')
     sort = request.GET.get('sort', '-deal_score')
+    if sort not in VALID_SORT_FIELDS:
+        sort = '-deal_score'
+    
+    # Listings page by cursor; ?page=N is still honoured for old links
+    cursor = request.GET.get('cursor', '')
+    page_number = None
+    if 'page' in request.GET and not cursor:
+        try:
+            page_number = int(request.GET['page'])
+        except (TypeError, ValueError):
+            page_number = 1
     
-    # Build query
+    cache_key = listing_cache_key(
+        'home', category=category_slug, sort=sort, page=page_number, cursor=cursor,
+    )
+    return cached_render(
+        request, cache_key, 'deals/home.html',
+        lambda: home_context(category_slug, sort, page_number, cursor),
+    )
+
+def listing_queryset(category_slug=''):
+    """Active deals, optionally limited to one category and its subcategories"""
     deals_query = Deal.objects.filter(is_active=True)
     
-    # Apply filters
+    # Apply filters; the cached tree turns the slug into category ids, so
+    # there is no join or recursive lookup per request
     if category_slug:
-        deals_query = deals_query.filter(category__slug=category_slug)
-    
-    # Apply sorting
-    valid_sort_fields = ['-deal_score', '-discount_percentage', 'discounted_price']
-    if sort in valid_sort_fields:
-        deals_query = deals_query.order_by(sort)
-    else:
-        deals_query = deals_query.order_by('-deal_score')
+        category_ids = get_category_tree().ids_for_slug(category_slug)
+        if len(category_ids) == 1:
+            deals_query = deals_query.filter(category_id=category_ids[0])
+        else:
+            deals_query = deals_query.filter(category_id__in=category_ids)
     
-    # Pagination
-    paginator = Paginator(deals_query, 9)  # 9 deals per page
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    return deals_query
+
+def home_context(category_slug, sort, page_number, cursor):
+    deals_query = listing_queryset(category_slug)
+    # The template shows each deal's category and store
+    page_query = deals_query.select_related('category', 'source_site')
     
-    # Get categories
-    categories = DealCategory.objects.all()
+    # Pagination, 9 deals per page
+    if page_number is None:
+        total = get_listing_count(deals_query, 'home', category=category_slug)
+        page_obj = keyset_page(page_query, sort, cursor, total)
+    else:
+        paginator = Paginator(page_query.order_by(*keyset_order(sort)), 9)
+        page_obj = paginator.get_page(page_number)
     
     # Get stats
-    total_deals = Deal.objects.filter(is_active=True).count()
-    sites_count = EcommerceSite.objects.filter(is_active=True).count()
+    stats = get_listing_stats()
     
-    context = {
+    return {
         'deals': page_obj,
-        'categories': categories,
+        'categories': get_category_tree().categories,
         'selected_category': category_slug,
-        'total_deals': total_deals,
-        'sites_count': sites_count,
+        'total_deals': stats['total_deals'],
+        'sites_count': stats['sites_count'],
+        **page_queries(page_obj, category=category_slug, sort=sort),
     }
-    
-    return render(request, 'deals/home.html', context)
 
 def today_deals(request):
     """Show today's best deals"""
-    deals = Deal.objects.filter(is_active=True).order_by('-deal_score')[:9]
+    def get_context():
+        return {
+            'deals': Deal.objects.filter(is_active=True).select_related(
+                'category', 'source_site'
+            ).order_by('-deal_score')[:9],
+            'title': "Today's Best Deals"
+        }
     
-    context = {
-        'deals': deals,
-        'title': "Today's Best Deals"
-    }
+    return cached_render(request, listing_cache_key('today'), 'deals/home.html', get_context)
+
+def trusted_proxy(address):
+    """Whether address is one of settings.TRUSTED_PROXIES"""
+    return any(address in ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES)
+
+def client_ip(request):
+    """Visitor's IP address; X-Forwarded-For only counts when a trusted proxy sent it"""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+        # Each proxy appends the address it got the request from, so the
+        # client is the right-most hop that is not one of our proxies
+        forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+        while trusted_proxy(address) and forwarded_for:
+            hop = forwarded_for.pop().strip()
+            if hop:
+                address = ipaddress.ip_address(hop)
+    except ValueError:
+        return '0.0.0.0'
+    return str(address)
+
+def go_to_deal(request, deal_id):
+    """Count a click and send the visitor on to the store"""
+    key = f'deals:product-url:{deal_id}'
+    product_url = cache.get(key)
+    if product_url is None:
+        product_url = get_object_or_404(Deal, id=deal_id).product_url
+        cache.set(key, product_url, LISTING_TIMEOUT)
     
-    return render(request, 'deals/home.html', context)
+    click_buffer.record(deal_id, client_ip(request), request.META.get('HTTP_USER_AGENT', ''))
+    return HttpResponseRedirect(product_url)
 
 def about(request):
     """About page"""
     return render(request, 'deals/about.html')
 
 def search_deals(request):
-    """Simple search function"""
+    """Full-text search over title, brand, tags and description"""
     query = request.GET.get('q', '').strip()
     
-    if query:
-        deals = Deal.objects.filter(
-            is_active=True,
-            title__icontains=query
-        ).order_by('-deal_score')
-    else:
-        deals = Deal.objects.filter(is_active=True).order_by('-deal_score')
+    if not query:
+        deals = Deal.objects.filter(is_active=True)
+        total_deals = get_listing_count(deals, 'search', q='')
+        page_obj = keyset_page(
+            deals.select_related('category', 'source_site'), '-deal_score', request.GET.get('cursor', ''), total_deals
+        )
+        context = {
+            'deals': page_obj,
+            'query': query,
+            'total_deals': total_deals,
+            **page_queries(page_obj),
+        }
+        return render(request, 'deals/home.html', context)
     
-    paginator = Paginator(deals, 9)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # Ranked ids come from the search index; only one page of rows is loaded
+    paginator = RankedPaginator(search_ranked(query), 9, total_count=search_count(query))
+    try:
+        page_obj = paginator.get_page(request.GET.get('cursor', ''))
+    except InvalidCursor:
+        page_obj = paginator.get_page()
+    deal_ids = [deal_id for rank, deal_id in page_obj.object_list]
+    deals_by_id = Deal.objects.select_related('category', 'source_site').in_bulk(deal_ids)
+    page_obj.object_list = [deals_by_id[deal_id] for deal_id in deal_ids if deal_id in deals_by_id]
     
     context = {
         'deals': page_obj,
         'query': query,
-        'total_deals': deals.count()
+        'total_deals': page_obj.total_count,
+        **page_queries(page_obj, q=query),
     }
     
-    return render(request, 'deals/home.html', context)
\ No newline at end of file
+    return render(request, 'deals/home.html', context)
@@ -95,6 +95,79 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Cache for rendered listings, stats and the listing and keyword-rule
+# versions. Web workers and the scrape_deals cron job must share it, or an
+# ingest's version bump never reaches the pages being served; on Render they
+# run in separate containers with separate disks. Redis when REDIS_URL is
+# set, otherwise a table in the shared database (python manage.py createcachetable).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'TIMEOUT': 60 * 60 * 24,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'deals_cache',
+            'TIMEOUT': 60 * 60 * 24,
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        }
+    }
+
+# JSON API responses may be served from browser and CDN caches this long;
+# clients revalidate with the ETag afterwards
+API_CACHE_MAX_AGE = 60
+
+# When set, /api/export/ requires "Authorization: Bearer <token>"
+DEALS_EXPORT_TOKEN = os.environ.get('DEALS_EXPORT_TOKEN', '')
+
+# Click tracking: events are buffered in each web process and written in
+# batches at most this often, or once this many are waiting
+CLICK_FLUSH_INTERVAL = 5.0
+CLICK_BUFFER_MAX_EVENTS = 1000
+
+# Reverse proxies (addresses or networks, comma separated) whose
+# X-Forwarded-For header is believed when recording a click's IP. Empty
+# means clients connect directly and the header is ignored.
+TRUSTED_PROXIES = [proxy.strip() for proxy in os.environ.get('TRUSTED_PROXIES', '').split(',') if proxy.strip()]
+
+# Raw clicks older than this many days are moved out of the database into
+# gzip files once they are covered by the hourly rollups
+CLICK_RETENTION_DAYS = 90
+CLICK_ARCHIVE_DIR = os.environ.get('CLICK_ARCHIVE_DIR', os.path.join(BASE_DIR, 'click_archive'))
+
+# Deal scoring weights and per-site bonuses default to DEFAULT_WEIGHTS and
+# DEFAULT_SITE_BONUS in deals/scoring.py. Set DEAL_SCORE_WEIGHTS (merged into
+# the defaults) or DEAL_SCORE_SITE_BONUS (replaces them) here to change them.
+
+# Scraper response cache: validators and compressed pages for conditional
+# requests, and for replaying a crawl offline
+SCRAPER_CACHE_DIR = os.environ.get('SCRAPER_CACHE_DIR', os.path.join(BASE_DIR, 'scrape_cache'))
+SCRAPER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Scraper progress and per-site run timings go to the console. Set
+# SCRAPER_LOG_LEVEL=DEBUG to see every parsed deal, or WARNING for quiet runs.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'scraper': {'handlers': ['console'], 'level': os.environ.get('SCRAPER_LOG_LEVEL', 'INFO')},
+        'deals': {'handlers': ['console'], 'level': os.environ.get('DEALS_LOG_LEVEL', 'INFO')},
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -8,6 +8,8 @@ from django.core.management import execute_from_command_line
 
 print("=== Running database migrations ===")
 execute_from_command_line(['manage.py', 'migrate'])
+# Table of the shared DatabaseCache; a no-op when it exists or Redis is used
+execute_from_command_line(['manage.py', 'createcachetable'])
 
 # (Optional) Uncomment and fill in details to create a superuser automatically
 # from django.contrib.auth import get_user_model
@@ -5,69 +5,122 @@ import json
 import logging
 from urllib.parse import urljoin
 import re
+from collections import namedtuple
+from deals.identity import product_hash
+from .categorizer import categorizer
+from .parsers import get_parser_backend
 
 logger = logging.getLogger(__name__)
 
+# text is None when the fetch failed or the page was not modified
+FetchResult = namedtuple('FetchResult', ['text', 'status', 'not_modified'])
+
+def parse_price(price_text):
+    """Extract numeric price from text, e.g. "$1,299.00" -> 1299.0"""
+    if not price_text:
+        return None
+    # Remove currency symbols and commas
+    price_str = re.sub(r'[^\d.]', '', price_text)
+    try:
+        return float(price_str)
+    except:
+        return None
+
+def calculate_discount(original, discounted):
+    """Discount percentage of discounted off original"""
+    if original and discounted and original > 0:
+        return int(((original - discounted) / original) * 100)
+    return 0
+
 class BaseScraper:
-    def __init__(self, site_config):
+    def __init__(self, site_config, throttle=None, cache=None, metrics=None):
         self.site_config = site_config
+        # Shared RequestThrottle when several scrapers run concurrently
+        self.throttle = throttle
+        # Optional ResponseCache for conditional requests and offline replay
+        self.cache = cache
+        # Optional SiteMetrics collecting fetch and parse timings
+        self.metrics = metrics
+        # HTML parser backend, bs4 unless the site config asks for another
+        self.parser = get_parser_backend(site_config.get('parser', 'bs4'))
+        self._field_selectors = {}
+        # Set once a crawl has seen every listing page; only then may deals
+        # missing from it be expired
+        self.crawl_complete = False
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
         
-    def get_page(self, url):
-        """Fetch page with retry logic"""
-        max_retries = 3
+    def fetch(self, url):
+        """Fetch page with retry logic, revalidating against the response cache"""
+        if self.cache and self.cache.offline:
+            started = time.perf_counter()
+            text = self.cache.get_body(url)
+            status = 200 if text is not None else None
+            if self.metrics:
+                self.metrics.record_fetch(time.perf_counter() - started, status, len(text or ''))
+            return FetchResult(text, status, False)
+        
+        headers = self.cache.conditional_headers(url) if self.cache else {}
+        max_retries = self.site_config.get('max_retries', 3)
         for attempt in range(max_retries):
+            # Every attempt is timed on its own; backoff sleeps are not fetch time
+            started = time.perf_counter()
+            status = None
+            size = 0
             try:
-                response = self.session.get(url, timeout=30)
+                if self.throttle:
+                    with self.throttle.slot(url):
+                        response = self.session.get(url, headers=headers, timeout=30)
+                else:
+                    response = self.session.get(url, headers=headers, timeout=30)
+                status = response.status_code
+                
+                if response.status_code == 304 and headers:
+                    self.cache.touch(url)
+                    return FetchResult(None, 304, True)
+                
                 response.raise_for_status()
-                return response.text
+                size = len(response.content)
+                if self.cache:
+                    self.cache.store(url, response)
+                return FetchResult(response.text, response.status_code, False)
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1} failed: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-        return None
+            finally:
+                if self.metrics:
+                    self.metrics.record_fetch(time.perf_counter() - started, status, size)
+            if attempt < max_retries - 1:
+                time.sleep(2 ** attempt)
+        return FetchResult(None, None, False)
+    
+    def get_page(self, url):
+        """Fetch page text, falling back to the cached copy when not modified"""
+        result = self.fetch(url)
+        if result.not_modified:
+            return self.cache.get_body(url)
+        return result.text
+    
+    def iter_deal_pages(self, known_hashes=None, submit_parse=None, pages_ahead=1):
+        """Yield deals page by page; scrapers without pagination yield a single page"""
+        deals = self.scrape_deals()
+        self.crawl_complete = bool(deals)
+        if deals:
+            yield deals
     
     def parse_price(self, price_text):
         """Extract numeric price from text"""
-        if not price_text:
-            return None
-        # Remove currency symbols and commas
-        price_str = re.sub(r'[^\d.]', '', price_text)
-        try:
-            return float(price_str)
-        except:
-            return None
+        return parse_price(price_text)
     
     def calculate_discount(self, original, discounted):
         """Calculate discount percentage"""
-        if original and discounted and original > 0:
-            return int(((original - discounted) / original) * 100)
-        return 0
+        return calculate_discount(original, discounted)
     
     def create_deal_hash(self, deal_data):
-        """Create unique hash for deal"""
-        import hashlib
-        hash_string = f"{deal_data['title']}_{deal_data['source']}_{deal_data['discounted_price']}"
-        return hashlib.sha256(hash_string.encode()).hexdigest()
+        """Create unique hash for deal from its site and product link"""
+        return product_hash(deal_data['source'], deal_data.get('product_url', ''), deal_data['title'])
     
     def categorize_deal(self, title):
-        """Simple categorization based on keywords"""
-        title_lower = title.lower()
-        
-        categories = {
-            'electronics': ['phone', 'laptop', 'tablet', 'earphone', 'headphone', 'charger', 'camera', 'smartwatch', 'tv'],
-            'fashion': ['shirt', 'dress', 'shoe', 'jeans', 'jacket', 'watch', 'bag', 'jewelry', 'sunglass'],
-            'home': ['kitchen', 'furniture', 'decor', 'light', 'bed', 'sofa', 'mat', 'cookware'],
-            'books': ['book', 'novel', 'kindle'],
-            'sports': ['sport', 'fitness', 'gym', 'yoga', 'cycle']
-        }
-        
-        for category, keywords in categories.items():
-            if any(keyword in title_lower for keyword in keywords):
-                return category
-        
-        return 'other'
-    
\ No newline at end of file
+        """Category name for a title, from the shared keyword categorizer"""
+        return categorizer.categorize(title)
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from django.core.cache import cache
+from deals.caching import RULES_VERSION_KEY
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), 'category_rules.json')
+
+# Seconds between checks for changed rules
+RELOAD_INTERVAL = 30.0
+
+DEFAULT_CATEGORY = 'other'
+
+# Words of a title: letters and digits, joined by inner hyphens or apostrophes
+TOKEN_RE = re.compile(r"[^\W_]+(?:[-'][^\W_]+)*")
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+def plural_forms(word):
+    return [word, word + 's', word + 'es']
+
+class Categorizer:
+    """Weighted keyword rules compiled into word-level lookup tables.
+    
+    rules maps a category to {keyword: weight}. Every spelling a keyword
+    may take in a title (the word and its plurals) is a key of one dict,
+    so a title is matched by splitting it into words once and
+    intersecting them with that dict's keys: the cost grows with the
+    title, not with the number of rules. Multi-word keywords are only
+    looked for when their first word is present. Keywords match whole
+    words only (so "mat" no longer matches "automatic"), ignoring case.
+    Each distinct keyword in a title adds its weight to every category
+    listing it; the highest total wins, earlier categories winning ties.
+    """
+    
+    def __init__(self, rules):
+        self.categories = list(rules)
+        # Keyword -> [(category, weight)]
+        self.weights = {}
+        for category, keywords in rules.items():
+            for keyword, weight in keywords.items():
+                keyword = ' '.join(tokenize(keyword))
+                if keyword and weight:
+                    self.weights.setdefault(keyword, []).append((category, float(weight)))
+        
+        # Spelling of a one-word keyword -> keyword
+        self.words = {}
+        # First word of a longer keyword -> [(padded spelling, keyword)]
+        self.phrases = {}
+        for keyword in self.weights:
+            words = keyword.split()
+            if len(words) == 1:
+                for form in plural_forms(keyword):
+                    self.words.setdefault(form, keyword)
+            else:
+                spellings = [f" {' '.join(words[:-1])} {form} " for form in plural_forms(words[-1])]
+                self.phrases.setdefault(words[0], []).extend((spelling, keyword) for spelling in spellings)
+        self.word_set = frozenset(self.words)
+        self.phrase_set = frozenset(self.phrases)
+    
+    def keywords_in(self, title):
+        tokens = tokenize(title)
+        found = {self.words[token] for token in self.word_set.intersection(tokens)}
+        starts = self.phrase_set.intersection(tokens)
+        if starts:
+            padded = f" {' '.join(tokens)} "
+            for start in starts:
+                found.update(keyword for spelling, keyword in self.phrases[start] if spelling in padded)
+        return found
+    
+    def scores(self, title):
+        """Total keyword weight per category for a title"""
+        totals = {}
+        if not title:
+            return totals
+        for keyword in self.keywords_in(title):
+            for category, weight in self.weights[keyword]:
+                totals[category] = totals.get(category, 0.0) + weight
+        return totals
+    
+    def categorize(self, title):
+        totals = self.scores(title)
+        best, best_score = DEFAULT_CATEGORY, 0.0
+        for category in self.categories:
+            if totals.get(category, 0.0) > best_score:
+                best, best_score = category, totals[category]
+        return best
+
+
+def load_rules():
+    """Rules from category_rules.json, extended and overridden by CategoryKeyword rows"""
+    with open(RULES_PATH, 'r') as f:
+        rules = json.load(f)
+    try:
+        from deals.models import CategoryKeyword
+        rows = CategoryKeyword.objects.values_list('category__name', 'keyword', 'weight')
+        for category, keyword, weight in rows:
+            rules.setdefault(category, {})[keyword] = weight
+    except Exception as e:
+        # No database yet (or not reachable from this process): file rules only
+        logger.warning(f"Category keywords not loaded from the database: {e}")
+    return rules
+
+def rules_version():
+    return (os.path.getmtime(RULES_PATH), cache.get(RULES_VERSION_KEY))
+
+
+class ReloadingCategorizer:
+    """Categorizer that rebuilds itself when the rules change.
+    
+    At most every RELOAD_INTERVAL seconds it compares the rules file's
+    mtime and the cached rules version with the ones it was built from,
+    so a long-running worker picks up edits without a restart. The
+    version lives in the shared cache (Redis or the database cache table),
+    so a keyword saved through the admin of one container reaches
+    scrapers running in another.
+    """
+    
+    def __init__(self, reload_interval=RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.categorizer = None
+        self.version = None
+        self.checked_at = 0.0
+    
+    def current(self):
+        now = time.monotonic()
+        if self.categorizer is None or now - self.checked_at >= self.reload_interval:
+            with self.lock:
+                if self.categorizer is None or now - self.checked_at >= self.reload_interval:
+                    version = rules_version()
+                    if version != self.version or self.categorizer is None:
+                        self.categorizer = Categorizer(load_rules())
+                        self.version = version
+                    self.checked_at = now
+        return self.categorizer
+    
+    def categorize(self, title):
+        return self.current().categorize(title)
+
+
+categorizer = ReloadingCategorizer()
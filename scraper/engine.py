@@ -0,0 +1,171 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import django
+from .rate_limit import RequestThrottle
+from .site_scrapers import get_scraper
+from .telemetry import SiteMetrics
+
+logger = logging.getLogger(__name__)
+
+# Scrapers built inside a parse worker process, reused for every page of a site
+_worker_scrapers = {}
+
+def parse_listing(site_name, site_config, html, url, page_number):
+    """Process-pool entry point: parse one raw listing page into (deals, next_url, seconds)"""
+    started = time.perf_counter()
+    scraper = _worker_scrapers.get(site_name)
+    if scraper is None:
+        scraper = get_scraper(site_name, site_config)
+        _worker_scrapers[site_name] = scraper
+    deals, next_url = scraper.parse_page(html, url, page_number)
+    return deals, next_url, time.perf_counter() - started
+
+def parse_pool_context():
+    """Start method for parse workers: never fork, the process already runs threads"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+class ScrapingEngine:
+    """Scrape several sites at once on a thread pool.
+
+    All scrapers share one RequestThrottle, so the number of requests in
+    flight is capped globally and every host gets its own token bucket.
+    Parsed pages are handed back through a bounded queue, so the caller can
+    save deals while the crawl is still running. An optional ResponseCache
+    is shared by all scrapers for conditional requests.
+
+    With parse_workers > 0, fetch threads only download: raw HTML is queued
+    for a process pool and the thread goes on fetching the site's next
+    pages, up to pages_ahead of the oldest one still being parsed. At most
+    max_pending_parses pages are queued or parsing at a time; past that,
+    fetchers block until a worker frees up.
+    """
+
+    def __init__(self, max_workers=8, max_concurrent_requests=8, rate_per_host=1.0,
+                 burst=1, max_pending_pages=32, cache=None, parse_workers=0,
+                 max_pending_parses=None, pages_ahead=4):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.max_pending_pages = max_pending_pages
+        self.parse_workers = parse_workers
+        self.max_pending_parses = max_pending_parses or parse_workers * 2
+        self.pages_ahead = pages_ahead
+        self.parse_pool = None
+        self.parse_slots = None
+        # Sites of the last run whose crawl visited every listing page
+        self.completed_sites = set()
+        # SiteMetrics per site of the last run
+        self.metrics = {}
+        self.throttle = RequestThrottle(
+            max_concurrent=max_concurrent_requests,
+            rate_per_host=rate_per_host,
+            burst=burst,
+        )
+
+    def start_parse_pool(self):
+        """Start the parse workers; called before any fetch thread exists"""
+        # Workers are fresh interpreters, so they set Django up before
+        # unpickling parse_listing and importing the scrapers
+        self.parse_pool = ProcessPoolExecutor(
+            max_workers=self.parse_workers, mp_context=parse_pool_context(), initializer=django.setup,
+        )
+        self.parse_slots = threading.BoundedSemaphore(self.max_pending_parses)
+
+    def stop_parse_pool(self):
+        if self.parse_pool:
+            self.parse_pool.shutdown(cancel_futures=True)
+            self.parse_pool = None
+
+    def remote_parser(self, site_name, site_config):
+        """submit_parse for a scraper: queue the raw HTML for the process pool, return its Future"""
+        site_config = dict(site_config, name=site_name)
+
+        def submit_parse(html, url, page_number):
+            # The bound on the queue: wait while max_pending_parses pages are queued or parsing
+            self.parse_slots.acquire()
+            future = self.parse_pool.submit(parse_listing, site_name, site_config, html, url, page_number)
+            future.add_done_callback(lambda future: self.parse_slots.release())
+            return future
+
+        return submit_parse
+
+    def scrape_site(self, site_name, site_config, known_hashes, pages, stop):
+        scraper = get_scraper(
+            site_name, site_config, throttle=self.throttle, cache=self.cache, metrics=self.metrics.get(site_name),
+        )
+        submit_parse = None
+        pages_ahead = 1
+        if self.parse_pool:
+            submit_parse = self.remote_parser(site_name, site_config)
+            pages_ahead = self.pages_ahead
+        site_pages = scraper.iter_deal_pages(
+            known_hashes=known_hashes, submit_parse=submit_parse, pages_ahead=pages_ahead,
+        )
+        for page_deals in site_pages:
+            # Block while the consumer is behind, but give up if it went away
+            while not stop.is_set():
+                try:
+                    pages.put((site_name, page_deals, None), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                # Cancels the pages still waiting for a parser
+                site_pages.close()
+                return
+        if scraper.crawl_complete:
+            self.completed_sites.add(site_name)
+
+    def run(self, site_configs, known_hashes=None):
+        """Yield (site_name, page_deals, error) for every page as it is scraped.
+
+        known_hashes maps a site name to {deal hash: price in cents} from its
+        previous run, which lets paginated scrapers stop at the first
+        unchanged page.
+        A site that fails yields a single entry with the exception.
+        """
+        if not site_configs:
+            return
+
+        known_hashes = known_hashes or {}
+        self.completed_sites = set()
+        self.metrics = {site_name: SiteMetrics(site_name) for site_name in site_configs}
+        pages = queue.Queue(maxsize=self.max_pending_pages)
+        stop = threading.Event()
+        workers = min(self.max_workers, len(site_configs))
+
+        if self.parse_workers:
+            self.start_parse_pool()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scraper') as pool:
+                futures = {
+                    pool.submit(
+                        self.scrape_site, site_name, site_config,
+                        known_hashes.get(site_name), pages, stop,
+                    ): site_name
+                    for site_name, site_config in site_configs.items()
+                }
+                pending = set(futures)
+                try:
+                    while pending or not pages.empty():
+                        try:
+                            yield pages.get(timeout=0.1)
+                        except queue.Empty:
+                            pass
+
+                        for future in [f for f in pending if f.done()]:
+                            pending.discard(future)
+                            error = future.exception()
+                            if error:
+                                site_name = futures[future]
+                                logger.error(f"Scraping {site_name} failed: {error}")
+                                yield site_name, [], error
+                finally:
+                    stop.set()
+        finally:
+            self.stop_parse_pool()
@@ -0,0 +1,168 @@
+import csv
+import json
+import logging
+import os
+import time
+from deals.caching import bump_listing_version
+from deals.identity import product_hash
+from .base_scraper import calculate_discount, parse_price
+
+logger = logging.getLogger(__name__)
+
+# Deals handed to ScrapingManager.process_deals at a time; the checkpoint
+# moves after each of these, so at most this many are read again on resume
+DEFAULT_CHECKPOINT_EVERY = 5000
+
+# Feed column -> deal field. The first column present in a record wins.
+FIELD_ALIASES = {
+    'title': ['title', 'name', 'product_name'],
+    'discounted_price': ['discounted_price', 'sale_price', 'price'],
+    'original_price': ['original_price', 'list_price', 'regular_price', 'was_price'],
+    'product_url': ['product_url', 'url', 'link'],
+    'image_url': ['image_url', 'image', 'image_link'],
+    'category': ['category'],
+}
+
+def feed_format(path):
+    """'csv' for .csv feeds, otherwise 'json': one JSON object per line"""
+    return 'csv' if path.lower().endswith('.csv') else 'json'
+
+def iter_feed_records(path, start_offset=0, fmt=None):
+    """Yield (record dict, byte offset just past it), reading one line at a time.
+
+    Every record must sit on a single line, which is what lets a resumed
+    import seek straight to a byte offset. Malformed lines are yielded as None.
+    """
+    fmt = fmt or feed_format(path)
+    with open(path, 'rb') as f:
+        header = None
+        if fmt == 'csv':
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode('utf-8-sig')]))
+            header = [column.strip().lower() for column in header]
+            start_offset = max(start_offset, len(header_line))
+
+        f.seek(start_offset)
+        offset = start_offset
+        for line in f:
+            offset += len(line)
+            text = line.decode('utf-8', errors='replace').strip()
+            if not text:
+                continue
+            try:
+                if fmt == 'csv':
+                    record = dict(zip(header, next(csv.reader([text]))))
+                else:
+                    record = json.loads(text)
+                    record = {str(key).lower(): value for key, value in record.items()}
+            except (ValueError, AttributeError, StopIteration):
+                record = None
+            yield record, offset
+
+def normalize_record(record, site_name):
+    """Deal dict for process_deals, or None when the record has no title, link or usable price"""
+    if not record:
+        return None
+
+    values = {}
+    for field, aliases in FIELD_ALIASES.items():
+        values[field] = next((record[alias] for alias in aliases if record.get(alias) not in (None, '')), None)
+
+    title = ' '.join(str(values['title'] or '').split())
+    product_url = str(values['product_url'] or '').strip()
+    # Same parsing as prices scraped from a page, so "$1,299.00" and 1299 agree
+    discounted_price = parse_price(str(values['discounted_price'] or ''))
+    original_price = parse_price(str(values['original_price'] or ''))
+    if not title or not product_url or not discounted_price:
+        return None
+    if original_price is not None and original_price <= discounted_price:
+        original_price = None
+
+    deal = {
+        'title': title[:200],
+        'original_price': original_price,
+        'discounted_price': discounted_price,
+        'discount_percentage': calculate_discount(original_price, discounted_price),
+        'product_url': product_url[:500],
+        'image_url': str(values['image_url'] or '')[:500],
+        'source': site_name,
+        'deal_hash': product_hash(site_name, product_url, title),
+    }
+    if values['category']:
+        deal['category'] = str(values['category'])
+    return deal
+
+def read_checkpoint(checkpoint_path, path):
+    """Saved progress for this feed, or None to start from the beginning"""
+    try:
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A feed replaced since the checkpoint was written starts over
+    if checkpoint.get('path') != os.path.abspath(path) or checkpoint.get('size') != os.path.getsize(path):
+        logger.warning(f"Ignoring checkpoint {checkpoint_path}: it belongs to another version of the feed")
+        return None
+    return checkpoint
+
+def write_checkpoint(checkpoint_path, checkpoint):
+    # Written aside and renamed, so an interrupted write leaves the old checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path)
+
+def import_feed(path, site_name, manager, checkpoint_path=None, checkpoint_every=DEFAULT_CHECKPOINT_EVERY,
+                resume=True):
+    """Stream a CSV or JSON-lines feed into the deals table.
+
+    At most checkpoint_every deals are held in memory. After each group is
+    written, the byte offset reached is saved to checkpoint_path, and a
+    later call with resume=True continues from there. The checkpoint is
+    removed once the whole feed is imported.
+    """
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+    checkpoint = read_checkpoint(checkpoint_path, path) if resume else None
+    if checkpoint:
+        logger.info(f"Resuming {path} at byte {checkpoint['offset']}")
+    else:
+        checkpoint = {
+            'path': os.path.abspath(path),
+            'size': os.path.getsize(path),
+            'offset': 0,
+            'read': 0,
+            'skipped': 0,
+            'added': 0,
+        }
+
+    started = time.perf_counter()
+    pending = []
+
+    def flush(offset):
+        if pending:
+            checkpoint['added'] += manager.process_deals(pending, site_name, invalidate=False)
+            pending.clear()
+        checkpoint['offset'] = offset
+        write_checkpoint(checkpoint_path, checkpoint)
+
+    offset = checkpoint['offset']
+    for record, offset in iter_feed_records(path, checkpoint['offset']):
+        checkpoint['read'] += 1
+        deal = normalize_record(record, site_name)
+        if deal is None:
+            checkpoint['skipped'] += 1
+            continue
+        pending.append(deal)
+        if len(pending) >= checkpoint_every:
+            flush(offset)
+    flush(offset)
+
+    os.remove(checkpoint_path)
+    bump_listing_version()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Imported {path}: {checkpoint['read']} records, {checkpoint['skipped']} skipped, "
+                f"{checkpoint['added']} deals added in {elapsed:.1f}s")
+    return {key: checkpoint[key] for key in ('read', 'skipped', 'added')}
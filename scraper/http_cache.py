@@ -0,0 +1,149 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 256 MB of compressed pages is plenty for a nightly crawl
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class ResponseCache:
+    """On-disk cache of fetched pages, used for conditional requests.
+
+    Every URL gets a gzip-compressed body file and a small JSON file with
+    its ETag / Last-Modified validators. When the directory grows past
+    max_bytes the least recently used entries are removed. With
+    offline=True pages are served straight from disk, which replays a
+    previous crawl without touching the network.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.html.gz'
+
+    def _entries(self):
+        """(last used, paths, size) per cached URL, counting its meta and body files together"""
+        entries = {}
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                key = entry.name.split('.', 1)[0]
+                used, paths, size = entries.get(key, (0.0, [], 0))
+                entries[key] = (max(used, stat.st_mtime), paths + [entry.path], size + stat.st_size)
+        return entries.values()
+
+    def get_meta(self, url):
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_body(self, url):
+        meta = self.get_meta(url)
+        if meta is None:
+            return None
+        _, body_path = self._paths(url)
+        try:
+            with gzip.open(body_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        self.touch(url)
+        return body.decode(meta.get('encoding') or 'utf-8', errors='replace')
+
+    def conditional_headers(self, url):
+        """Validator headers for a conditional GET, empty if nothing is cached"""
+        meta = self.get_meta(url)
+        headers = {}
+        # Without the body a 304 would leave nothing to serve
+        if meta and os.path.exists(self._paths(url)[1]):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def store(self, url, response):
+        """Save a 200 response, keeping any annotations of the old entry"""
+        meta_path, body_path = self._paths(url)
+        old_meta = self.get_meta(url) or {}
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'encoding': response.encoding,
+            'fetched_at': time.time(),
+            'annotations': old_meta.get('annotations', {}),
+        }
+        body = gzip.compress(response.content)
+
+        with self.lock:
+            old_size = sum(os.path.getsize(p) for p in (meta_path, body_path) if os.path.exists(p))
+            with open(body_path, 'wb') as f:
+                f.write(body)
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+            self.total_bytes += os.path.getsize(meta_path) + len(body) - old_size
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def annotate(self, url, **values):
+        """Remember facts derived from a page (next link, deal hashes, ...)"""
+        meta = self.get_meta(url)
+        if meta is None:
+            return
+        meta.setdefault('annotations', {}).update(values)
+        meta_path, _ = self._paths(url)
+        with self.lock:
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+
+    def annotations(self, url):
+        meta = self.get_meta(url)
+        return meta.get('annotations', {}) if meta else {}
+
+    def touch(self, url):
+        """Mark an entry as recently used so eviction keeps it"""
+        for path in self._paths(url):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Remove least recently used entries until under max_bytes.
+
+        A URL's meta and body go together: validators kept without their
+        body would turn the next 304 into a page with nothing to parse.
+        """
+        with self.lock:
+            entries = sorted(self._entries())
+            self.total_bytes = sum(size for _, _, size in entries)
+            target = self.max_bytes * 0.9
+            for _, paths, size in entries:
+                if self.total_bytes <= target:
+                    break
+                # Meta first, so a half-removed entry is never revalidated
+                for path in sorted(paths, key=lambda path: not path.endswith('.json')):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                self.total_bytes -= size
+        logger.info(f"Response cache evicted down to {self.total_bytes} bytes")
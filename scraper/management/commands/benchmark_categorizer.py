@@ -0,0 +1,92 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from scraper.categorizer import DEFAULT_CATEGORY, Categorizer, load_rules
+
+# Words mixed into generated titles around the rule keywords
+FILLER_WORDS = [
+    'new', 'pro', 'max', 'ultra', 'mini', 'pack', 'set', 'of', 'with', 'for', 'and', 'black', 'white',
+    'blue', 'large', 'small', 'premium', 'edition', '2024', 'automatic', 'portable', 'stainless', 'steel',
+    'cotton', 'men', 'women', 'kids', 'home', 'office', 'travel', 'compact', 'deluxe', 'classic',
+]
+BRANDS = ['Acme', 'Sony', 'Apple', 'Samsung', 'Nike', 'Adidas', 'Ikea', 'Philips', 'Lenovo', 'Penguin']
+
+def legacy_categorize(title, rules):
+    """The substring matcher this engine replaced, for comparison"""
+    title_lower = title.lower()
+    for category, keywords in rules.items():
+        if any(keyword in title_lower for keyword in keywords):
+            return category
+    return DEFAULT_CATEGORY
+
+def generate_titles(count, keywords, seed):
+    rng = random.Random(seed)
+    titles = []
+    for _ in range(count):
+        words = [rng.choice(BRANDS)] + rng.choices(FILLER_WORDS, k=rng.randint(3, 10))
+        for _ in range(rng.randint(0, 2)):
+            keyword = rng.choice(keywords)
+            words.insert(rng.randint(1, len(words)), keyword + ('s' if rng.random() < 0.3 else ''))
+        titles.append(' '.join(words))
+    return titles
+
+class Command(BaseCommand):
+    help = 'Measure titles/sec of the keyword categorizer on a generated title corpus'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--titles',
+            type=int,
+            default=1_000_000,
+            help='Number of titles in the corpus'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the generated corpus'
+        )
+        parser.add_argument(
+            '--extra-keywords',
+            type=int,
+            default=0,
+            help='Add this many generated keywords to the rules, to see how each matcher scales'
+        )
+        parser.add_argument(
+            '--skip-legacy',
+            action='store_true',
+            help='Only time the compiled categorizer'
+        )
+    
+    def handle(self, *args, **options):
+        rules = load_rules()
+        categories = list(rules)
+        for n in range(options['extra_keywords']):
+            rules[categories[n % len(categories)]][f'keyword{n}'] = 1.0
+        keywords = sorted({keyword for category_keywords in rules.values() for keyword in category_keywords})
+        titles = generate_titles(options['titles'], keywords, options['seed'])
+        self.stdout.write(f"{len(titles)} titles, {len(keywords)} keywords in {len(rules)} categories")
+        
+        started = time.perf_counter()
+        categorizer = Categorizer(rules)
+        self.stdout.write(f"Compiled rules in {(time.perf_counter() - started) * 1000:.1f}ms")
+        
+        started = time.perf_counter()
+        compiled = [categorizer.categorize(title) for title in titles]
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{'compiled':>10}: {len(titles) / elapsed:10.0f} titles/sec ({elapsed:.2f}s)")
+        
+        if not options['skip_legacy']:
+            started = time.perf_counter()
+            legacy = [legacy_categorize(title, rules) for title in titles]
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{'substring':>10}: {len(titles) / elapsed:10.0f} titles/sec ({elapsed:.2f}s)")
+            changed = sum(1 for old, new in zip(legacy, compiled) if old != new)
+            self.stdout.write(f"Categories differ on {changed / len(titles):.1%} of titles "
+                              "(word boundaries and weights)")
+        
+        counts = {}
+        for category in compiled:
+            counts[category] = counts.get(category, 0) + 1
+        for category, count in sorted(counts.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {category:>12}: {count}")
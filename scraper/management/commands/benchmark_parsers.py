@@ -0,0 +1,127 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from scraper.engine import ScrapingEngine
+from scraper.parsers import available_backends
+from scraper.scraping_manager import ScrapingManager
+from scraper.site_scrapers import get_scraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'fixtures')
+
+class Command(BaseCommand):
+    help = 'Measure pages/sec of each HTML parser backend on saved listing pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--site',
+            default='amazon',
+            help='Site whose selectors are used (and fixture directory name)'
+        )
+        parser.add_argument(
+            '--fixtures',
+            help='Directory of saved .html listing pages (default: scraper/fixtures/<site>)'
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=5,
+            help='How many times every page is parsed per backend'
+        )
+        parser.add_argument(
+            '--backend',
+            action='append',
+            help='Backend to measure, may be repeated (default: all installed)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Also parse the corpus on process pools of 1, 2, 4... up to this many workers'
+        )
+
+    def handle(self, *args, **options):
+        site_name = options['site']
+        fixtures_dir = options['fixtures'] or os.path.join(FIXTURES_DIR, site_name)
+        site_config = ScrapingManager().scraping_config.get(site_name)
+        if site_config is None:
+            raise CommandError(f"No scraping config for site '{site_name}'")
+
+        pages = []
+        for filename in sorted(os.listdir(fixtures_dir)):
+            if filename.endswith('.html'):
+                with open(os.path.join(fixtures_dir, filename), 'r', encoding='utf-8') as f:
+                    pages.append(f.read())
+        if not pages:
+            raise CommandError(f"No .html fixture pages in {fixtures_dir}")
+
+        backends = options['backend'] or available_backends()
+        url = site_config.get('deals_page', '')
+        self.stdout.write(f"{len(pages)} pages, {options['rounds']} rounds, backends: {', '.join(backends)}")
+
+        reference_hashes = None
+        for backend in backends:
+            scraper = get_scraper(site_name, dict(site_config, parser=backend))
+
+            hashes = set()
+            for html in pages:
+                deals, next_url = scraper.parse_page(html, url, 1)
+                hashes.update(deal['deal_hash'] for deal in deals)
+
+            started = time.perf_counter()
+            for _ in range(options['rounds']):
+                for html in pages:
+                    scraper.parse_page(html, url, 1)
+            elapsed = time.perf_counter() - started
+
+            parsed = len(pages) * options['rounds']
+            self.stdout.write(
+                f"{backend:>12}: {parsed / elapsed:8.1f} pages/sec, "
+                f"{len(hashes) * options['rounds'] / elapsed:9.0f} deals/sec "
+                f"({len(hashes)} unique deals)"
+            )
+
+            if reference_hashes is None:
+                reference_hashes = hashes
+            elif hashes != reference_hashes:
+                self.stdout.write(self.style.WARNING(
+                    f"{backend} extracted different deals than {backends[0]}"
+                ))
+
+        if options['workers']:
+            self.benchmark_pool(site_name, dict(site_config, parser=backends[0]), pages, url, options)
+
+    def benchmark_pool(self, site_name, site_config, pages, url, options):
+        """Parse the corpus through the scraping engine's process-pool stage"""
+        jobs = [html for _ in range(options['rounds']) for html in pages]
+        counts = []
+        count = 1
+        while count < options['workers']:
+            counts.append(count)
+            count *= 2
+        counts.append(options['workers'])
+
+        self.stdout.write(f"Process pool with {site_config['parser']}:")
+        baseline = None
+        for count in counts:
+            engine = ScrapingEngine(parse_workers=count)
+            engine.start_parse_pool()
+            try:
+                submit_parse = engine.remote_parser(site_name, site_config)
+                # Start the workers before timing
+                for future in [submit_parse(pages[0], url, 1) for _ in range(count)]:
+                    future.result()
+                started = time.perf_counter()
+                # Queued the way fetch threads queue pages, blocking while the queue is full
+                futures = [submit_parse(html, url, 1) for html in jobs]
+                for future in futures:
+                    future.result()
+                elapsed = time.perf_counter() - started
+            finally:
+                engine.stop_parse_pool()
+
+            pages_per_sec = len(jobs) / elapsed
+            baseline = baseline or pages_per_sec
+            self.stdout.write(
+                f"{count:>4} workers: {pages_per_sec:8.1f} pages/sec "
+                f"({pages_per_sec / baseline:.1f}x)"
+            )
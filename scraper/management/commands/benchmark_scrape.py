@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import resource
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from deals.models import Deal, EcommerceSite
+from deals.search import remove_deals
+from scraper.scraping_manager import ScrapingManager
+from scraper.site_scrapers import get_scraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'fixtures')
+
+# Higher is better for these; lower is better for the rest
+THROUGHPUT_METRICS = {'pages_per_sec', 'insert_deals_per_sec', 'update_deals_per_sec'}
+
+class FixtureServer:
+    """Serves the recorded listing pages: ?page=N is the Nth fixture, past the last an empty page"""
+
+    def __init__(self, pages, path):
+        self.pages = pages
+        self.path = path
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                query = parse_qs(urlsplit(self.path).query)
+                page = int(query.get('page', ['1'])[0])
+                body = server.pages[page - 1] if 1 <= page <= len(server.pages) else '<html><body></body></html>'
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}{self.path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class Command(BaseCommand):
+    help = ('Replay recorded listing pages through the scraper and process_deals into a '
+            'throwaway test database, and compare the numbers with a baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--site',
+            default='amazon',
+            help='Site whose scraping config is used (and fixture directory name)'
+        )
+        parser.add_argument(
+            '--fixtures',
+            help='Directory of recorded .html listing pages (default: scraper/fixtures/<site>)'
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=5,
+            help='Scrape and ingest the corpus this many times; medians are reported'
+        )
+        parser.add_argument(
+            '--seed-deals',
+            type=int,
+            default=10000,
+            help='Deals of another site loaded first, so the tables and indexes are not empty'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON file of earlier results; a metric worse by more than --tolerance fails the run'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Allowed relative regression against the baseline'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Write this run\'s results to the --baseline file instead of comparing'
+        )
+
+    def handle(self, *args, **options):
+        site_name = options['site']
+        site_config = ScrapingManager().scraping_config.get(site_name)
+        if site_config is None:
+            raise CommandError(f"No scraping config for site '{site_name}'")
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline needs --baseline')
+
+        fixtures_dir = options['fixtures'] or os.path.join(FIXTURES_DIR, site_name)
+        pages = []
+        for filename in sorted(os.listdir(fixtures_dir)):
+            if filename.endswith('.html'):
+                with open(os.path.join(fixtures_dir, filename), 'r', encoding='utf-8') as f:
+                    pages.append(f.read())
+        if not pages:
+            raise CommandError(f"No .html fixture pages in {fixtures_dir}")
+
+        # Per-page and per-deal log lines are not part of what is measured
+        logging.getLogger('scraper').setLevel(logging.WARNING)
+
+        # Never touch the real database: migrate a test one and drop it afterwards
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed(options['seed_deals'])
+            results = self.run_rounds(site_name, site_config, pages, options['rounds'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        results['peak_rss_mb'] = peak_rss_mb()
+
+        self.stdout.write(f"{len(pages)} pages, {results['deals']} deals, {options['rounds']} rounds "
+                          f"on {connection.vendor}")
+        for metric, value in results.items():
+            self.stdout.write(f"{metric:>24}: {value:10.2f}")
+
+        if options['baseline']:
+            if options['save_baseline']:
+                with open(options['baseline'], 'w') as f:
+                    json.dump(results, f, indent=2)
+                self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['baseline']}"))
+            else:
+                self.compare(results, options['baseline'], options['tolerance'])
+
+    def seed(self, count):
+        site = EcommerceSite.objects.create(
+            name='benchmark-seed', base_url='https://seed.test/', deals_page_url='https://seed.test/deals'
+        )
+        Deal.objects.bulk_create([
+            Deal(
+                title=f'Seeded deal {n}',
+                discounted_price=10 + n % 500,
+                original_price=600,
+                discount_percentage=n % 90,
+                deal_score=n % 100,
+                product_url=f'https://seed.test/p/{n}',
+                source_site=site,
+                deal_hash=f'seed-{n}',
+            )
+            for n in range(count)
+        ], batch_size=2000)
+
+    def run_rounds(self, site_name, site_config, pages, rounds):
+        """Each round scrapes the corpus, inserts its deals, then ingests the same deals again"""
+        manager = ScrapingManager()
+        measured = {key: [] for key in (
+            'pages_per_sec', 'insert_deals_per_sec', 'update_deals_per_sec',
+            'insert_queries_per_deal', 'update_queries_per_deal',
+        )}
+        deal_count = 0
+
+        with FixtureServer(pages, urlsplit(site_config.get('deals_page', '/deals')).path or '/deals') as server:
+            config = dict(site_config, deals_page=server.url, max_retries=1)
+            for _ in range(rounds):
+                previous = Deal.objects.filter(source_site__name=site_name)
+                remove_deals(list(previous.values_list('id', flat=True)))
+                previous.delete()
+
+                requests_before = server.requests
+                started = time.perf_counter()
+                deals = get_scraper(site_name, config).scrape_deals()
+                elapsed = time.perf_counter() - started
+                if not deals:
+                    raise CommandError('The scraper found no deals in the fixture pages')
+                measured['pages_per_sec'].append((server.requests - requests_before) / elapsed)
+                deal_count = len(deals)
+
+                # First ingest inserts every deal, the second finds them all unchanged
+                for phase in ('insert', 'update'):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        manager.process_deals(deals, site_name, invalidate=False)
+                        elapsed = time.perf_counter() - started
+                    measured[f'{phase}_deals_per_sec'].append(len(deals) / elapsed)
+                    measured[f'{phase}_queries_per_deal'].append(len(queries) / len(deals))
+
+        results = {key: statistics.median(values) for key, values in measured.items()}
+        results['deals'] = deal_count
+        return results
+
+    def compare(self, results, baseline_path, tolerance):
+        try:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read baseline {baseline_path}: {e}")
+
+        regressions = []
+        for metric, value in results.items():
+            expected = baseline.get(metric)
+            if metric == 'deals' or not expected:
+                continue
+            change = (value - expected) / expected
+            worse = -change if metric in THROUGHPUT_METRICS else change
+            label = f"{metric}: {value:.2f} vs {expected:.2f} ({change:+.0%})"
+            if worse > tolerance:
+                regressions.append(label)
+                self.stdout.write(self.style.ERROR(f"  regressed {label}"))
+            else:
+                self.stdout.write(f"  ok {label}")
+
+        if results.get('deals') != baseline.get('deals'):
+            self.stdout.write(self.style.WARNING(
+                f"Corpus changed: {results.get('deals')} deals, baseline had {baseline.get('deals')}"
+            ))
+        if regressions:
+            raise CommandError(f"{len(regressions)} metrics regressed more than {tolerance:.0%}")
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from scraper.feeds import DEFAULT_CHECKPOINT_EVERY, import_feed
+from scraper.scraping_manager import ScrapingManager, DEFAULT_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Import a merchant CSV or JSON-lines product feed, resuming an interrupted import'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file: .csv with a header row, anything else one JSON object per line')
+        parser.add_argument(
+            '--site',
+            required=True,
+            help='Site name the deals are stored under'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of deals written per bulk insert/update'
+        )
+        parser.add_argument(
+            '--checkpoint-every',
+            type=int,
+            default=DEFAULT_CHECKPOINT_EVERY,
+            help='Deals held in memory between checkpoints'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file (default: <path>.checkpoint)'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any checkpoint and import the feed from the start'
+        )
+    
+    def handle(self, *args, **options):
+        manager = ScrapingManager(batch_size=options['batch_size'])
+        try:
+            stats = import_feed(
+                options['path'],
+                options['site'],
+                manager,
+                checkpoint_path=options['checkpoint'],
+                checkpoint_every=options['checkpoint_every'],
+                resume=not options['restart'],
+            )
+        except OSError as e:
+            raise CommandError(str(e))
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {stats['read']} records, skipped {stats['skipped']}, added {stats['added']} new deals"
+        ))
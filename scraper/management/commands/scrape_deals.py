@@ -1,5 +1,14 @@
+import logging
+import os
+from argparse import ArgumentTypeError
 from django.core.management.base import BaseCommand
-from scraper.scraping_manager import ScrapingManager
+from scraper.scraping_manager import ScrapingManager, DEFAULT_BATCH_SIZE
+
+def positive_float(value):
+    rate = float(value)
+    if not rate > 0:
+        raise ArgumentTypeError(f"must be greater than 0, got {value}")
+    return rate
 
 class Command(BaseCommand):
     help = 'Run the daily deal scraping process'
@@ -10,21 +19,78 @@ class Command(BaseCommand):
             action='store_true',
             help='Run in test mode (uses demo data)'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of deals written per bulk insert/update'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Maximum number of sites and requests in flight at once'
+        )
+        parser.add_argument(
+            '--rate',
+            type=positive_float,
+            default=1.0,
+            help='Requests per second allowed against each host'
+        )
+        parser.add_argument(
+            '--parse-workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes parsing HTML while pages are fetched (0 parses in the fetch threads)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Crawl every listing page, so deals no longer listed can be expired'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Always download full pages instead of revalidating cached ones'
+        )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            help='Replay pages from the response cache without any network access'
+        )
     
     def handle(self, *args, **options):
+        # -v 0 keeps only warnings, -v 2 and up logs every parsed deal
+        if options['verbosity'] == 0:
+            logging.getLogger('scraper').setLevel(logging.WARNING)
+        elif options['verbosity'] >= 2:
+            logging.getLogger('scraper').setLevel(logging.DEBUG)
+        
         self.stdout.write(self.style.SUCCESS('Starting deal scraping...'))
         
-        manager = ScrapingManager()
+        manager = ScrapingManager(batch_size=options['batch_size'])
         test_mode = options.get('test', True)
         
-        results = manager.run_scraping(test_mode=test_mode)
+        results = manager.run_scraping(
+            test_mode=test_mode,
+            max_workers=options['workers'],
+            rate_per_host=options['rate'],
+            use_cache=not options['no_cache'],
+            offline=options['offline'],
+            parse_workers=options['parse_workers'],
+            full_crawl=options['full'],
+        )
         
         # Print results
         for site, stats in results.items():
+            if stats.get('error'):
+                self.stdout.write(self.style.ERROR(f"{site}: {stats['error']}"))
+                continue
             self.stdout.write(
                 self.style.SUCCESS(
                     f"{site}: Found {stats['found']} deals, "
-                    f"Added {stats['added']} new deals"
+                    f"Added {stats['added']} new deals "
+                    f"({stats.get('rows_per_sec', 0):.0f} rows/sec)"
                 )
             )
         
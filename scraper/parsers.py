@@ -0,0 +1,193 @@
+"""HTML parser backends for the site scrapers.
+
+bs4 is always available and stays the default. lxml (with cssselect) and
+selectolax are optional and much faster on large listing pages; pick one
+with "parser" in a site's scraping_config.json entry. Every backend
+compiles a CSS selector once and reuses it for the life of the process.
+Given the selectors to keep, bs4 and lxml only hold those parts of a page.
+"""
+import re
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+# A tag name followed by .class, #id, [attr] and [attr="value"] tests: the
+# selectors that can be checked on a start tag before any tree exists
+SIMPLE_SELECTOR = re.compile(
+    r"""^([a-zA-Z][\w-]*)?((?:\.[\w-]+|#[\w-]+|\[[\w-]+(?:=(?:"[^"]*"|'[^']*'|[\w-]+))?\])*)$"""
+)
+SELECTOR_PART = re.compile(r"""\.([\w-]+)|#([\w-]+)|\[([\w-]+)(?:=(?:"([^"]*)"|'([^']*)'|([\w-]+)))?\]""")
+
+def start_tag_matcher(selectors):
+    """Function of (tag name, attribute dict) telling whether a start tag
+    matches any of the selectors, or None if one of them needs more than
+    the tag itself (combinators, pseudo-classes, ...)"""
+    tests = []
+    for selector in ','.join(selectors).split(','):
+        match = SIMPLE_SELECTOR.match(selector.strip())
+        if not match or not selector.strip():
+            return None
+        tag, classes, attrs = match.group(1), set(), {}
+        for class_name, id_value, attr, *values in SELECTOR_PART.findall(match.group(2)):
+            if class_name:
+                classes.add(class_name)
+            elif id_value:
+                attrs['id'] = id_value
+            else:
+                attrs[attr] = next((value for value in values if value), None)
+        tests.append((tag and tag.lower(), classes, attrs))
+
+    def matches(name, attrs):
+        for tag, classes, wanted in tests:
+            if tag and name != tag:
+                continue
+            tag_classes = attrs.get('class') or ''
+            if classes and not classes.issubset(tag_classes.split() if isinstance(tag_classes, str) else tag_classes):
+                continue
+            if all(attr in attrs and (value is None or attrs[attr] == value) for attr, value in wanted.items()):
+                return True
+        return False
+
+    return matches
+
+class Bs4Backend:
+    name = 'bs4'
+
+    def __init__(self):
+        self.compiled = {}
+        self.strainers = {}
+
+    def compile(self, selector):
+        if selector not in self.compiled:
+            self.compiled[selector] = soupsieve.compile(selector)
+        return self.compiled[selector]
+
+    def parse(self, html, keep=None):
+        """Parse a page; with keep, only the elements matching those selectors are built"""
+        strainer = None
+        if keep:
+            keep = tuple(keep)
+            if keep not in self.strainers:
+                matcher = start_tag_matcher(keep)
+                self.strainers[keep] = SoupStrainer(matcher) if matcher else None
+            strainer = self.strainers[keep]
+        return BeautifulSoup(html, 'html.parser', parse_only=strainer)
+
+    def select(self, node, selector):
+        return self.compile(selector).select(node)
+
+    def select_one(self, node, selector):
+        return self.compile(selector).select_one(node)
+
+    def text(self, node):
+        return node.get_text(strip=True)
+
+    def attr(self, node, name):
+        return node.get(name, '')
+
+
+class LxmlBackend(Bs4Backend):
+    name = 'lxml'
+
+    def __init__(self):
+        super().__init__()
+        import lxml.html
+        from lxml.cssselect import CSSSelector
+        self.lxml_html = lxml.html
+        self.css_selector = CSSSelector
+
+    def compile(self, selector):
+        if selector not in self.compiled:
+            self.compiled[selector] = self.css_selector(selector)
+        return self.compiled[selector]
+
+    def parse(self, html, keep=None):
+        root = self.lxml_html.fromstring(html)
+        if not keep:
+            return root
+        # Move the matching subtrees into an empty root, so the rest of the
+        # page is freed and later selects only walk what was kept
+        matches = self.select(root, ', '.join(keep))
+        matched = set(matches)
+        page = self.lxml_html.Element('div')
+        for node in matches:
+            if not any(ancestor in matched for ancestor in node.iterancestors()):
+                node.tail = None
+                page.append(node)
+        return page
+
+    def select(self, node, selector):
+        return self.compile(selector)(node)
+
+    def select_one(self, node, selector):
+        matches = self.compile(selector)(node)
+        return matches[0] if matches else None
+
+    def text(self, node):
+        # Same joining rule as bs4's get_text(strip=True), so titles and
+        # therefore deal hashes match between backends
+        return ''.join(part.strip() for part in node.itertext())
+
+    def attr(self, node, name):
+        return node.get(name) or ''
+
+
+class SelectolaxBackend(Bs4Backend):
+    name = 'selectolax'
+
+    def __init__(self):
+        super().__init__()
+        try:
+            from selectolax.lexbor import LexborHTMLParser as HTMLParser
+        except ImportError:
+            # selectolax < 0.3.12 only ships the Modest engine
+            from selectolax.parser import HTMLParser
+        self.html_parser = HTMLParser
+
+    def compile(self, selector):
+        # selectolax takes selector strings directly, nothing to precompile
+        return selector
+
+    def parse(self, html, keep=None):
+        # lexbor builds its tree in C; there is no partial parse to ask for
+        return self.html_parser(html)
+
+    def select(self, node, selector):
+        return node.css(selector)
+
+    def select_one(self, node, selector):
+        return node.css_first(selector)
+
+    def text(self, node):
+        return node.text(deep=True, separator='', strip=True)
+
+    def attr(self, node, name):
+        return node.attributes.get(name) or ''
+
+
+PARSER_BACKENDS = {
+    'bs4': Bs4Backend,
+    'lxml': LxmlBackend,
+    'selectolax': SelectolaxBackend,
+}
+
+# One instance per backend, so compiled selectors are shared by every scraper
+_instances = {}
+
+def get_parser_backend(name='bs4'):
+    """Return the shared backend instance; raises ImportError if its package is missing"""
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {name}")
+    if name not in _instances:
+        _instances[name] = PARSER_BACKENDS[name]()
+    return _instances[name]
+
+def available_backends():
+    """Names of the backends whose packages are installed"""
+    names = []
+    for name in PARSER_BACKENDS:
+        try:
+            get_parser_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
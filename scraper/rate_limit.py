@@ -0,0 +1,61 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity` banked"""
+
+    def __init__(self, rate, capacity=1):
+        if not rate > 0:
+            raise ValueError(f"TokenBucket rate must be greater than 0, got {rate}")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestThrottle:
+    """Global cap on in-flight requests plus a token bucket per host"""
+
+    def __init__(self, max_concurrent=8, rate_per_host=1.0, burst=1):
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, url):
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_per_host, self.burst)
+                self.buckets[host] = bucket
+            return bucket
+
+    @contextmanager
+    def slot(self, url):
+        """Wait for the host's rate limit, then hold one global request slot"""
+        self.bucket_for(url).acquire()
+        with self.semaphore:
+            yield
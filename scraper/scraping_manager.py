@@ -1,89 +1,326 @@
 import json
+import logging
 import os
+import time
+from itertools import islice
+from urllib.parse import urljoin
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from deals.models import EcommerceSite, Deal, DealCategory
+from deals.caching import bump_listing_version
+from deals.expiry import archive_deals, expire_deals
+from deals.models import EcommerceSite, DailyScrapeLog, Deal, DealCategory
+from deals.prices import apply_price, day_offset, price_changed, record_prices, refresh_low_prices, to_cents
+from deals.scoring import rescore_deals, score_new_deals
+from deals.search import index_deals
+from deals.similarity import assign_products
+from .categorizer import categorizer
+
+logger = logging.getLogger(__name__)
+
+# Number of deals written per bulk_create / bulk_update round trip
+DEFAULT_BATCH_SIZE = 500
 
 class ScrapingManager:
-    def __init__(self):
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
         # Load scraping configuration
         config_path = os.path.join(os.path.dirname(__file__), 'scraping_config.json')
         with open(config_path, 'r') as f:
             self.scraping_config = json.load(f)
         
-    def run_scraping(self, test_mode=True):
-        """Main scraping orchestration method"""
-        print("=" * 50)
-        print("STARTING DEAL SCRAPING")
-        print("=" * 50)
+        self.batch_size = batch_size
+        self.last_ingest = {}
         
-        results = {}
+    def get_site_configs(self):
+        """Merge active EcommerceSite rows with the entries in scraping_config.json"""
+        inactive = set(EcommerceSite.objects.filter(is_active=False).values_list('name', flat=True))
+        site_configs = {
+            site_name: dict(config)
+            for site_name, config in self.scraping_config.items()
+            if site_name not in inactive
+        }
+        
+        # The admin-editable listing URL wins over the one in the config file;
+        # sites without one (feed merchants) have nothing to crawl
+        for site in EcommerceSite.objects.filter(is_active=True).exclude(deals_page_url=''):
+            config = site_configs.setdefault(site.name, {'selectors': {}})
+            config['deals_page'] = site.deals_page_url
+        
+        return site_configs
+    
+    def get_known_hashes(self, site_configs):
+        """Deal hashes each site listed in its previous run, with their prices in cents"""
+        known_hashes = {site_name: {} for site_name in site_configs}
+        rows = Deal.objects.filter(
+            source_site__name__in=list(site_configs),
+            is_active=True,
+        ).values_list('source_site__name', 'deal_hash', 'discounted_price')
+        for site_name, deal_hash, price in rows.iterator(chunk_size=2000):
+            known_hashes[site_name][deal_hash] = to_cents(price)
+        return known_hashes
+    
+    def get_site(self, site_name, product_url=''):
+        """EcommerceSite row for a site, created on first use.
         
-        # Use test scraper for now
-        from .site_scrapers import SimpleTestScraper
-        scraper = SimpleTestScraper()
+        Sites in scraping_config get their listing URL from it. Any other
+        site, e.g. a merchant from an imported feed, only gets the origin of
+        one of its product URLs and no listing page, so it is never crawled.
+        """
+        deals_page = self.scraping_config.get(site_name, {}).get('deals_page', '')
+        home_page = deals_page or product_url or ''
+        site_obj, created = EcommerceSite.objects.get_or_create(
+            name=site_name,
+            defaults={
+                'base_url': urljoin(home_page, '/') if home_page else '',
+                'deals_page_url': deals_page,
+            }
+        )
+        return site_obj
+    
+    def run_scraping(self, test_mode=True, max_workers=8, rate_per_host=1.0,
+                     use_cache=True, offline=False, parse_workers=0, full_crawl=False):
+        """Main scraping orchestration method.
         
-        deals_data = scraper.scrape_deals()
+        Paginated sites stop at the first page with nothing new unless
+        full_crawl is set. Only full crawls let deals a site no longer lists
+        be expired.
+        """
+        logger.info("Starting deal scraping")
+        
+        results = {}
+        logs = {}
+        engine = None
         
         if test_mode:
-            print(f"\nFound {len(deals_data)} deals in test mode")
+            from .site_scrapers import SimpleTestScraper
+            deals_data = SimpleTestScraper().scrape_deals()
+            logger.info(f"Found {len(deals_data)} deals in test mode")
+            scraped_pages = [('amazon', deals_data, None)]
+        else:
+            # Sites are fetched concurrently; each page of deals is saved
+            # here, in this thread, as soon as it has been parsed
+            from .engine import ScrapingEngine
+            from .http_cache import ResponseCache
+            cache = None
+            if use_cache or offline:
+                cache = ResponseCache(
+                    settings.SCRAPER_CACHE_DIR,
+                    max_bytes=settings.SCRAPER_CACHE_MAX_BYTES,
+                    offline=offline,
+                )
+            engine = ScrapingEngine(
+                max_workers=max_workers,
+                max_concurrent_requests=max_workers,
+                rate_per_host=rate_per_host,
+                cache=cache,
+                parse_workers=parse_workers,
+            )
+            site_configs = self.get_site_configs()
+            logs = {
+                site_name: DailyScrapeLog.objects.create(site=self.get_site(site_name), status='running')
+                for site_name in site_configs
+            }
+            known_hashes = None if full_crawl else self.get_known_hashes(site_configs)
+            scraped_pages = engine.run(site_configs, known_hashes=known_hashes)
         
-        # Process and save deals
-        added_count = self.process_deals(deals_data, 'amazon')
+        total_added = 0
+        ingest_seconds = {}
+        for site_name, deals_data, error in scraped_pages:
+            stats = results.setdefault(site_name, {'found': 0, 'added': 0, 'rows_per_sec': 0.0})
+            if error:
+                logger.error(f"{site_name} failed: {error}")
+                stats['error'] = str(error)
+                continue
+            
+            # Process and save deals
+            added_count = self.process_deals(deals_data, site_name, invalidate=False)
+            total_added += added_count
+            
+            stats['found'] += len(deals_data)
+            stats['added'] += added_count
+            ingest_seconds[site_name] = ingest_seconds.get(site_name, 0.0) + self.last_ingest['seconds']
+            if engine and site_name in engine.metrics:
+                engine.metrics[site_name].record_write(self.last_ingest['seconds'], len(deals_data))
+            if ingest_seconds[site_name] > 0:
+                stats['rows_per_sec'] = stats['found'] / ingest_seconds[site_name]
         
-        results['amazon'] = {
-            'found': len(deals_data),
-            'added': added_count
-        }
+        for site_name, log in logs.items():
+            stats = results.get(site_name, {})
+            log.finished_at = timezone.now()
+            metrics = engine.metrics.get(site_name)
+            if metrics:
+                elapsed = (log.finished_at - log.started_at).total_seconds()
+                for field, value in metrics.log_fields(elapsed).items():
+                    setattr(log, field, value)
+                logger.info(metrics.summary(elapsed))
+            log.deals_found = stats.get('found', 0)
+            log.deals_added = stats.get('added', 0)
+            if stats.get('error'):
+                log.status = 'failed'
+                log.error_message = stats['error']
+            elif site_name in engine.completed_sites:
+                log.status = 'success'
+            else:
+                # Stopped early or a page failed: not every listed deal was seen
+                log.status = 'partial'
+            log.save()
+        
+        # Deals the sites no longer list stop showing; long-gone ones leave the table
+        expired = expire_deals()
+        archived = archive_deals()
+        logger.info(f"Expired {sum(expired.values())} deals, archived {archived}")
         
-        print("=" * 50)
-        print("SCRAPING COMPLETED")
-        print(f"Total deals added: {added_count}")
-        print("=" * 50)
+        # Fresh deals age, clicks accumulate and old lows leave the window,
+        # so every run refreshes the derived columns
+        refresh_low_prices()
+        rescored = rescore_deals()
+        logger.info(f"Re-scored {rescored['scored']} deals ({rescored['changed']} changed) "
+                    f"in {rescored['seconds']:.2f}s")
+        
+        # One cache invalidation for the whole run
+        bump_listing_version()
+        
+        logger.info(f"Scraping completed, {total_added} deals added")
         
         return results
     
-    def process_deals(self, deals_data, site_name):
-        """Save deals to database"""
+    def process_deals(self, deals_data, site_name, batch_size=None, invalidate=True):
+        """Save deals to database in batches.
+        
+        Cached listings are invalidated afterwards unless invalidate is
+        False, which lets a caller saving many pages bump the version once.
+        """
+        batch_size = batch_size or self.batch_size
+        started = time.perf_counter()
         added_count = 0
+        updated_count = 0
+        total_count = 0
         
-        # Get or create site object
-        site_obj, created = EcommerceSite.objects.get_or_create(
-            name=site_name,
-            defaults={
-                'base_url': 'amazon.com',
-                'deals_page_url': 'https://www.amazon.com/gp/goldbox'
-            }
-        )
+        # Created with the first batch, whose product URLs name the store
+        site_obj = None
+        
+        logger.debug(f"Processing deals for {site_name}")
+        
+        # Categories are a small table, load them all once
+        categories = {category.name: category for category in DealCategory.objects.all()}
+        # Reload keyword rules if they changed, outside the batch transactions
+        categorizer.current()
+        
+        deals_iter = iter(deals_data)
+        while True:
+            batch = list(islice(deals_iter, batch_size))
+            if not batch:
+                break
+            total_count += len(batch)
+            if site_obj is None:
+                site_obj = self.get_site(site_name, batch[0].get('product_url', ''))
+            
+            try:
+                with transaction.atomic():
+                    added, updated = self._write_batch(batch, site_obj, categories)
+            except Exception as e:
+                # One bad row fails the whole bulk write; save the batch
+                # again row by row so only the bad rows are lost
+                logger.warning(f"Batch of {len(batch)} {site_name} deals failed ({e}), retrying row by row")
+                added, updated = self._write_rows(batch, site_obj, categories)
+            added_count += added
+            updated_count += updated
         
-        print(f"\nProcessing deals for {site_name}...")
+        elapsed = time.perf_counter() - started
+        rows_per_sec = total_count / elapsed if elapsed > 0 else 0.0
+        self.last_ingest = {
+            'found': total_count,
+            'added': added_count,
+            'updated': updated_count,
+            'seconds': elapsed,
+            'rows_per_sec': rows_per_sec,
+        }
+        
+        logger.info(f"Processed {total_count} {site_name} deals ({added_count} added, {updated_count} updated) "
+                    f"in {elapsed:.2f}s - {rows_per_sec:.0f} rows/sec")
         
-        for deal_data in deals_data:
+        if invalidate and (added_count or updated_count):
+            bump_listing_version()
+        
+        return added_count
+    
+    def _write_rows(self, batch, site_obj, categories):
+        """Write a failed batch one deal per transaction, skipping the deals that fail"""
+        def reload_categories():
+            # Categories created in a rolled-back transaction are gone again
+            categories.clear()
+            categories.update((category.name, category) for category in DealCategory.objects.all())
+        
+        reload_categories()
+        added_count = updated_count = 0
+        for deal_data in batch:
             try:
-                # Check if deal already exists
-                existing_deal = Deal.objects.filter(deal_hash=deal_data['deal_hash']).first()
+                with transaction.atomic():
+                    added, updated = self._write_batch([deal_data], site_obj, categories)
+            except Exception as e:
+                logger.warning(f"Error saving deal: {e}")
+                reload_categories()
+                continue
+            added_count += added
+            updated_count += updated
+        return added_count, updated_count
+    
+    def _write_batch(self, batch, site_obj, categories):
+        """Write one batch of deals with a single lookup, insert and update"""
+        # Later duplicates inside a batch win, same as saving them one by one
+        batch_by_hash = {}
+        for deal_data in batch:
+            try:
+                batch_by_hash[deal_data['deal_hash']] = deal_data
+            except (KeyError, TypeError) as e:
+                logger.warning(f"Error saving deal: {e}")
+        
+        existing_deals = Deal.objects.in_bulk(list(batch_by_hash), field_name='deal_hash')
+        now = timezone.now()
+        today = day_offset()
+        new_deals = []
+        changed_deals = []
+        repriced_deals = []
+        unchanged_ids = []
+        
+        for deal_hash, deal_data in batch_by_hash.items():
+            try:
+                existing_deal = existing_deals.get(deal_hash)
                 
                 if existing_deal:
-                    print(f"Deal already exists: {deal_data['title'][:50]}...")
+                    repriced = price_changed(existing_deal, deal_data)
+                    if (not repriced and existing_deal.is_active
+                            and existing_deal.discount_percentage == deal_data['discount_percentage']):
+                        unchanged_ids.append(existing_deal.pk)
+                        continue
+                    
                     # Update existing deal
+                    old_cents = to_cents(existing_deal.discounted_price)
                     existing_deal.discounted_price = deal_data['discounted_price']
                     existing_deal.original_price = deal_data.get('original_price')
                     existing_deal.discount_percentage = deal_data['discount_percentage']
-                    existing_deal.last_checked = timezone.now()
-                    existing_deal.save()
+                    existing_deal.last_checked = now
+                    # Listed again after it expired
+                    existing_deal.is_active = True
+                    changed_deals.append(existing_deal)
+                    if repriced:
+                        apply_price(existing_deal, old_cents, today)
+                        repriced_deals.append(existing_deal)
                     continue
                 
-                # Get or create category
-                category_name = deal_data.get('category', 'other')
-                category_obj, _ = DealCategory.objects.get_or_create(
-                    name=category_name,
-                    defaults={'slug': category_name.lower().replace(' ', '-')}
-                )
-                
-                # Calculate deal score
-                deal_score = self.calculate_deal_score(deal_data)
+                # Get or create category; scraped pages leave it to the
+                # categorizer, which runs once per new deal
+                category_name = deal_data.get('category') or categorizer.categorize(deal_data['title'])
+                category_obj = categories.get(category_name)
+                if category_obj is None:
+                    category_obj, _ = DealCategory.objects.get_or_create(
+                        name=category_name,
+                        defaults={'slug': category_name.lower().replace(' ', '-')}
+                    )
+                    categories[category_name] = category_obj
                 
                 # Create new deal
-                new_deal = Deal(
+                new_deals.append(Deal(
                     title=deal_data['title'][:200],
                     original_price=deal_data.get('original_price'),
                     discounted_price=deal_data['discounted_price'],
@@ -92,39 +329,38 @@ class ScrapingManager:
                     image_url=deal_data.get('image_url', '')[:500],
                     source_site=site_obj,
                     category=category_obj,
-                    deal_hash=deal_data['deal_hash'],
+                    deal_hash=deal_hash,
                     currency='USD',
                     is_active=True,
-                    deal_score=deal_score
-                )
-                new_deal.save()
-                
-                print(f"✓ Added new deal: {deal_data['title'][:50]}...")
-                added_count += 1
+                ))
                 
             except Exception as e:
-                print(f"✗ Error saving deal: {e}")
+                logger.warning(f"Error saving deal: {e}")
                 continue
         
-        return added_count
-    
-    def calculate_deal_score(self, deal_data):
-        """Calculate quality score for deal (0-100)"""
-        score = 0
-        
-        # Higher discount = higher score
-        discount = deal_data.get('discount_percentage', 0)
-        score += min(60, discount * 0.6)
-        
-        # Amazon gets bonus points
-        if deal_data.get('source') == 'amazon':
-            score += 20
-        
-        # Price-based scoring
-        price = deal_data.get('discounted_price', 0)
-        if price < 50:
-            score += 10
-        elif price < 200:
-            score += 5
-        
-        return min(100, int(score))
\ No newline at end of file
+        if new_deals:
+            score_new_deals(new_deals, site_obj.name)
+            for deal in new_deals:
+                apply_price(deal, None, today)
+            Deal.objects.bulk_create(new_deals)
+            if any(deal.pk is None for deal in new_deals):
+                # Backend could not return ids from the bulk insert
+                ids = dict(Deal.objects.filter(
+                    deal_hash__in=[deal.deal_hash for deal in new_deals]
+                ).values_list('deal_hash', 'id'))
+                for deal in new_deals:
+                    deal.pk = ids[deal.deal_hash]
+            index_deals([deal.pk for deal in new_deals])
+            assign_products(new_deals)
+            repriced_deals.extend(new_deals)
+        if changed_deals:
+            Deal.objects.bulk_update(changed_deals, [
+                'discounted_price', 'original_price', 'discount_percentage', 'last_checked', 'is_active',
+                'lowest_price_cents', 'highest_price_cents', 'low_90d_cents', 'low_90d_day',
+            ])
+        if unchanged_ids:
+            # Still seen on the site, so only the check time moves
+            Deal.objects.filter(id__in=unchanged_ids).update(last_checked=now)
+        record_prices(repriced_deals, today)
+        
+        return len(new_deals), len(changed_deals)
@@ -1,67 +1,217 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future
+from deals.prices import to_cents
 from .base_scraper import BaseScraper
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 
+logger = logging.getLogger(__name__)
+
 class AmazonScraper(BaseScraper):
-    def scrape_deals(self):
+    def scrape_deals(self, known_hashes=None):
+        """Crawl every listing page and return all deals found"""
+        deals = []
+        for page_deals in self.iter_deal_pages(known_hashes=known_hashes):
+            deals.extend(page_deals)
+        
+        logger.info(f"Total deals found: {len(deals)}")
+        return deals
+    
+    def iter_deal_pages(self, known_hashes=None, submit_parse=None, pages_ahead=1):
+        """Yield the deals of each listing page, in page order, as soon as it is parsed.
+        
+        Follows the next-page link or page_url_template from the site's
+        pagination config. known_hashes maps each deal hash seen in the
+        previous run to its price in cents; when given, the crawl stops
+        after the first page whose deals were all seen at the same price.
+        submit_parse(html, url, page_number) returns a Future of (deals,
+        next_url, parse seconds), e.g. parsed in another process; then up to
+        pages_ahead pages are fetched before the oldest one is parsed. A page
+        the server reports unchanged yields the deals kept from its last
+        parse. crawl_complete tells afterwards whether every page was
+        visited.
+        """
         url = self.site_config.get('deals_page')
-        print(f"Scraping Amazon deals from: {url}")
+        source = self.site_config.get('name', 'amazon')
+        pagination = self.site_config.get('pagination', {})
+        max_pages = pagination.get('max_pages', 1)
+        submit_parse = submit_parse or self.parse_now
+        self.crawl_complete = False
         
-        html = self.get_page(url)
+        # Fetched pages in page order: (page number, url, Future of the parse,
+        # whether the deals came from the response cache)
+        pending = deque()
+        page_number = 1
+        failed = False
+        try:
+            while True:
+                # Keep fetching while earlier pages are being parsed
+                while url and page_number <= max_pages and len(pending) < pages_ahead:
+                    logger.info(f"Scraping {source} deals from: {url}")
+                    result = self.fetch(url)
+                    html = result.text
+                    future = self.cached_page(url) if result.not_modified else None
+                    cached = future is not None
+                    if result.not_modified and not cached:
+                        # Stored before its deals were kept with it, so parse it again
+                        html = self.cache.get_body(url)
+                    if not cached and html:
+                        future = submit_parse(html, url, page_number)
+                    if future is None:
+                        logger.warning(f"Failed to fetch {source} page")
+                        failed = True
+                        url = None
+                        break
+                    pending.append((page_number, url, future, cached))
+                    next_url = self.peek_next_url(future, html, url, page_number)
+                    page_number += 1
+                    url = next_url
+                
+                if not pending:
+                    break
+                number, page_url, future, cached = pending.popleft()
+                
+                deals, next_url, parse_seconds = future.result()
+                if self.metrics and not cached:
+                    self.metrics.record_parse(parse_seconds)
+                if not deals:
+                    # An empty first page is more likely broken selectors than an empty site
+                    self.crawl_complete = number > 1
+                    return
+                
+                if self.cache and not cached:
+                    self.cache.annotate(page_url, next_url=next_url, deals=deals)
+                
+                # An unchanged page is yielded too, so its deals count as seen
+                yield deals
+                
+                if known_hashes and all(
+                    known_hashes.get(deal['deal_hash']) == to_cents(deal['discounted_price']) for deal in deals
+                ):
+                    logger.info(f"Page {number} has no new deals or prices, stopping crawl")
+                    return
+            
+            # Only running out of pages means every deal was seen; stopping
+            # at max_pages or on a failed fetch does not
+            self.crawl_complete = page_number > 1 and not failed and url is None
+        finally:
+            for _, _, future, _ in pending:
+                future.cancel()
+    
+    def cached_page(self, url):
+        """Finished Future of the deals kept from the last parse of an unchanged page, if any"""
+        annotations = self.cache.annotations(url)
+        if 'deals' not in annotations or 'next_url' not in annotations:
+            return None
+        future = Future()
+        future.set_result((annotations['deals'], annotations['next_url'], 0.0))
+        return future
+    
+    def parse_now(self, html, url, page_number):
+        """submit_parse that parses in the calling thread, returning a finished Future"""
+        started = time.perf_counter()
+        deals, next_url = self.parse_page(html, url, page_number)
+        future = Future()
+        future.set_result((deals, next_url, time.perf_counter() - started))
+        return future
+    
+    def peek_next_url(self, future, html, url, page_number):
+        """URL of the page after this one, without waiting for its parse to finish"""
+        if future.done():
+            return future.result()[1]
+        # Only the next link is built, which costs far less than the full parse
+        next_selector = self.site_config.get('pagination', {}).get('next_page')
+        page = self.parser.parse(html, keep=[next_selector]) if next_selector else None
+        return self.next_page_url(page, url, page_number + 1)
+    
+    def parse_page(self, html, url, page_number):
+        """Parse one listing page into (deals, next page URL)"""
+        page = self.parser.parse(html, keep=self.page_selectors())
+        return self.parse_deals(page, url), self.next_page_url(page, url, page_number + 1)
+    
+    def page_selectors(self):
+        """Parts of a listing page the parser has to keep: deal containers and the next link"""
+        selectors = list(self.field_selectors('deal_container'))
+        next_selector = self.site_config.get('pagination', {}).get('next_page')
+        if next_selector:
+            selectors.append(next_selector)
+        return selectors
+    
+    def next_page_url(self, page, url, page_number):
+        """Find the URL of the next listing page, or None on the last page"""
+        pagination = self.site_config.get('pagination', {})
         
-        if not html:
-            print("Failed to fetch Amazon page")
-            return []
+        next_selector = pagination.get('next_page')
+        if next_selector:
+            next_link = self.parser.select_one(page, next_selector)
+            href = self.parser.attr(next_link, 'href') if next_link is not None else ''
+            return urljoin(url, href) if href else None
         
-        soup = BeautifulSoup(html, 'html.parser')
-        selectors = self.site_config.get('selectors', {})
+        template = pagination.get('page_url_template')
+        if template:
+            return template.format(page=page_number)
+        
+        return None
+    
+    # Tried after the configured selector for each field
+    FALLBACK_SELECTORS = {
+        'deal_container': ['div[data-component-type="s-search-result"]'],
+        'title': ['h2 a span', '.a-text-normal'],
+        'price_discounted': ['.a-price-whole', '.a-offscreen'],
+        'price_original': ['.a-text-price span'],
+    }
+    
+    def field_selectors(self, field):
+        """Configured selector plus fallbacks for a field, compiled once"""
+        if field not in self._field_selectors:
+            configured = self.site_config.get('selectors', {}).get(field, '')
+            selectors = [configured] + self.FALLBACK_SELECTORS.get(field, [])
+            selectors = [selector for selector in selectors if selector]
+            for selector in selectors:
+                self.parser.compile(selector)
+            self._field_selectors[field] = selectors
+        return self._field_selectors[field]
+    
+    def first_match(self, container, field):
+        """First element matched by the field's selectors, in priority order"""
+        for selector in self.field_selectors(field):
+            elem = self.parser.select_one(container, selector)
+            if elem is not None:
+                return elem
+        return None
+    
+    def parse_deals(self, page, url):
+        """Extract deals from one parsed listing page"""
+        parser = self.parser
+        source = self.site_config.get('name', 'amazon')
         
         deals = []
-        # Let's look for deal containers
-        deal_containers = soup.select(selectors.get('deal_container', ''))
+        configured, *fallbacks = self.field_selectors('deal_container') or ['']
+        deal_containers = parser.select(page, configured) if configured else []
         
-        print(f"Found {len(deal_containers)} deal containers")
+        logger.debug(f"Found {len(deal_containers)} deal containers")
         
         # If no containers found with that selector, try a different approach
         if len(deal_containers) == 0:
             # Try alternative selectors
-            deal_containers = soup.find_all('div', {'data-component-type': 's-search-result'})
-            print(f"Trying alternative: found {len(deal_containers)} containers")
+            for selector in fallbacks:
+                deal_containers = parser.select(page, selector)
+                if deal_containers:
+                    break
+            logger.debug(f"Trying alternative: found {len(deal_containers)} containers")
         
-        for container in deal_containers[:10]:  # Limit to 10 for testing
+        for container in deal_containers:
             try:
-                # Try multiple selectors for title
-                title = None
-                title_selectors = [
-                    selectors.get('title', ''),
-                    'h2 a span',  # Alternative
-                    '.a-text-normal',  # Alternative
-                ]
-                
-                for selector in title_selectors:
-                    if selector:
-                        title_elem = container.select_one(selector)
-                        if title_elem:
-                            title = title_elem.get_text(strip=True)
-                            break
+                title_elem = self.first_match(container, 'title')
+                title = parser.text(title_elem) if title_elem is not None else None
                 
                 if not title:
                     continue
                 
                 # Try to find price
-                price_selectors = [
-                    selectors.get('price_discounted', ''),
-                    '.a-price-whole',  # Alternative
-                    '.a-offscreen',  # Alternative
-                ]
-                
-                price_text = None
-                for selector in price_selectors:
-                    if selector:
-                        price_elem = container.select_one(selector)
-                        if price_elem:
-                            price_text = price_elem.get_text(strip=True)
-                            break
+                price_elem = self.first_match(container, 'price_discounted')
+                price_text = parser.text(price_elem) if price_elem is not None else None
                 
                 if not price_text:
                     continue
@@ -73,33 +223,26 @@ class AmazonScraper(BaseScraper):
                 
                 # Try to find original price
                 original_price = None
-                original_selectors = [
-                    selectors.get('price_original', ''),
-                    '.a-text-price span',  # Alternative
-                ]
-                
-                for selector in original_selectors:
-                    if selector:
-                        original_elem = container.select_one(selector)
-                        if original_elem:
-                            original_text = original_elem.get_text(strip=True)
-                            original_price = self.parse_price(original_text)
-                            if original_price:
-                                break
+                for selector in self.field_selectors('price_original'):
+                    original_elem = parser.select_one(container, selector)
+                    if original_elem is not None:
+                        original_price = self.parse_price(parser.text(original_elem))
+                        if original_price:
+                            break
                 
                 # Find product link
-                link_elem = container.select_one('a')
+                link_elem = parser.select_one(container, 'a')
                 product_url = ''
-                if link_elem and link_elem.get('href'):
-                    product_url = urljoin(url, link_elem.get('href'))
+                if link_elem is not None and parser.attr(link_elem, 'href'):
+                    product_url = urljoin(url, parser.attr(link_elem, 'href'))
                 
                 # Find image
-                image_elem = container.select_one('img')
+                image_elem = parser.select_one(container, 'img')
                 image_url = ''
-                if image_elem:
-                    image_url = image_elem.get('src', '')
+                if image_elem is not None:
+                    image_url = parser.attr(image_elem, 'src')
                     if not image_url:
-                        image_url = image_elem.get('data-src', '')
+                        image_url = parser.attr(image_elem, 'data-src')
                 
                 # Calculate discount
                 discount_percentage = self.calculate_discount(original_price, discounted_price)
@@ -112,30 +255,40 @@ class AmazonScraper(BaseScraper):
                     'discount_percentage': discount_percentage,
                     'product_url': product_url[:500],
                     'image_url': image_url[:500],
-                    'source': 'amazon',
-                    'category': self.categorize_deal(title),
+                    'source': source,
                     'deal_hash': self.create_deal_hash({
                         'title': title,
-                        'source': 'amazon',
-                        'discounted_price': discounted_price
+                        'source': source,
+                        'product_url': product_url,
                     })
                 }
                 
-                print(f"Found deal: {title[:50]}... - ${discounted_price}")
+                # Lazy arguments: at the default level this line costs nothing per deal
+                logger.debug("Found deal: %s... - $%s", title[:50], discounted_price)
                 deals.append(deal)
                 
             except Exception as e:
-                print(f"Error parsing deal: {e}")
+                logger.warning(f"Error parsing deal: {e}")
                 continue
         
-        print(f"Total deals found: {len(deals)}")
         return deals
 
+# Scraper class per site name. Sites without an entry fall back to
+# AmazonScraper, which is driven entirely by the selectors in the config.
+SCRAPER_CLASSES = {
+    'amazon': AmazonScraper,
+}
+
+def get_scraper(site_name, site_config, throttle=None, cache=None, metrics=None):
+    """Build the scraper for a site"""
+    scraper_class = SCRAPER_CLASSES.get(site_name, AmazonScraper)
+    return scraper_class(dict(site_config, name=site_name), throttle=throttle, cache=cache, metrics=metrics)
+
 # Simple test scraper for demo
 class SimpleTestScraper:
     def scrape_deals(self):
         """Return test data for demonstration"""
-        print("Using test scraper (demo mode)")
+        logger.info("Using test scraper (demo mode)")
         
         test_deals = [
             {
@@ -0,0 +1,60 @@
+import threading
+from collections import Counter
+
+class SiteMetrics:
+    """Where one site's scrape spent its time.
+
+    Fetch threads add fetch and parse timings while the ingest loop adds
+    database write time, so every update takes the lock.
+    """
+
+    def __init__(self, site_name):
+        self.site_name = site_name
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.bytes_fetched = 0
+        self.fetch_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.write_seconds = 0.0
+        self.deals_found = 0
+        # HTTP status of every request attempt, 'error' when there was no response
+        self.status_counts = Counter()
+
+    def record_fetch(self, seconds, status, size=0):
+        with self.lock:
+            self.fetch_seconds += seconds
+            self.bytes_fetched += size
+            self.status_counts[str(status or 'error')] += 1
+
+    def record_parse(self, seconds):
+        with self.lock:
+            self.pages += 1
+            self.parse_seconds += seconds
+
+    def record_write(self, seconds, deals):
+        with self.lock:
+            self.write_seconds += seconds
+            self.deals_found += deals
+
+    def log_fields(self, elapsed):
+        """DailyScrapeLog field values; elapsed is the site's wall-clock run time"""
+        with self.lock:
+            return {
+                'pages_fetched': self.pages,
+                'bytes_fetched': self.bytes_fetched,
+                'status_counts': dict(self.status_counts),
+                'fetch_seconds': round(self.fetch_seconds, 3),
+                'parse_seconds': round(self.parse_seconds, 3),
+                'write_seconds': round(self.write_seconds, 3),
+                'deals_per_sec': round(self.deals_found / elapsed, 1) if elapsed > 0 else 0.0,
+            }
+
+    def summary(self, elapsed):
+        fields = self.log_fields(elapsed)
+        statuses = ', '.join(f"{status}: {count}" for status, count in sorted(fields['status_counts'].items()))
+        return (
+            f"{self.site_name}: {fields['pages_fetched']} pages, {fields['bytes_fetched'] / 1024:.1f} KB, "
+            f"fetch {fields['fetch_seconds']:.2f}s, parse {fields['parse_seconds']:.2f}s, "
+            f"write {fields['write_seconds']:.2f}s, {self.deals_found} deals at "
+            f"{fields['deals_per_sec']:.1f}/sec, statuses {{{statuses}}}"
+        )
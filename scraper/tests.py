@@ -1,3 +1,531 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from deals.admin import CategoryKeywordAdmin
+from deals.caching import RULES_VERSION_KEY
+from deals.models import CategoryKeyword, DailyScrapeLog, Deal, DealCategory, EcommerceSite, PriceHistory
+from deals.prices import to_cents
+from .categorizer import Categorizer, ReloadingCategorizer
+from .engine import ScrapingEngine
+from .feeds import import_feed, normalize_record
+from .http_cache import ResponseCache
+from .parsers import available_backends
+from .rate_limit import TokenBucket
+from .scraping_manager import ScrapingManager
+from .site_scrapers import get_scraper
 
-# Create your tests here.
+DEAL_HTML = """
+  <div class="deal">
+    <a href="/item/{site}-{n}"><h2 class="title">{site} Product {n}</h2></a>
+    <span class="price">${price}.99</span><span class="was">$99.99</span>
+  </div>
+"""
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+SELECTORS = {
+    'deal_container': '.deal',
+    'title': '.title',
+    'price_discounted': '.price',
+    'price_original': '.was',
+}
+
+
+class LocalSite:
+    """Tiny HTTP stand-in for a deals site, served from a background thread"""
+
+    def __init__(self, name, delay=0.0, pages=1, per_page=2):
+        self.name = name
+        self.delay = delay
+        self.pages = pages
+        self.per_page = per_page
+        self.requested = []
+        # Bump to change every page's ETag
+        self.version = 1
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(site.delay)
+                site.requested.append(self.path)
+                etag = f'"{site.version}-{self.path}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = site.render(self.path).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def render(self, path):
+        page = int(path.split('page=')[1]) if 'page=' in path else 1
+        if page > self.pages:
+            return '<html><body></body></html>'
+        first = (page - 1) * self.per_page + 1
+        deals = ''.join(
+            DEAL_HTML.format(site=self.name, n=n, price=10 + n)
+            for n in range(first, first + self.per_page)
+        )
+        next_link = f'<a class="next" href="/deals?page={page + 1}">Next</a>' if page < self.pages else ''
+        return f'<html><body>{deals}{next_link}</body></html>'
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/deals"
+
+    def config(self):
+        return {'deals_page': self.url, 'selectors': SELECTORS, 'max_retries': 1}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_acquire_waits_for_refill(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        # First token is banked, the other four arrive at 20/sec
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+
+    def test_rate_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+        with self.assertRaises(CommandError):
+            call_command('scrape_deals', '--rate', '0')
+
+
+class ScrapingEngineTests(SimpleTestCase):
+    def test_sites_are_fetched_concurrently(self):
+        sites = [LocalSite(f"site{i}", delay=0.4) for i in range(4)]
+        for site in sites:
+            site.__enter__()
+        try:
+            engine = ScrapingEngine(max_workers=4, rate_per_host=10)
+            started = time.monotonic()
+            results = {
+                name: deals
+                for name, deals, error in engine.run({site.name: site.config() for site in sites})
+            }
+            elapsed = time.monotonic() - started
+        finally:
+            for site in sites:
+                site.__exit__()
+
+        self.assertEqual(sorted(results), ['site0', 'site1', 'site2', 'site3'])
+        self.assertTrue(all(len(deals) == 2 for deals in results.values()))
+        # Roughly the slowest site, not the 1.6s sum of all four
+        self.assertLess(elapsed, 1.2)
+
+    def test_parse_workers_return_the_same_deals(self):
+        with LocalSite('shop', pages=3) as site:
+            config = {'shop': dict(site.config(), pagination={'next_page': '.next', 'max_pages': 10})}
+            in_thread = [deals for _, deals, _ in ScrapingEngine(rate_per_host=50).run(config)]
+            pooled = [deals for _, deals, _ in ScrapingEngine(rate_per_host=50, parse_workers=2).run(config)]
+
+        self.assertEqual(len(pooled), 3)
+        self.assertEqual(pooled, in_thread)
+
+    def test_pages_are_fetched_while_earlier_ones_parse(self):
+        with LocalSite('shop', pages=3) as site:
+            config = dict(site.config(), pagination={'next_page': '.next', 'max_pages': 10})
+            scraper = get_scraper('shop', config)
+            submitted = []
+
+            def submit_parse(html, url, page_number):
+                future = Future()
+                submitted.append((future, html, url, page_number))
+                return future
+
+            def parse_when_all_fetched():
+                # Nothing is parsed until every page has been fetched
+                deadline = time.monotonic() + 5
+                while len(submitted) < 3 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                for future, html, url, page_number in list(submitted):
+                    future.set_result(scraper.parse_now(html, url, page_number).result())
+
+            parser = threading.Thread(target=parse_when_all_fetched)
+            parser.start()
+            pages = list(scraper.iter_deal_pages(submit_parse=submit_parse, pages_ahead=3))
+            parser.join()
+
+        self.assertEqual([len(deals) for deals in pages], [2, 2, 2])
+        self.assertEqual(len(submitted), 3)
+        self.assertTrue(scraper.crawl_complete)
+
+    def test_unreachable_site_yields_no_pages(self):
+        engine = ScrapingEngine(max_workers=2)
+        config = {'deals_page': 'http://127.0.0.1:9/nothing', 'selectors': SELECTORS, 'max_retries': 1}
+        self.assertEqual(list(engine.run({'offline': config})), [])
+
+
+class PaginationTests(SimpleTestCase):
+    def test_follows_next_links_page_by_page(self):
+        with LocalSite('shop', pages=3) as site:
+            config = dict(site.config(), pagination={'next_page': '.next', 'max_pages': 10})
+            scraper = get_scraper('shop', config)
+            pages = list(scraper.iter_deal_pages())
+
+        self.assertEqual([len(deals) for deals in pages], [2, 2, 2])
+        self.assertEqual(len(site.requested), 3)
+
+    def test_page_template_stops_at_empty_page(self):
+        with LocalSite('shop', pages=2) as site:
+            template = site.url + '?page={page}'
+            config = dict(site.config(), pagination={'page_url_template': template, 'max_pages': 10})
+            deals = get_scraper('shop', config).scrape_deals()
+
+        self.assertEqual(len(deals), 4)
+        self.assertEqual(len(site.requested), 3)
+
+    def test_stops_after_first_fully_known_page(self):
+        with LocalSite('shop', pages=4) as site:
+            config = dict(site.config(), pagination={'next_page': '.next', 'max_pages': 10})
+            first_run = get_scraper('shop', config).scrape_deals()
+            site.requested.clear()
+
+            known_hashes = {deal['deal_hash']: to_cents(deal['discounted_price']) for deal in first_run}
+            second_run = list(get_scraper('shop', config).iter_deal_pages(known_hashes=known_hashes))
+
+            # A price change on the first page is not the end of the news
+            site.requested.clear()
+            known_hashes[first_run[0]['deal_hash']] += 100
+            third_run = list(get_scraper('shop', config).iter_deal_pages(known_hashes=known_hashes))
+
+        self.assertEqual(len(second_run), 1)
+        self.assertEqual(len(third_run), 2)
+        self.assertEqual(site.requested, ['/deals', '/deals?page=2'])
+
+
+class ParserBackendTests(SimpleTestCase):
+    def test_backends_extract_the_same_deals(self):
+        with open(os.path.join(FIXTURES_DIR, 'amazon', 'page-1.html'), encoding='utf-8') as f:
+            html = f.read()
+        config = ScrapingManager().scraping_config['amazon']
+
+        results = {}
+        for backend in available_backends():
+            scraper = get_scraper('amazon', dict(config, parser=backend))
+            # parse_page keeps only the deal containers and the next link
+            deals, next_url = scraper.parse_page(html, config['deals_page'], 1)
+            full_page = scraper.parse_deals(scraper.parser.parse(html), config['deals_page'])
+            self.assertEqual(deals, full_page, backend)
+            results[backend] = sorted((deal['deal_hash'], deal['product_url']) for deal in deals)
+
+        self.assertEqual(len(results['bs4']), 120)
+        for backend, deals in results.items():
+            self.assertEqual(deals, results['bs4'], backend)
+
+    def test_only_kept_elements_are_built(self):
+        html = ('<html><head><title>Deals</title><script>var x;</script></head><body>'
+                '<nav><a href="/">Home</a></nav><div class="deal x"><b>One</b></div>'
+                '<div class="sidebar"><div class="deal"><b>Two</b></div></div>'
+                '<a class="next" href="?page=2">Next</a></body></html>')
+        for backend in ('bs4', 'lxml'):
+            if backend not in available_backends():
+                continue
+            parser = get_scraper('shop', {'parser': backend}).parser
+            page = parser.parse(html, keep=['.deal', 'a.next'])
+            self.assertEqual([parser.text(node) for node in parser.select(page, '.deal')], ['One', 'Two'], backend)
+            self.assertEqual(parser.attr(parser.select_one(page, '.next'), 'href'), '?page=2', backend)
+            self.assertEqual(parser.select(page, 'script, nav, title, .sidebar'), [], backend)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_unchanged_pages_are_not_parsed_again(self):
+        cache = ResponseCache(self.tmp.name)
+        with LocalSite('shop', pages=2) as site:
+            config = dict(site.config(), pagination={'next_page': '.next', 'max_pages': 10})
+            first = get_scraper('shop', config, cache=cache).scrape_deals()
+            scraper = get_scraper('shop', config, cache=cache)
+            with mock.patch.object(scraper, 'parse_deals') as parse_deals:
+                second = scraper.scrape_deals()
+
+        self.assertEqual(len(first), 4)
+        # The deals kept from the first parse, so they still count as listed
+        self.assertEqual(second, first)
+        self.assertTrue(scraper.crawl_complete)
+        parse_deals.assert_not_called()
+        # Both pages were still revalidated, following the cached next link
+        self.assertEqual(len(site.requested), 4)
+
+    def test_changed_page_is_downloaded(self):
+        cache = ResponseCache(self.tmp.name)
+        with LocalSite('shop') as site:
+            get_scraper('shop', site.config(), cache=cache).scrape_deals()
+            site.version = 2
+            deals = get_scraper('shop', site.config(), cache=cache).scrape_deals()
+
+        self.assertEqual(len(deals), 2)
+
+    def test_offline_replay(self):
+        with LocalSite('shop') as site:
+            config = site.config()
+            get_scraper('shop', config, cache=ResponseCache(self.tmp.name)).scrape_deals()
+
+        offline = ResponseCache(self.tmp.name, offline=True)
+        self.assertEqual(len(get_scraper('shop', config, cache=offline).scrape_deals()), 2)
+
+    def test_eviction_keeps_directory_under_limit(self):
+        cache = ResponseCache(self.tmp.name, max_bytes=4000)
+        response = mock.Mock(headers={}, encoding='utf-8', content=os.urandom(1500))
+        for n in range(10):
+            cache.store(f'http://example.com/{n}', response)
+
+        files = os.listdir(self.tmp.name)
+        size = sum(os.path.getsize(os.path.join(self.tmp.name, f)) for f in files)
+        self.assertLessEqual(size, 4000)
+        self.assertIsNotNone(cache.get_meta('http://example.com/9'))
+        # Meta and body are evicted together, even after the meta is rewritten
+        cache.annotate('http://example.com/9', next_url=None)
+        for n in range(10, 14):
+            cache.store(f'http://example.com/{n}', response)
+        stems = [f.split('.', 1)[0] for f in os.listdir(self.tmp.name)]
+        self.assertTrue(all(stems.count(stem) == 2 for stem in stems))
+
+    def test_meta_without_body_is_not_revalidated(self):
+        cache = ResponseCache(self.tmp.name)
+        response = mock.Mock(headers={'ETag': '"v1"'}, encoding='utf-8', content=b'<html></html>')
+        cache.store('http://example.com/', response)
+        self.assertEqual(cache.conditional_headers('http://example.com/'), {'If-None-Match': '"v1"'})
+
+        os.remove(cache._paths('http://example.com/')[1])
+        self.assertEqual(cache.conditional_headers('http://example.com/'), {})
+
+
+class RunScrapingTests(TestCase):
+    def test_run_scraping_saves_every_configured_site(self):
+        with LocalSite('alpha') as alpha, LocalSite('beta') as beta:
+            manager = ScrapingManager()
+            manager.scraping_config = {'alpha': alpha.config(), 'beta': beta.config()}
+            results = manager.run_scraping(test_mode=False, max_workers=2, rate_per_host=10, use_cache=False)
+
+        self.assertEqual(results['alpha']['added'], 2)
+        self.assertEqual(results['beta']['added'], 2)
+        self.assertEqual(Deal.objects.filter(source_site__name='beta').count(), 2)
+
+        log = DailyScrapeLog.objects.get(site__name='alpha')
+        self.assertEqual((log.pages_fetched, log.status_counts), (1, {'200': 1}))
+        self.assertGreater(log.bytes_fetched, 0)
+        self.assertGreater(log.fetch_seconds, 0)
+        self.assertGreater(log.write_seconds, 0)
+        self.assertGreater(log.deals_per_sec, 0)
+
+    def test_only_complete_crawls_expire_unlisted_deals(self):
+        def run(full_crawl):
+            manager = ScrapingManager()
+            manager.scraping_config = {'alpha': alpha.config()}
+            manager.run_scraping(test_mode=False, rate_per_host=10, use_cache=False, full_crawl=full_crawl)
+            active = set(Deal.objects.filter(is_active=True).values_list('title', flat=True))
+            return DailyScrapeLog.objects.latest('started_at').status, active
+
+        with LocalSite('alpha', per_page=3) as alpha:
+            self.assertEqual(run(True), ('success', {'alpha Product 1', 'alpha Product 2', 'alpha Product 3'}))
+            alpha.per_page = 2
+            self.assertEqual(run(True), ('success', {'alpha Product 1', 'alpha Product 2'}))
+            # Stops at the first page of known deals, so nothing can be expired
+            alpha.per_page = 1
+            self.assertEqual(run(False), ('partial', {'alpha Product 1', 'alpha Product 2'}))
+            # A deal listed again comes back
+            alpha.per_page = 3
+            self.assertEqual(run(False)[1], {'alpha Product 1', 'alpha Product 2', 'alpha Product 3'})
+
+
+    def test_unchanged_pages_keep_their_deals_active(self):
+        def run(max_pages=10):
+            manager = ScrapingManager()
+            manager.scraping_config = {
+                'alpha': dict(alpha.config(), pagination={'next_page': '.next', 'max_pages': max_pages}),
+            }
+            manager.run_scraping(test_mode=False, rate_per_host=10, full_crawl=True)
+            return DailyScrapeLog.objects.latest('started_at').status, Deal.objects.filter(is_active=True).count()
+
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(SCRAPER_CACHE_DIR=cache_dir):
+            with LocalSite('alpha', pages=2) as alpha:
+                self.assertEqual(run(), ('success', 4))
+                alpha.requested.clear()
+                # Every page answers 304 Not Modified this time
+                self.assertEqual(run(), ('success', 4))
+                self.assertEqual(len(alpha.requested), 2)
+
+                # Stopping at max_pages leaves deals unseen, so nothing may expire
+                alpha.pages = 3
+                alpha.version = 2
+                self.assertEqual(run(max_pages=2), ('partial', 4))
+
+
+class ProcessDealsTests(TestCase):
+    def test_unchanged_deals_only_touch_last_checked(self):
+        deals = [
+            {'title': f'Product {n}', 'discounted_price': 10.5 + n, 'original_price': 20.0, 'discount_percentage': 40,
+             'product_url': f'https://example.com/{n}', 'deal_hash': f'hash-{n}', 'source': 'example'}
+            for n in range(3)
+        ]
+        manager = ScrapingManager()
+        manager.process_deals(deals, 'example')
+        checked = dict(Deal.objects.values_list('deal_hash', 'last_checked'))
+        deals[0]['original_price'] = 25.0
+        deals[0]['discount_percentage'] = 54
+        manager.process_deals(deals, 'example')
+
+        self.assertEqual((manager.last_ingest['added'], manager.last_ingest['updated']), (0, 1))
+        for deal_hash, last_checked in Deal.objects.values_list('deal_hash', 'last_checked'):
+            self.assertGreater(last_checked, checked[deal_hash])
+        # The original price moved today, so today's row was rewritten
+        self.assertEqual(PriceHistory.objects.count(), 3)
+        self.assertEqual(PriceHistory.objects.get(deal__deal_hash='hash-0').original_price_cents, 2500)
+        self.assertEqual(Deal.objects.get(deal_hash='hash-1').lowest_price_cents, 1150)
+
+    def test_batches_mix_inserts_updates_and_duplicates(self):
+        def deal(n, price):
+            return {'title': f'Product {n}', 'discounted_price': price, 'original_price': 50.0,
+                    'discount_percentage': 50, 'product_url': f'https://example.com/{n}',
+                    'deal_hash': f'hash-{n}', 'source': 'example'}
+
+        manager = ScrapingManager(batch_size=2)
+        manager.process_deals([deal(0, 10.0), deal(1, 11.0)], 'example')
+        # Batches of two: [2, 2 again], [0, 3], [1]
+        added = manager.process_deals([deal(2, 12.0), deal(2, 13.0), deal(0, 9.0), deal(3, 14.0), deal(1, 11.0)],
+                                      'example')
+
+        self.assertEqual((added, manager.last_ingest['updated']), (2, 1))
+        prices = dict(Deal.objects.values_list('deal_hash', 'discounted_price'))
+        self.assertEqual({deal_hash: float(price) for deal_hash, price in prices.items()},
+                         {'hash-0': 9.0, 'hash-1': 11.0, 'hash-2': 13.0, 'hash-3': 14.0})
+
+    def test_bad_row_only_loses_itself(self):
+        deals = [
+            {'title': f'Product {n}', 'discounted_price': None if n == 1 else 10.0 + n, 'original_price': 50.0,
+             'discount_percentage': 50, 'product_url': f'https://example.com/{n}', 'deal_hash': f'hash-{n}',
+             'source': 'example', 'category': 'gadgets'}
+            for n in range(3)
+        ]
+        manager = ScrapingManager()
+        with self.assertLogs('scraper.scraping_manager', 'WARNING'):
+            added = manager.process_deals(deals, 'example')
+
+        self.assertEqual(added, 2)
+        self.assertEqual(set(Deal.objects.values_list('deal_hash', flat=True)), {'hash-0', 'hash-2'})
+        self.assertEqual(DealCategory.objects.filter(name='gadgets').count(), 1)
+
+
+class FeedImportTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_feed(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_prices_are_parsed_like_scraped_ones(self):
+        deal = normalize_record({'name': 'Desk Lamp', 'price': '$1,299.00', 'list_price': 1999, 'url': 'https://shop.test/1'},
+                                'shop')
+        self.assertEqual((deal['discounted_price'], deal['original_price'], deal['discount_percentage']), (1299.0, 1999.0, 35))
+        self.assertIsNone(normalize_record({'title': 'No price', 'url': 'https://shop.test/2'}, 'shop'))
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        rows = ''.join(f'Product {n},${10 + n}.99,$99.99,https://shop.test/{n}\n' for n in range(5))
+        path = self.write_feed('feed.csv', 'title,price,was_price,url\n' + rows + 'broken,,,\n')
+        manager = ScrapingManager()
+        process_deals = manager.process_deals
+        calls = []
+
+        def fail_on_second_batch(deals, site_name, invalidate=True):
+            calls.append(len(deals))
+            if len(calls) == 2:
+                raise RuntimeError('interrupted')
+            return process_deals(deals, site_name, invalidate=invalidate)
+
+        with mock.patch.object(manager, 'process_deals', side_effect=fail_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                import_feed(path, 'shop', manager, checkpoint_every=2)
+        self.assertEqual(Deal.objects.count(), 2)
+        self.assertTrue(os.path.exists(path + '.checkpoint'))
+
+        stats = import_feed(path, 'shop', manager, checkpoint_every=2)
+        self.assertEqual(stats, {'read': 6, 'skipped': 1, 'added': 5})
+        self.assertEqual(Deal.objects.filter(source_site__name='shop').count(), 5)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+        # The merchant is known by its own store, and has no listing page to crawl
+        site = EcommerceSite.objects.get(name='shop')
+        self.assertEqual((site.base_url, site.deals_page_url), ('https://shop.test/', ''))
+        self.assertNotIn('shop', manager.get_site_configs())
+
+
+class CategorizerTests(TestCase):
+    RULES = {
+        'electronics': {'smart watch': 2, 'headphone': 2, 'wireless': 0.5},
+        'fashion': {'watch': 1, 'shoe': 1},
+        'home': {'mat': 1},
+    }
+
+    def test_whole_words_plurals_and_weights(self):
+        categorizer = Categorizer(self.RULES)
+        self.assertEqual(categorizer.categorize('Automatic Coffee Maker'), 'other')
+        self.assertEqual(categorizer.categorize('Non-slip Yoga Mat'), 'home')
+        self.assertEqual(categorizer.categorize("Men's Running SHOES"), 'fashion')
+        self.assertEqual(categorizer.categorize('Classic Leather Watch'), 'fashion')
+        self.assertEqual(categorizer.categorize('Fitness Smart Watches'), 'electronics')
+        self.assertEqual(categorizer.scores('Wireless Headphones, Wireless'), {'electronics': 2.5})
+
+    def test_database_keywords_are_picked_up_without_restart(self):
+        categorizer = ReloadingCategorizer(reload_interval=0)
+        self.assertEqual(categorizer.categorize('Cast Iron Skillet'), 'other')
+        CategoryKeyword.objects.create(category=DealCategory.objects.create(name='home', slug='home'),
+                                       keyword='skillet', weight=3)
+        self.assertEqual(categorizer.categorize('Cast Iron Skillet'), 'home')
+
+    def test_keyword_changes_reload_after_the_interval(self):
+        home = DealCategory.objects.create(name='home', slug='home')
+        categorizer = ReloadingCategorizer(reload_interval=30)
+        with mock.patch('scraper.categorizer.time.monotonic', return_value=1000.0) as clock:
+            self.assertEqual(categorizer.categorize('Cast Iron Skillet'), 'other')
+
+            version = cache.get(RULES_VERSION_KEY)
+            CategoryKeyword.objects.create(category=home, keyword='skillet', weight=3)
+            self.assertNotEqual(cache.get(RULES_VERSION_KEY), version)
+            # Not checked again until RELOAD_INTERVAL has passed
+            clock.return_value = 1029.0
+            self.assertEqual(categorizer.categorize('Cast Iron Skillet'), 'other')
+            clock.return_value = 1030.0
+            self.assertEqual(categorizer.categorize('Cast Iron Skillet'), 'home')
+
+            # The admin's bulk delete skips delete() but bumps the version too
+            version = cache.get(RULES_VERSION_KEY)
+            CategoryKeywordAdmin(CategoryKeyword, admin.site).delete_queryset(None, CategoryKeyword.objects.all())
+            self.assertNotEqual(cache.get(RULES_VERSION_KEY), version)
+            clock.return_value = 1060.0
+            self.assertEqual(categorizer.categorize('Cast Iron Skillet'), 'other')